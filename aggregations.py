@@ -0,0 +1,280 @@
+"""
+NFPC Phase 1 - Per-Account Aggregation Kernel
+Single-pass replacement for the lambda-based groupby().agg() calls in Sections 5-6.
+abs(amount) and the credit/debit masks are computed once; every statistic is then a
+NumPy reduction (bincount / reduceat) over arrays sorted once by account.
+
+Produces the Category A behavioural features (#1-#15) plus first/last transaction
+time and the maximum inter-transaction gap used by Section 6.1, and the counterparty
+degree features (#26-#28) used by Sections 6.4 and 7.1.
+"""
+import pandas as pd
+import numpy as np
+import argparse, time
+from schema import key_codes
+
+NEAR_THRESHOLD = (45000, 50000)
+
+STAT_COLUMNS = [
+    'txn_count', 'total_volume', 'avg_amount', 'median_amount', 'max_amount', 'std_amount',
+    'amount_skewness', 'credit_count', 'debit_count', 'credit_debit_ratio',
+    'unique_channels', 'dominant_channel_pct', 'unique_counterparties', 'counterparty_entropy',
+    'reversal_count', 'reversal_rate', 'near_threshold_fraction',
+    'first_txn', 'last_txn', 'max_gap_days',
+]
+
+
+def _group_starts(sizes):
+    return np.cumsum(sizes) - sizes
+
+
+def _safe_div(num, den):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(den > 0, num / np.where(den > 0, den, 1), np.nan)
+
+
+def _pair_counts(acct, codes, n_codes):
+    """Distinct (account, code) pairs and their multiplicities, sorted by account."""
+    keep = codes >= 0
+    pairs = acct[keep].astype(np.int64) * (n_codes + 1) + codes[keep]
+    uniq, cnt = np.unique(pairs, return_counts=True)
+    return uniq // (n_codes + 1), cnt
+
+
+def _segment_max(owner, values, n):
+    """Max of `values` per owner id (owner sorted ascending); 0 where the owner has none."""
+    out = np.zeros(n, dtype=values.dtype)
+    if len(owner):
+        starts = np.flatnonzero(np.r_[True, owner[1:] != owner[:-1]])
+        out[owner[starts]] = np.maximum.reduceat(values, starts)
+    return out
+
+
+def account_aggregates(transactions, near_threshold=NEAR_THRESHOLD):
+    """All per-account count/volume/diversity stats in one pass over `transactions`.
+
+    Definitions match the original Section 5 groupby: amount statistics are on
+    |amount| except std/skewness (signed amount, ddof=1 / bias-corrected),
+    nunique ignores missing values, and max_gap_days is the largest whole-day gap
+    between consecutive timestamps. Counterparty entropy is in bits.
+    """
+    if len(transactions) == 0:
+        return pd.DataFrame(columns=['account_id'] + STAT_COLUMNS)
+    acct, accounts = key_codes(transactions['account_id'])
+    n = len(accounts)
+    amount = transactions['amount'].to_numpy(dtype=np.float64)
+    abs_amount = np.abs(amount)
+    valid = ~np.isnan(amount)
+    is_credit = (transactions['txn_type'] == 'C').to_numpy()
+    is_debit = (transactions['txn_type'] == 'D').to_numpy()
+
+    rows = np.bincount(acct, minlength=n)
+    present = rows > 0
+    out = {'txn_count': np.bincount(acct[transactions['transaction_id'].notna().to_numpy()], minlength=n)}
+
+    # ── Volume / amount moments ──
+    a_v = acct[valid]
+    n_valid = np.bincount(a_v, minlength=n)
+    out['total_volume'] = np.bincount(a_v, weights=abs_amount[valid], minlength=n)
+    out['avg_amount'] = _safe_div(out['total_volume'], n_valid)
+    mean = _safe_div(np.bincount(a_v, weights=amount[valid], minlength=n), n_valid)
+    dev = amount[valid] - mean[a_v]
+    m2 = np.bincount(a_v, weights=dev ** 2, minlength=n)
+    m3 = np.bincount(a_v, weights=dev ** 3, minlength=n)
+    out['std_amount'] = np.sqrt(_safe_div(m2, n_valid - 1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        g = np.sqrt(n_valid * (n_valid - 1.0)) / (n_valid - 2.0) * (m3 / n_valid) / (m2 / n_valid) ** 1.5
+    out['amount_skewness'] = np.where(n_valid < 3, np.nan, np.where(m2 > 0, g, 0.0))
+
+    # ── Median / max of |amount|: one sort by (account, |amount|), NaN last ──
+    order = np.lexsort((abs_amount, acct))
+    s = abs_amount[order]
+    starts = _group_starts(rows)
+    has = n_valid > 0
+    lo = np.where(has, starts + (n_valid - 1) // 2, 0)
+    hi = np.where(has, starts + n_valid // 2, 0)
+    out['median_amount'] = np.where(has, (s[lo] + s[hi]) / 2, np.nan)
+    out['max_amount'] = np.where(has, s[np.where(has, starts + n_valid - 1, 0)], np.nan)
+
+    # ── Direction / reversals / structuring ──
+    out['credit_count'] = np.bincount(acct[is_credit], minlength=n)
+    out['debit_count'] = np.bincount(acct[is_debit], minlength=n)
+    out['credit_debit_ratio'] = out['credit_count'] / (out['debit_count'] + 1)
+    out['reversal_count'] = np.bincount(acct[amount < 0], minlength=n)
+    out['reversal_rate'] = _safe_div(out['reversal_count'], out['txn_count'])
+    near = (abs_amount >= near_threshold[0]) & (abs_amount < near_threshold[1])
+    out['near_threshold_fraction'] = _safe_div(np.bincount(acct[near], minlength=n), out['txn_count'])
+
+    # ── Channel / counterparty diversity ──
+    ch, ch_cats = key_codes(transactions['channel'])
+    owner, cnt = _pair_counts(acct, ch, len(ch_cats))
+    out['unique_channels'] = np.bincount(owner, minlength=n)
+    out['dominant_channel_pct'] = _safe_div(_segment_max(owner, cnt, n), out['txn_count'])
+    cp, cp_cats = key_codes(transactions['counterparty_id'])
+    owner, cnt = _pair_counts(acct, cp, len(cp_cats))
+    out['unique_counterparties'] = np.bincount(owner, minlength=n)
+    p = cnt / np.bincount(owner, weights=cnt, minlength=n)[owner]
+    out['counterparty_entropy'] = np.bincount(owner, weights=-p * np.log2(p), minlength=n)
+
+    # ── Activity span and largest dormancy gap: one sort by (account, time), NaT last ──
+    ts = transactions['transaction_timestamp'].to_numpy()
+    t = ts.view(np.int64)
+    t_ok = ~np.isnat(ts)
+    order = np.lexsort((np.where(t_ok, t, np.iinfo(np.int64).max), acct))
+    st, sa, sok = t[order], acct[order], t_ok[order]
+    n_ts = np.bincount(acct[t_ok], minlength=n)
+    has_ts = n_ts > 0
+    nat = np.iinfo(np.int64).min
+    first = np.where(has_ts, st[np.where(has_ts, starts, 0)], nat)
+    last = np.where(has_ts, st[np.where(has_ts, starts + n_ts - 1, 0)], nat)
+    gap = np.full(len(st), -1, dtype=np.int64)
+    same = (sa[1:] == sa[:-1]) & sok[1:] & sok[:-1]
+    gap[1:] = np.where(same, st[1:] - st[:-1], -1)
+    max_gap = np.full(n, -1, dtype=np.int64)
+    max_gap[present] = np.maximum.reduceat(gap, starts[present])
+    day = np.timedelta64(1, 'D').astype(f'm8[{np.datetime_data(ts.dtype)[0]}]').astype(np.int64)
+    out['max_gap_days'] = np.where(max_gap >= 0, max_gap // day, np.nan)
+    out['first_txn'] = first.view(ts.dtype)
+    out['last_txn'] = last.view(ts.dtype)
+
+    result = pd.DataFrame({'account_id': accounts[present]})
+    if isinstance(transactions['account_id'].dtype, pd.CategoricalDtype):
+        result['account_id'] = pd.Categorical(result['account_id'], categories=accounts)
+    for col in STAT_COLUMNS:
+        result[col] = out[col][present]
+    return result
+
+
+DEGREE_COLUMNS = ['in_degree', 'out_degree', 'total_degree', 'fan_in_out_ratio']
+
+
+def degree_stats(transactions):
+    """In/out/total counterparty degree for every account in `transactions`.
+
+    (account, counterparty, direction) triples are deduplicated once with a single
+    np.unique; degrees are then plain counts of the distinct triples. Identical to
+    the original per-group lambdas: in_degree = distinct counterparties of credits,
+    out_degree = of debits, total_degree = overall, missing counterparties ignored,
+    fan_in_out_ratio = in_degree / (out_degree + 1).
+    """
+    if len(transactions) == 0:
+        return pd.DataFrame(columns=['account_id'] + DEGREE_COLUMNS)
+    acct, accounts = key_codes(transactions['account_id'])
+    cp, cp_cats = key_codes(transactions['counterparty_id'])
+    n = len(accounts)
+    direction = np.full(len(acct), 2, dtype=np.int64)
+    direction[(transactions['txn_type'] == 'C').to_numpy()] = 0
+    direction[(transactions['txn_type'] == 'D').to_numpy()] = 1
+    keep = cp >= 0
+    pair = acct[keep].astype(np.int64) * (len(cp_cats) + 1) + cp[keep]
+    triples = np.unique(pair * 3 + direction[keep])
+    pair, direction = triples // 3, triples % 3
+    owner = pair // (len(cp_cats) + 1)
+    distinct = np.r_[True, pair[1:] != pair[:-1]] if len(pair) else np.zeros(0, dtype=bool)
+
+    present = np.bincount(acct, minlength=n) > 0
+    in_degree = np.bincount(owner[direction == 0], minlength=n)
+    out_degree = np.bincount(owner[direction == 1], minlength=n)
+    result = pd.DataFrame({'account_id': accounts[present]})
+    if isinstance(transactions['account_id'].dtype, pd.CategoricalDtype):
+        result['account_id'] = pd.Categorical(result['account_id'], categories=accounts)
+    result['in_degree'] = in_degree[present]
+    result['out_degree'] = out_degree[present]
+    result['total_degree'] = np.bincount(owner[distinct], minlength=n)[present]
+    result['fan_in_out_ratio'] = result['in_degree'] / (result['out_degree'] + 1)
+    return result
+
+
+# ── Benchmark against the original Section 5 / 6 / 7 code ──
+def legacy_account_stats(transactions):
+    """The pre-kernel implementation, kept verbatim for benchmarking."""
+    stats = transactions.groupby('account_id', observed=True).agg(
+        txn_count=('transaction_id', 'count'),
+        total_volume=('amount', lambda x: x.abs().sum()),
+        avg_amount=('amount', lambda x: x.abs().mean()),
+        median_amount=('amount', lambda x: x.abs().median()),
+        max_amount=('amount', lambda x: x.abs().max()),
+        std_amount=('amount', 'std'),
+        unique_channels=('channel', 'nunique'),
+        unique_counterparties=('counterparty_id', 'nunique'),
+        credit_count=('txn_type', lambda x: (x == 'C').sum()),
+        debit_count=('txn_type', lambda x: (x == 'D').sum()),
+    ).reset_index()
+    dates = transactions.groupby('account_id', observed=True).agg(
+        first_txn=('transaction_timestamp', 'min'),
+        last_txn=('transaction_timestamp', 'max'),
+    ).reset_index()
+    srt = transactions[['account_id', 'transaction_timestamp']].sort_values(['account_id', 'transaction_timestamp'])
+    srt['gap_days'] = srt.groupby('account_id', observed=True)['transaction_timestamp'].diff().dt.days
+    gaps = srt.groupby('account_id', observed=True)['gap_days'].max().rename('max_gap_days').reset_index()
+    return stats.merge(dates, on='account_id').merge(gaps, on='account_id')
+
+
+def legacy_degree_stats(transactions):
+    """The original Section 7.1 network_stats lambdas, kept verbatim for benchmarking."""
+    stats = transactions.groupby('account_id', observed=True).agg(
+        in_degree=('counterparty_id', lambda x: x[transactions.loc[x.index, 'txn_type'] == 'C'].nunique()),
+        out_degree=('counterparty_id', lambda x: x[transactions.loc[x.index, 'txn_type'] == 'D'].nunique()),
+        total_degree=('counterparty_id', 'nunique')
+    ).reset_index()
+    stats['fan_in_out_ratio'] = stats['in_degree'] / (stats['out_degree'] + 1)
+    return stats
+
+
+# name -> (legacy implementation, kernel, exact comparison required)
+BENCHMARKS = {
+    'account_stats': (legacy_account_stats, account_aggregates, False),
+    'degree': (legacy_degree_stats, degree_stats, True),
+}
+
+
+def _time(fn, transactions, repeat):
+    best, res = float('inf'), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        res = fn(transactions)
+        best = min(best, time.perf_counter() - t0)
+    return best, res
+
+
+def benchmark(transactions, repeat=1, names=None):
+    """Time each legacy implementation against its kernel and check the shared columns agree."""
+    results = {}
+    for name in names or BENCHMARKS:
+        legacy_fn, kernel_fn, exact = BENCHMARKS[name]
+        legacy_s, old = _time(legacy_fn, transactions, repeat)
+        kernel_s, new = _time(kernel_fn, transactions, repeat)
+        mismatched = []
+        for col in old.columns.drop('account_id'):
+            a, b = old[col].to_numpy(), new[col].to_numpy()
+            if np.issubdtype(a.dtype, np.datetime64):
+                ok = np.array_equal(a, b.astype(a.dtype), equal_nan=True)
+            elif exact:
+                ok = np.array_equal(a, b)
+            else:
+                ok = np.allclose(a.astype(float), b.astype(float), rtol=1e-9, atol=1e-6, equal_nan=True)
+            if not ok:
+                mismatched.append(col)
+        results[name] = {'rows': len(transactions), 'accounts': len(new),
+                         'legacy_s': round(legacy_s, 3), 'kernel_s': round(kernel_s, 3),
+                         'speedup': round(legacy_s / max(kernel_s, 1e-9), 1),
+                         'mismatched_columns': mismatched}
+    return results
+
+
+if __name__ == '__main__':
+    from ingest import DATA_DIR, load_tables
+    parser = argparse.ArgumentParser(description='Per-account aggregation kernel.')
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--benchmark', action='store_true', help='time against the original groupby/lambda code')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--out', default=None, help='write the stats table to this Parquet file')
+    args = parser.parse_args()
+    transactions = load_tables(args.data_dir)['transactions']
+    if args.benchmark:
+        for name, res in benchmark(transactions, args.repeat).items():
+            print(f"{name}:")
+            for k, v in res.items():
+                print(f"  {k}: {v}")
+    if args.out:
+        account_aggregates(transactions).merge(degree_stats(transactions), on='account_id').to_parquet(args.out, index=False)
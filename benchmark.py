@@ -0,0 +1,181 @@
+"""
+NFPC Phase 1 - Pipeline Benchmark
+Times every pipeline stage on synthetic data (synth.py) at one or more scales and
+appends wall time and peak RSS per stage to a JSON-lines history, so a regression shows
+up as a diff against the previous run at the same scale.
+
+Each scale runs cold — fresh Parquet cache, artifact cache, graph and plots — in its own
+Python process, so peak RSS is not inherited from the previous scale. The per-stage
+numbers are the pipeline's own profile records (pipeline.profiled: wall/CPU time, plot
+time, peak RSS, rows); ingest is profiled the same way.
+
+Groups in the summary:
+  ingest        CSV -> Parquet cache (ingest.build_cache)
+  load, join    loading the cache; joining the tables and labelling transactions
+  aggregations  per-account transaction aggregates and degrees
+  patterns      pass-through, dormancy and chain detectors
+  graph         guilt-by-association and cluster features
+  report        report sections, minus their plot time
+  plots         figure rendering (plots.render_all in the report stage, save_fig in sections)
+"""
+import argparse, json, os, platform, shutil, subprocess, sys, tempfile, time
+
+GROUPS = {
+    'load': ['load'],
+    'join': ['join', 'txn_labeled', 'branch_stats'],
+    'aggregations': ['acct_txn_stats', 'acct_degree'],
+    'patterns': ['pass_through', 'acct_dormancy', 'acct_chains'],
+    'graph': ['acct_guilt', 'acct_clusters'],
+}
+GROUP_ORDER = ['ingest', 'load', 'join', 'aggregations', 'patterns', 'graph', 'report', 'plots']
+DEFAULT_BENCH_DIR = os.path.join(tempfile.gettempdir(), 'nfpc_bench')
+HISTORY_FILE = 'history.jsonl'
+MAX_SLOWDOWN = 1.25
+
+
+def stage_group(name):
+    if name == 'ingest':
+        return 'ingest'
+    for group, stages in GROUPS.items():
+        if name in stages:
+            return group
+    return 'report'
+
+
+# ── One scale, in a child process ──
+def measure(data_dir, workers=1):
+    """Cold pipeline run over data_dir: the pipeline's profile record of every stage, plus ingest."""
+    import pipeline
+    import eda_report, eda_part2, eda_part3  # noqa: F401 (registers the stages)
+    from ingest import build_cache, default_cache_dir
+    from graph import default_graph_dir
+
+    plot_dir = os.path.join(data_dir, 'plots')
+    artifact_dir = os.path.join(data_dir, 'pipeline_cache')
+    for path in [default_cache_dir(data_dir), artifact_dir, default_graph_dir(data_dir), plot_dir]:
+        shutil.rmtree(path, ignore_errors=True)
+    pipeline.CONFIG.update(data_dir=data_dir, plot_dir=plot_dir, report_path=os.path.join(data_dir, 'eda_report.md'),
+                           artifact_dir=artifact_dir, workers=workers)
+    with pipeline.profiled('ingest') as ingest:
+        build_cache(data_dir, verbose=False)
+    pipeline.run(force=['all'], verbose=False)
+    return [{**r, 'group': stage_group(r['stage'])} for r in [ingest] + list(pipeline.PROFILE.values())]
+
+
+def summarise(stages):
+    groups = {g: 0.0 for g in GROUP_ORDER}
+    for s in stages:
+        groups[s['group']] += s['wall_s'] - s['plot_s']
+        groups['plots'] += s['plot_s']
+    return {g: round(v, 3) for g, v in groups.items()}
+
+
+def run_scale(bench_dir, scale, seed=0, workers=1, verbose=True):
+    """Generate (if needed) and benchmark one scale in a fresh interpreter. Returns the history record."""
+    from synth import ensure_dataset
+    data_dir = os.path.join(bench_dir, f'scale_{scale:g}')
+    t0 = time.perf_counter()
+    meta = ensure_dataset(data_dir, scale, seed, verbose=False)
+    generate_s = time.perf_counter() - t0
+    out = os.path.join(data_dir, 'benchmark_result.json')
+    cmd = [sys.executable, os.path.abspath(__file__), '--child', data_dir, '--workers', str(workers), '--result', out]
+    subprocess.run(cmd, check=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                   stdout=None if verbose else subprocess.DEVNULL)
+    with open(out) as f:
+        stages = json.load(f)
+    return {
+        'timestamp': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'commit': git_commit(),
+        'scale': scale, 'seed': seed, 'workers': workers,
+        'accounts': meta['accounts'], 'transactions': meta['transactions'],
+        'host': {'platform': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()},
+        'generate_seconds': round(generate_s, 2),
+        'total_seconds': round(sum(s['wall_s'] for s in stages), 3),
+        'peak_rss_mb': round(max(s['peak_rss_mb'] for s in stages), 1),
+        'groups': summarise(stages),
+        'stages': stages,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# ── History ──
+def read_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def append_history(path, record):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+
+def previous_run(history, record):
+    """Latest earlier record with the same scale, dataset size, seed and workers (None if this is the first)."""
+    fields = ['scale', 'accounts', 'seed', 'workers']
+    same = [r for r in history if all(r.get(f) == record[f] for f in fields)]
+    return same[-1] if same else None
+
+
+def compare(record, prev, max_slowdown=MAX_SLOWDOWN):
+    """Printable comparison against the previous run and the groups that slowed by more than max_slowdown."""
+    lines = [f"{'group':<14}{'seconds':>10}{'previous':>10}{'ratio':>8}"]
+    slower = []
+    for g in GROUP_ORDER + ['total']:
+        now = record['total_seconds'] if g == 'total' else record['groups'][g]
+        before = None if prev is None else (prev['total_seconds'] if g == 'total' else prev['groups'].get(g))
+        ratio = now / before if before else None
+        flag = ''
+        if ratio is not None and ratio > max_slowdown and now - before > 0.5:  # ignore sub-second noise
+            flag = '  SLOWER'
+            slower.append(g)
+        lines.append(f"{g:<14}{now:>10.2f}{'-' if before is None else f'{before:.2f}':>10}"
+                     f"{'-' if ratio is None else f'{ratio:.2f}x':>8}{flag}")
+    return '\n'.join(lines), slower
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline stages on synthetic data.')
+    parser.add_argument('--scales', type=float, nargs='+', default=[1.0], help='synth.py scales (1 = the real size), e.g. 0.1 1 10')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--bench-dir', default=DEFAULT_BENCH_DIR, help='synthetic datasets (reused across runs)')
+    parser.add_argument('--history', default=None, help=f'JSON-lines history (default <bench-dir>/{HISTORY_FILE})')
+    parser.add_argument('--max-slowdown', type=float, default=MAX_SLOWDOWN,
+                        help='exit non-zero if a group is slower than this ratio vs the previous run')
+    parser.add_argument('--verbose', action='store_true', help='show the pipeline output')
+    parser.add_argument('--child', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--result', default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        with open(args.result, 'w') as f:
+            json.dump(measure(args.child, args.workers), f)
+        sys.exit(0)
+
+    history_path = args.history or os.path.join(args.bench_dir, HISTORY_FILE)
+    regressions = []
+    for scale in args.scales:
+        print(f"── scale {scale:g} ──")
+        record = run_scale(args.bench_dir, scale, args.seed, args.workers, args.verbose)
+        prev = previous_run(read_history(history_path), record)
+        append_history(history_path, record)
+        table, slower = compare(record, prev, args.max_slowdown)
+        print(f"{record['accounts']:,} accounts, {record['transactions']:,} transactions; "
+              f"peak RSS {record['peak_rss_mb']:,.0f} MB")
+        print(table)
+        top = sorted(record['stages'], key=lambda s: -s['wall_s'])[:5]
+        print('slowest stages: ' + ', '.join(f"{s['stage']} {s['wall_s']:.2f}s" for s in top))
+        regressions += [f'{scale:g}x {g}' for g in slower]
+    print(f"History: {history_path}")
+    if regressions:
+        print(f"Regressions (> {args.max_slowdown:.2f}x): {', '.join(regressions)}")
+        sys.exit(1)
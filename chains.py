@@ -0,0 +1,147 @@
+"""
+NFPC Phase 1 - Money-Flow Chain Tracing
+Multi-hop layering (Section 6.10): money that moves A -> B -> C -> ... between known
+accounts, each hop leaving the previous payee within HOP_WINDOW and carrying between
+MIN_FORWARD_SHARE and MAX_FORWARD_SHARE of the amount that arrived.
+
+A transfer is a transaction whose counterparty ID is itself an account: a debit is
+account -> counterparty, a credit counterparty -> account (the same movement seen from
+both sides is kept once). Transfers are sorted once by (payer, timestamp), so the
+possible next hops of a transfer are one contiguous slice — found with two binary
+searches on packed (payer, time rank) keys, as in passthrough.py — and only the amount
+bounds are checked on the expanded candidates.
+
+Hops always move forward in time, so the chains form a DAG; the longest chain starting
+at (down) and ending at (up) every transfer come from at most MAX_DEPTH rounds of
+vectorised relaxation over the hop pairs.
+
+Per-account columns (CHAIN_COLUMNS):
+  forwarded_transfers   incoming transfers that continue as a next hop
+  max_chain_depth       hops in the longest chain the account takes part in (0: no transfers)
+  layering_score        onward hops per rupee received: sum(amount x (down - 1)) / sum(amount)
+                        over incoming transfers (0: money stops here)
+"""
+import pandas as pd
+import numpy as np
+import argparse, time
+from schema import key_codes
+
+HOP_WINDOW = pd.Timedelta(hours=48)
+MIN_FORWARD_SHARE = 0.8    # a mule keeps at most a 20% cut per hop
+MAX_FORWARD_SHARE = 1.05   # ... and may top it up slightly from its own balance
+MAX_DEPTH = 20
+MAX_PAIRS = 20_000_000     # candidate hop pairs materialised at once
+CHAIN_COLUMNS = ['forwarded_transfers', 'max_chain_depth', 'layering_score']
+
+
+def account_transfers(transactions):
+    """Movements between two known accounts, sorted by (payer, timestamp): dict of payer, payee, ts, amount."""
+    acct, accounts = key_codes(transactions['account_id'])
+    cp, counterparties = key_codes(transactions['counterparty_id'])
+    cp_acct = pd.Index(np.asarray(accounts, dtype=str)).get_indexer(np.asarray(counterparties, dtype=str))
+    other = np.where(cp >= 0, cp_acct[np.maximum(cp, 0)], -1)
+    ts = transactions['transaction_timestamp'].to_numpy()
+    amount = np.abs(transactions['amount'].to_numpy(dtype=np.float64))
+    txn_type = transactions['txn_type'].to_numpy()
+    keep = (other >= 0) & (acct >= 0) & (other != acct) & ~np.isnat(ts) & np.isfinite(amount) & np.isin(txn_type, ['C', 'D'])
+    debit = txn_type[keep] == 'D'
+    moves = pd.DataFrame({'payer': np.where(debit, acct[keep], other[keep]),
+                          'payee': np.where(debit, other[keep], acct[keep]),
+                          'ts': ts[keep], 'amount': amount[keep]}).drop_duplicates()
+    moves = moves.sort_values(['payer', 'ts'], kind='stable', ignore_index=True)
+    out = {k: moves[k].to_numpy() for k in moves.columns}
+    out['accounts'] = accounts
+    return out
+
+
+def hop_pairs(transfers, window=HOP_WINDOW, min_share=MIN_FORWARD_SHARE, max_share=MAX_FORWARD_SHARE,
+              max_pairs=MAX_PAIRS):
+    """(prev, next) transfer index pairs: next leaves prev's payee within the window, amount within the bounds."""
+    payer, payee, ts, amount = transfers['payer'], transfers['payee'], transfers['ts'], transfers['amount']
+    window = np.timedelta64(pd.Timedelta(window).value, 'ns').astype(f'm8[{np.datetime_data(ts.dtype)[0]}]')
+    # Rank-compressed times so (account, time) packs into one int64 key without overflow
+    grid = np.unique(np.concatenate([ts, ts + window]))
+    m = np.int64(len(grid) + 1)
+    key = payer.astype(np.int64) * m + np.searchsorted(grid, ts)
+    base = payee.astype(np.int64) * m
+    lo = np.searchsorted(key, base + np.searchsorted(grid, ts), side='right')
+    hi = np.searchsorted(key, base + np.searchsorted(grid, ts + window), side='right')
+    counts = hi - lo
+    cum = np.cumsum(counts)
+    prev, nxt = [], []
+    start = 0
+    while start < len(ts):
+        stop = max(int(np.searchsorted(cum, (cum[start - 1] if start else 0) + max_pairs, side='right')), start + 1)
+        cnt = counts[start:stop]
+        if cnt.sum():
+            owner = np.repeat(np.arange(start, stop), cnt)
+            cand = lo[owner] + np.arange(cnt.sum()) - np.repeat(np.cumsum(cnt) - cnt, cnt)
+            ok = (amount[cand] >= amount[owner] * min_share) & (amount[cand] <= amount[owner] * max_share)
+            prev.append(owner[ok])
+            nxt.append(cand[ok])
+        start = stop
+    if not prev:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(prev), np.concatenate(nxt)
+
+
+def chain_depths(n, prev, nxt, max_depth=MAX_DEPTH):
+    """Hops in the longest chain starting at (down) and ending at (up) each of n transfers, capped at max_depth."""
+    down = np.ones(n, dtype=np.int64)
+    up = np.ones(n, dtype=np.int64)
+    for _ in range(max_depth - 1):
+        new_down, new_up = np.ones(n, dtype=np.int64), np.ones(n, dtype=np.int64)
+        np.maximum.at(new_down, prev, down[nxt] + 1)
+        np.maximum.at(new_up, nxt, up[prev] + 1)
+        if np.array_equal(new_down, down) and np.array_equal(new_up, up):
+            break
+        down, up = new_down, new_up
+    return down, up
+
+
+def chain_features(transactions, window=HOP_WINDOW, min_share=MIN_FORWARD_SHARE, max_share=MAX_FORWARD_SHARE,
+                   max_depth=MAX_DEPTH):
+    """CHAIN_COLUMNS for every account present in `transactions`."""
+    transfers = account_transfers(transactions)
+    accounts = transfers['accounts']
+    n_acct = len(accounts)
+    payer, payee, amount = transfers['payer'], transfers['payee'], transfers['amount']
+    prev, nxt = hop_pairs(transfers, window, min_share, max_share)
+    down, up = chain_depths(len(payer), prev, nxt, max_depth)
+    through = np.minimum(up + down - 1, max_depth)
+
+    acct, _ = key_codes(transactions['account_id'])
+    present = np.bincount(acct[acct >= 0], minlength=n_acct) > 0
+    depth = np.zeros(n_acct, dtype=np.int64)
+    np.maximum.at(depth, payer, through)
+    np.maximum.at(depth, payee, through)
+    received = np.bincount(payee, weights=amount, minlength=n_acct)
+    onward = np.bincount(payee, weights=amount * (down - 1), minlength=n_acct)
+    out = pd.DataFrame({'account_id': accounts[present]})
+    out['forwarded_transfers'] = np.bincount(payee[down > 1], minlength=n_acct)[present]
+    out['max_chain_depth'] = depth[present]
+    out['layering_score'] = np.where(received > 0, onward / np.where(received > 0, received, 1), 0.0)[present]
+    if isinstance(transactions['account_id'].dtype, pd.CategoricalDtype):
+        out['account_id'] = pd.Categorical(out['account_id'], categories=accounts)
+    return out
+
+
+if __name__ == '__main__':
+    from ingest import DATA_DIR, load_tables
+    parser = argparse.ArgumentParser(description='Multi-hop money-flow chains between accounts (layering).')
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--hop-hours', type=float, default=HOP_WINDOW / pd.Timedelta(hours=1))
+    parser.add_argument('--min-share', type=float, default=MIN_FORWARD_SHARE)
+    parser.add_argument('--max-share', type=float, default=MAX_FORWARD_SHARE)
+    parser.add_argument('--max-depth', type=int, default=MAX_DEPTH)
+    parser.add_argument('--out', default='chains.parquet')
+    args = parser.parse_args()
+    tables = load_tables(args.data_dir)
+    t0 = time.perf_counter()
+    features = chain_features(tables['transactions'], pd.Timedelta(hours=args.hop_hours), args.min_share,
+                              args.max_share, args.max_depth)
+    print(f"{len(features):,} accounts in {time.perf_counter() - t0:.2f}s; "
+          f"{(features['max_chain_depth'] >= 2).mean() * 100:.1f}% in a chain of 2+ hops")
+    labelled = features.merge(tables['labels'][['account_id', 'is_mule']], on='account_id')
+    print(labelled.groupby('is_mule')[CHAIN_COLUMNS].mean().to_string())
+    features.to_parquet(args.out, index=False)
@@ -0,0 +1,167 @@
+"""
+NFPC Phase 1 - Mule-Ring Clusters
+Connected components of the account projection of the transaction graph (graph.py).
+Two accounts are linked when they share at least MIN_SHARED counterparties and the
+IDF-weighted cosine similarity of their counterparty sets is at least MIN_SIMILARITY.
+A counterparty's weight is log(accounts / accounts using it). A counterparty of a
+handful of accounts (a ring's collector) counts for much more than a merchant or
+payroll account used by hundreds. Normalising by each account's own weighted set keeps
+a very active account from linking to everyone through chance overlaps.
+
+A direct transfer is one shared counterparty, not a link of its own: an account that
+also appears as a counterparty holds its own column, so A paying B shares "B" with B.
+It is weighted and thresholded like any other counterparty.
+
+The projection is computed in row blocks and thresholded per block, so only the links
+that survive are ever held. Counterparties used by more than MAX_COUNTERPARTY_SHARE of
+the accounts are left out of the product. Their weight is near 0, and they would make
+it dense. Components are found by scipy's connected_components (union-find over the
+sparse link matrix).
+
+A component holding more than MAX_COMPONENT_SHARE of the accounts is not a ring. It
+means the thresholds are too loose for the data, and its mule rate would only be the
+global rate. Such a component raises a warning, and its accounts are treated as
+unclustered.
+
+Outputs:
+  clusters   one row per component of 2+ accounts: size, links, labelled accounts, mules,
+             mule_density (mules / labelled)
+  accounts   every account: cluster_id (-1 alone), cluster_size, cluster_mule_rate — the
+             mule rate of the *other* labelled members (own label left out; with CV folds
+             only the other folds' labels, as in guilt.py)
+"""
+import pandas as pd
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+import argparse, time, warnings
+from aggregations import _safe_div
+from graph import adjacency
+from guilt import account_labels, fold_ids
+from propagation import node_space
+
+MIN_SHARED = 2
+MIN_SIMILARITY = 0.2
+MAX_COUNTERPARTY_SHARE = 0.05
+MAX_COMPONENT_SHARE = 0.5
+BLOCK_ROWS = 20_000
+CLUSTER_COLUMNS = ['cluster_id', 'cluster_size', 'cluster_mule_rate']
+
+
+def counterparty_incidence(graph, direct=True):
+    """Binary account x counterparty matrix; with direct, an account is its own counterparty too."""
+    incidence = adjacency(graph, None)
+    if direct:
+        node, _, _ = node_space(graph)
+        cols = np.flatnonzero(node < incidence.shape[0])
+        own = sp.csr_matrix((np.ones(len(cols)), (node[cols], cols)), shape=incidence.shape)
+        incidence = ((incidence + own) > 0).astype(np.float64).tocsr()
+    return incidence
+
+
+def idf_weights(incidence, max_cp_share=MAX_COUNTERPARTY_SHARE):
+    """log(accounts / accounts using the counterparty); 0 for counterparties of one account or of more than max_cp_share."""
+    n = incidence.shape[0]
+    used_by = np.bincount(incidence.indices, minlength=incidence.shape[1])
+    keep = (used_by >= 2) & (used_by <= max(max_cp_share * n, 2))
+    return np.where(keep, np.log(n / np.maximum(used_by, 1)), 0.0)
+
+
+def account_links(graph, min_shared=MIN_SHARED, min_similarity=MIN_SIMILARITY,
+                  max_cp_share=MAX_COUNTERPARTY_SHARE, direct=True):
+    """Upper-triangular account x account CSR of the IDF-weighted cosine similarity of every linked pair."""
+    incidence = counterparty_incidence(graph, direct)
+    idf = idf_weights(incidence, max_cp_share)
+    cols = np.flatnonzero(idf > 0)
+    incidence, idf = incidence[:, cols].tocsr(), idf[cols]
+    weighted = incidence @ sp.diags(idf)
+    norm = np.sqrt(np.asarray(weighted.multiply(weighted).sum(axis=1)).ravel())
+    unit = (sp.diags(np.divide(1.0, norm, out=np.zeros_like(norm), where=norm > 0)) @ weighted).tocsr()
+    n = incidence.shape[0]
+    incidence_t, unit_t = incidence.T.tocsr(), unit.T.tocsr()
+    blocks = []
+    for start in range(0, n, BLOCK_ROWS):
+        # Same sparsity pattern (all weights > 0), so the canonical CSR data line up
+        shared = sp.triu(incidence[start:start + BLOCK_ROWS] @ incidence_t, k=start + 1).tocsr()
+        similarity = sp.triu(unit[start:start + BLOCK_ROWS] @ unit_t, k=start + 1).tocsr()
+        shared.sort_indices()
+        similarity.sort_indices()
+        shared, similarity = shared.tocoo(), similarity.tocoo()
+        keep = (shared.data >= min_shared) & (similarity.data >= min_similarity)
+        blocks.append((shared.row[keep] + start, shared.col[keep], similarity.data[keep]))
+    rows, cols, weight = (np.concatenate(x) for x in zip(*blocks)) if blocks else ([], [], [])
+    return sp.coo_matrix((np.asarray(weight, dtype=np.float64), (rows, cols)), shape=(n, n)).tocsr()
+
+
+def find_clusters(links):
+    """Component ID per account and the component sizes."""
+    _, comp = connected_components(links, directed=False)
+    return comp, np.bincount(comp)
+
+
+def cluster_features(graph, labels, folds=None, min_shared=MIN_SHARED, min_similarity=MIN_SIMILARITY,
+                     max_cp_share=MAX_COUNTERPARTY_SHARE, direct=True, max_component_share=MAX_COMPONENT_SHARE):
+    """(clusters, accounts) frames — see the module docstring."""
+    links = account_links(graph, min_shared, min_similarity, max_cp_share, direct)
+    comp, sizes = find_clusters(links)
+    giant = sizes > max_component_share * len(comp)
+    if giant.any():
+        warnings.warn(f"clusters: one component holds {sizes.max():,} of {len(comp):,} accounts; it is left unclustered "
+                      f"(raise min_shared / min_similarity)")
+    accounts = np.asarray(graph['accounts'])
+    is_mule, fold = account_labels(accounts, labels, folds)
+    labelled = np.isin(accounts, labels['account_id'].astype(str).to_numpy()).astype(np.float64)
+    if fold is None:
+        visible_y, visible_l = is_mule[:, None], labelled[:, None]
+        col = np.zeros(len(accounts), dtype=int)
+    else:
+        k = int(fold.max()) + 1
+        visible_y = np.column_stack([is_mule * (fold != f) for f in range(k)] + [is_mule])
+        visible_l = np.column_stack([labelled * (fold != f) for f in range(k)] + [labelled])
+        col = np.where(fold >= 0, fold, k)
+    member = sp.csr_matrix((np.ones(len(comp)), (comp, np.arange(len(comp)))), shape=(len(sizes), len(comp)))
+    mules = (member @ visible_y)[comp, col]
+    known = (member @ visible_l)[comp, col]
+    if fold is None:  # leave-one-out: the account's own label never counts
+        mules, known = mules - is_mule, known - labelled
+    multi = (sizes[comp] > 1) & ~giant[comp]
+    out = pd.DataFrame({'account_id': pd.Categorical(accounts, categories=accounts)})
+    out['cluster_id'] = np.where(multi, comp, -1)
+    out['cluster_size'] = np.where(multi, sizes[comp], 1)
+    out['cluster_mule_rate'] = np.where(multi & (known > 0), _safe_div(mules, known), np.nan)
+
+    ids = np.flatnonzero((sizes > 1) & ~giant)
+    link_count = np.bincount(comp[links.tocoo().row], minlength=len(sizes))
+    total_mules, total_known = member @ is_mule, member @ labelled
+    clusters = pd.DataFrame({'cluster_id': ids, 'size': sizes[ids], 'links': link_count[ids],
+                             'labelled': total_known[ids].astype(int), 'mules': total_mules[ids].astype(int)})
+    clusters['mule_density'] = np.where(clusters['labelled'] > 0,
+                                        _safe_div(clusters['mules'], clusters['labelled']), np.nan)
+    return clusters.sort_values(['mules', 'size'], ascending=False, ignore_index=True), out
+
+
+if __name__ == '__main__':
+    from ingest import DATA_DIR, load_tables
+    from graph import get_graph
+    parser = argparse.ArgumentParser(description='Mule-ring clusters: connected components of shared-counterparty links.')
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--min-shared', type=int, default=MIN_SHARED, help='shared counterparties for a link')
+    parser.add_argument('--min-similarity', type=float, default=MIN_SIMILARITY,
+                        help='IDF-weighted cosine similarity for a link')
+    parser.add_argument('--max-cp-share', type=float, default=MAX_COUNTERPARTY_SHARE,
+                        help='skip counterparties used by more than this share of the accounts')
+    parser.add_argument('--no-direct', action='store_true', help='ignore direct account-to-account transfers')
+    parser.add_argument('--folds', type=int, default=0, help='CV folds (0: leave-one-out)')
+    parser.add_argument('--out', default='clusters.parquet')
+    args = parser.parse_args()
+    graph = get_graph(args.data_dir)
+    labels = load_tables(args.data_dir, verbose=False, transactions=False)['labels']
+    folds = fold_ids(labels, args.folds) if args.folds else None
+    t0 = time.perf_counter()
+    clusters, accounts = cluster_features(graph, labels, folds, args.min_shared, args.min_similarity, args.max_cp_share,
+                                         not args.no_direct)
+    print(f"{len(clusters):,} clusters of 2+ accounts ({int(clusters['links'].sum()):,} links) "
+          f"in {time.perf_counter() - t0:.2f}s; {(accounts['cluster_id'] >= 0).mean() * 100:.1f}% of accounts clustered")
+    print(clusters.head(10).to_string(index=False))
+    accounts.to_parquet(args.out, index=False)
+    clusters.to_parquet(args.out.replace('.parquet', '_summary.parquet'), index=False)
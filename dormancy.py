@@ -0,0 +1,118 @@
+"""
+NFPC Phase 1 - Dormant Activation Detector
+Pattern 6.1: long-inactive accounts that suddenly move money. For every account (train
+and test) one sweep over the (account, time)-sorted timestamps finds each dormancy gap
+of at least DORMANCY_DAYS and measures the activity in the BURST_DAYS after the
+account wakes up.
+
+The sort is the one velocity.sorted_activity does: only an index order and the
+timestamp/amount columns are materialised, never a sorted copy of the frame. Window
+counts come from one searchsorted per reactivation, window volumes from the exact
+paise prefix sums of velocity.paise_prefix.
+
+Per-account columns (DORMANCY_COLUMNS):
+  dormant_episodes             gaps of at least DORMANCY_DAYS between consecutive transactions
+  max_dormancy_days            longest such gap in days (NaN without an episode)
+  reactivation_txn_count       most transactions in the BURST_DAYS after any reactivation
+  reactivation_volume          largest |amount| volume in the BURST_DAYS after any reactivation
+  reactivation_burst_ratio     that volume over the account's average volume per BURST_DAYS
+                               of active span (>1: the wake-up is busier than usual)
+  days_since_reactivation      days from the last reactivation to the account's last transaction
+  dormancy_days_before_burst   the dormancy gap (days) in front of the reactivation with the largest
+                               burst volume, earliest on ties; 0 without an episode (feature #24)
+"""
+import pandas as pd
+import numpy as np
+import argparse, time
+from functools import partial
+from aggregations import _safe_div
+from velocity import _window_ends, paise_prefix, sorted_activity
+
+DORMANCY_DAYS = 90   # same cut-off as the ">90 day dormancy gap" line in Section 6.1
+BURST_DAYS = 7
+DORMANCY_COLUMNS = ['dormant_episodes', 'max_dormancy_days', 'reactivation_txn_count', 'reactivation_volume',
+                    'reactivation_burst_ratio', 'days_since_reactivation', 'dormancy_days_before_burst']
+
+
+def reactivations(acct_sorted, t_sorted, min_gap_s):
+    """Row positions (in the sorted arrays) that end a gap of at least min_gap_s, and the gaps."""
+    if len(t_sorted) < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    gap = np.diff(t_sorted)
+    wake = np.flatnonzero((acct_sorted[1:] == acct_sorted[:-1]) & (gap >= min_gap_s)) + 1
+    return wake, gap[wake - 1]
+
+
+def dormancy_features(transactions, dormancy_days=DORMANCY_DAYS, burst_days=BURST_DAYS):
+    """DORMANCY_COLUMNS for every account present in `transactions`."""
+    acct, accounts, idx, t = sorted_activity(transactions)
+    n = len(accounts)
+    present = np.bincount(acct, minlength=n) > 0
+    a = acct[idx]
+    cum = paise_prefix(transactions['amount'].to_numpy(dtype=np.float64)[idx])
+
+    wake, gap = reactivations(a, t, dormancy_days * 86400)
+    owner = a[wake]
+    end = _window_ends(a, t, burst_days * 86400)[wake]
+    burst_count = end - wake
+
+    episodes = np.bincount(owner, minlength=n)
+    has = episodes > 0
+    longest = np.zeros(n, dtype=np.int64)
+    np.maximum.at(longest, owner, gap)
+    count = np.zeros(n, dtype=np.int64)
+    np.maximum.at(count, owner, burst_count)
+    burst_volume = cum[end] - cum[wake]
+    volume = np.zeros(n, dtype=np.int64)
+    np.maximum.at(volume, owner, burst_volume)
+    volume = volume / 100
+    # The gap in front of each account's biggest burst: largest volume first, earliest wake on ties
+    order = np.lexsort((-burst_volume, owner))
+    top = order[np.r_[True, owner[order][1:] != owner[order][:-1]]] if len(order) else order
+    burst_gap = np.zeros(n, dtype=np.int64)
+    burst_gap[owner[top]] = gap[top]
+
+    # Typical volume per burst window: total volume spread evenly over the active span
+    n_ts = np.bincount(a, minlength=n)
+    first_pos = np.cumsum(n_ts) - n_ts
+    last_pos = first_pos + n_ts - 1
+    has_ts = n_ts > 0
+    span_s = np.where(has_ts, t[np.where(has_ts, last_pos, 0)] - t[np.where(has_ts, first_pos, 0)], 0)
+    total = (cum[np.where(has_ts, last_pos + 1, 0)] - cum[np.where(has_ts, first_pos, 0)]) / 100
+    typical = total * burst_days * 86400 / np.maximum(span_s, burst_days * 86400)
+    last_wake = np.full(n, -1, dtype=np.int64)
+    last_wake[owner] = wake  # reactivations are in time order, so the last write wins
+
+    out = pd.DataFrame({'account_id': accounts[present]})
+    out['dormant_episodes'] = episodes[present]
+    out['max_dormancy_days'] = np.where(has, longest / 86400, np.nan)[present]
+    out['reactivation_txn_count'] = count[present]
+    out['reactivation_volume'] = volume[present]
+    out['reactivation_burst_ratio'] = np.where(has, _safe_div(volume, typical), np.nan)[present]
+    since = (t[np.where(has_ts, last_pos, 0)] - t[np.maximum(last_wake, 0)]) / 86400
+    out['days_since_reactivation'] = np.where(has, since, np.nan)[present]
+    out['dormancy_days_before_burst'] = (burst_gap / 86400)[present]
+    if isinstance(transactions['account_id'].dtype, pd.CategoricalDtype):
+        out['account_id'] = pd.Categorical(out['account_id'], categories=accounts)
+    return out
+
+
+if __name__ == '__main__':
+    from ingest import DATA_DIR, load_tables
+    from parallel import map_accounts
+    parser = argparse.ArgumentParser(description='Dormant-activation features for every account.')
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--dormancy-days', type=int, default=DORMANCY_DAYS)
+    parser.add_argument('--burst-days', type=int, default=BURST_DAYS)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--out', default='dormancy.parquet')
+    args = parser.parse_args()
+    tables = load_tables(args.data_dir)
+    t0 = time.perf_counter()
+    kernel = partial(dormancy_features, dormancy_days=args.dormancy_days, burst_days=args.burst_days)
+    features = map_accounts({'dormancy': kernel}, tables['transactions'], args.workers)['dormancy']
+    print(f"{len(features):,} accounts in {time.perf_counter() - t0:.2f}s; "
+          f"{(features['dormant_episodes'] > 0).mean() * 100:.1f}% with a >= {args.dormancy_days}-day dormancy")
+    labelled = features.merge(tables['labels'][['account_id', 'is_mule']], on='account_id')
+    print(labelled.groupby('is_mule')[DORMANCY_COLUMNS].median().to_string())
+    features.to_parquet(args.out, index=False)
@@ -0,0 +1,132 @@
+"""
+NFPC Phase 1 - Entity Index
+Accounts, customers and products as integer-keyed, aligned column arrays: row i of every
+account column belongs to account code i, row j of every customer and product column
+to customer code j. Codes are the positions in the shared key dictionaries that ingest
+gives every key column of a domain (schema.unify_keys), so looking up an account set
+is one code lookup and an np.take per requested column — no merge chain, no copies of
+columns nobody asked for.
+
+The account -> customer map comes from customer_account_linkage; an account linked to
+several customers takes the first (as in feature_store.profile_features). Accounts,
+customers or products without a row come back missing (NaN/NA/NaT), as with a left
+merge.
+
+    index = build_index(tables)
+    profile = fetch(index, labels['account_id'], ['branch_code', 'date_of_birth', 'loan_sum'])
+"""
+import pandas as pd
+import numpy as np
+import argparse, time
+
+ENTITIES = {'account': ('accounts', 'account_id'), 'customer': ('customers', 'customer_id'),
+            'product': ('products', 'customer_id')}
+
+
+def _domain(*keys):
+    """Shared key dictionary of the given key columns (their categories when they already share one)."""
+    cats = [k.cat.categories for k in keys if isinstance(k.dtype, pd.CategoricalDtype)]
+    if len(cats) == len(keys) and all(c.equals(cats[0]) for c in cats):
+        return cats[0]
+    return pd.Index(np.unique(np.concatenate([k.dropna().astype(str).to_numpy() for k in keys])))
+
+
+def codes(domain, keys):
+    """Integer code of each key in `domain` (-1: unknown or missing)."""
+    keys = pd.Series(keys)
+    if isinstance(keys.dtype, pd.CategoricalDtype) and keys.cat.categories.equals(domain):
+        return keys.cat.codes.to_numpy().astype(np.int64)
+    return domain.get_indexer(keys.astype(str).to_numpy()).astype(np.int64)
+
+
+def _positions(domain, keys):
+    """Row of each domain code in a key column (-1: no row; the first row wins)."""
+    c = codes(domain, keys)
+    pos = np.full(len(domain), -1, dtype=np.int64)
+    rows = np.flatnonzero(c >= 0)[::-1]  # reversed, so the first row's write lands last
+    pos[c[rows]] = rows
+    return pos
+
+
+def _take(values, idx):
+    """values[idx] for a pandas array, missing where idx is -1."""
+    return values.take(idx, allow_fill=bool((idx < 0).any()))
+
+
+def build_index(tables):
+    """Aligned column arrays per entity plus the account -> customer code map."""
+    account_ids = _domain(tables['accounts']['account_id'], tables['linkage']['account_id'])
+    customer_ids = _domain(tables['customers']['customer_id'], tables['linkage']['customer_id'],
+                           tables['products']['customer_id'])
+    domains = {'account': account_ids, 'customer': customer_ids, 'product': customer_ids}
+    index = {'account_ids': account_ids, 'customer_ids': customer_ids, 'columns': {}}
+    for entity, (table, key) in ENTITIES.items():
+        df = tables[table]
+        pos = _positions(domains[entity], df[key])
+        index[entity] = {col: _take(df[col].array, pos) for col in df.columns if col != key}
+        index['columns'].update({col: entity for col in index[entity]})
+    link = tables['linkage']
+    pos = _positions(account_ids, link['account_id'])
+    linked = codes(customer_ids, link['customer_id'])
+    index['account_customer'] = np.where(pos >= 0, linked[np.maximum(pos, 0)], -1)
+    return index
+
+
+def customer_codes(index, account_codes):
+    """Customer code of each account code (-1: unknown account or no linked customer)."""
+    account_codes = np.asarray(account_codes, dtype=np.int64)
+    return np.where(account_codes >= 0, index['account_customer'][np.maximum(account_codes, 0)], -1)
+
+
+def fetch(index, account_ids, columns=None):
+    """Columns of accounts, their customers and products for `account_ids`, in input order.
+
+    columns defaults to every indexed column; 'customer_id' is available as well.
+    """
+    acct = codes(index['account_ids'], account_ids)
+    cust = customer_codes(index, acct)
+    columns = list(index['columns']) if columns is None else list(columns)
+    out = {}
+    for col in columns:
+        if col == 'customer_id':
+            out[col] = pd.Categorical.from_codes(cust, categories=index['customer_ids'])
+            continue
+        entity = index['columns'][col]
+        out[col] = _take(index[entity][col], acct if entity == 'account' else cust)
+    return pd.DataFrame(out)
+
+
+def attach(frame, index, columns=None):
+    """`frame` (with account_id) plus the fetched columns — the old labels/accounts/linkage/customers/products merge."""
+    if columns is None:  # the merge chain's column order
+        account_cols = [c for c, e in index['columns'].items() if e == 'account']
+        columns = account_cols + ['customer_id'] + [c for c in index['columns'] if c not in account_cols]
+    extra = fetch(index, frame['account_id'], [c for c in columns if c not in frame.columns])
+    return pd.concat([frame.reset_index(drop=True), extra], axis=1)
+
+
+if __name__ == '__main__':
+    from ingest import DATA_DIR, load_tables
+    parser = argparse.ArgumentParser(description='Entity index vs the merge chain on the train accounts.')
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    tables = load_tables(args.data_dir, verbose=False, transactions=False)
+    labels = tables['labels']
+    t0 = time.perf_counter()
+    index = build_index(tables)
+    print(f"index: {len(index['account_ids']):,} accounts, {len(index['customer_ids']):,} customers, "
+          f"{len(index['columns'])} columns in {time.perf_counter() - t0:.3f}s")
+
+    def merge_chain():
+        return (labels.merge(tables['accounts'], on='account_id', how='left')
+                .merge(tables['linkage'], on='account_id', how='left')
+                .merge(tables['customers'], on='customer_id', how='left')
+                .merge(tables['products'], on='customer_id', how='left'))
+
+    for name, fn in [('merge chain', merge_chain), ('attach', lambda: attach(labels, index)),
+                     ('fetch 3 columns', lambda: fetch(index, labels['account_id'], ['branch_code', 'date_of_birth', 'loan_sum']))]:
+        t0 = time.perf_counter()
+        for _ in range(args.repeat):
+            fn()
+        print(f"{name:<16} {(time.perf_counter() - t0) / args.repeat * 1000:8.2f} ms")
@@ -0,0 +1,394 @@
+"""
+NFPC Phase 1 - Feature Store
+Computes the 46 features of the Section 9 plan for every train and test account and
+writes them to one versioned Parquet file, so modelling jobs read precomputed features
+instead of re-deriving them from the 7.4M transactions.
+
+REGISTRY lists every feature with its plan number, category, the kernel that produces
+it, the features/kernels it depends on and its source tables. The file carries the
+store version and a hash of the registry in its Parquet metadata; read_features()
+refuses a file written by a different registry.
+
+Label-derived features (branch mule rate, shared mule counterparties) leave the
+account's own label out, so a train account never sees its own target.
+"""
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import scipy.sparse as sp
+import argparse, hashlib, json, os, time
+from aggregations import NEAR_THRESHOLD, _safe_div, account_aggregates, degree_stats
+from dormancy import dormancy_features
+from entity_index import build_index, fetch
+from guilt import account_labels, shared_mule_counterparties
+from passthrough import pass_through_scores
+from parallel import map_accounts
+from schema import key_codes
+from velocity import daily_buckets, sorted_activity, window_max_count
+
+STORE_VERSION = 1
+REF_DATE = pd.Timestamp('2025-06-30')
+FEATURE_FILE = 'features.parquet'
+NIGHT_HOURS = [22, 23, 0, 1, 2, 3, 4, 5]
+SALARY_DAYS = [28, 29, 30, 1, 2, 3]
+ROUND_UNIT = 1000
+STRUCTURING_BAND = 10_000  # amounts within ₹10K below a threshold count, weighted by closeness
+
+KYC_FLAGS = ['pan_available', 'aadhaar_available', 'passport_available']
+DIGITAL_FLAGS = ['mobile_banking_flag', 'internet_banking_flag', 'atm_card_flag',
+                 'demat_flag', 'credit_card_flag', 'fastag_flag']
+BALANCE_COLS = ['monthly_avg_balance', 'quarterly_avg_balance', 'daily_avg_balance']
+PRODUCT_COUNTS = ['loan_count', 'cc_count', 'od_count', 'ka_count', 'sa_count']
+
+# Weak signals averaged (as percentile ranks) into layered_composite_score
+LAYERED_SIGNALS = ['night_txn_ratio', 'near_threshold_fraction', 'round_amount_fraction',
+                   'pass_through_score', 'burst_score', 'fan_in_out_ratio',
+                   'counterparty_mule_overlap_rate', 'pin_mismatch', 'salary_cycle_exploitation_score']
+
+
+def _f(no, category, kernel, sources, depends_on=()):
+    return {'no': no, 'category': category, 'kernel': kernel, 'sources': list(sources),
+            'depends_on': list(depends_on)}
+
+
+TXN = ['transactions']
+REGISTRY = {
+    # ── A: behavioural (aggregations.account_aggregates) ──
+    'txn_count': _f(1, 'A', 'account_aggregates', TXN),
+    'total_volume': _f(2, 'A', 'account_aggregates', TXN),
+    'avg_txn_amount': _f(3, 'A', 'account_aggregates', TXN),
+    'median_txn_amount': _f(4, 'A', 'account_aggregates', TXN),
+    'max_single_txn': _f(5, 'A', 'account_aggregates', TXN),
+    'txn_amount_std': _f(6, 'A', 'account_aggregates', TXN),
+    'txn_amount_skewness': _f(7, 'A', 'account_aggregates', TXN),
+    'credit_debit_ratio': _f(8, 'A', 'account_aggregates', TXN),
+    'unique_channels': _f(9, 'A', 'account_aggregates', TXN),
+    'dominant_channel_pct': _f(10, 'A', 'account_aggregates', TXN),
+    'unique_counterparties': _f(11, 'A', 'account_aggregates', TXN),
+    'counterparty_entropy': _f(12, 'A', 'account_aggregates', TXN),
+    'reversal_count': _f(13, 'A', 'account_aggregates', TXN),
+    'reversal_rate': _f(14, 'A', 'account_aggregates', TXN),
+    'near_threshold_fraction': _f(15, 'A', 'account_aggregates', TXN),
+    # ── B: temporal (temporal_features, mobile_change_velocity) ──
+    'night_txn_ratio': _f(16, 'B', 'temporal_features', TXN),
+    'weekend_txn_ratio': _f(17, 'B', 'temporal_features', TXN),
+    'txn_velocity_7d': _f(18, 'B', 'temporal_features', TXN),
+    'txn_velocity_30d': _f(19, 'B', 'temporal_features', TXN),
+    'velocity_ratio_7d_30d': _f(20, 'B', 'temporal_features', TXN, ['txn_velocity_7d', 'txn_velocity_30d']),
+    'max_daily_txn_count': _f(21, 'B', 'temporal_features', TXN),
+    'max_daily_txn_volume': _f(22, 'B', 'temporal_features', TXN),
+    'burst_score': _f(23, 'B', 'temporal_features', TXN, ['max_daily_txn_volume']),
+    'dormancy_days_before_burst': _f(24, 'B', 'dormancy_features', TXN),
+    'post_mobile_change_velocity_ratio': _f(25, 'B', 'mobile_change_velocity', TXN + ['accounts']),
+    # ── C: graph / network ──
+    'in_degree': _f(26, 'C', 'degree_stats', TXN),
+    'out_degree': _f(27, 'C', 'degree_stats', TXN),
+    'fan_in_out_ratio': _f(28, 'C', 'degree_stats', TXN, ['in_degree', 'out_degree']),
+    'shared_counterparties_with_mules': _f(29, 'C', 'mule_counterparty_overlap', TXN + ['labels']),
+    'counterparty_mule_overlap_rate': _f(30, 'C', 'mule_counterparty_overlap', TXN + ['labels'],
+                                         ['shared_counterparties_with_mules', 'unique_counterparties']),
+    'branch_mule_concentration': _f(31, 'C', 'branch_features', ['accounts', 'labels']),
+    'branch_mule_rank': _f(32, 'C', 'branch_features', ['accounts', 'labels'], ['branch_mule_concentration']),
+    'degree_centrality': _f(33, 'C', 'degree_stats', TXN),
+    # ── D: account / customer profile ──
+    'account_age_days': _f(34, 'D', 'profile_features', ['accounts']),
+    'relationship_tenure_days': _f(35, 'D', 'profile_features', ['customers', 'linkage']),
+    'kyc_document_count': _f(36, 'D', 'profile_features', ['customers', 'linkage']),
+    'digital_channel_count': _f(37, 'D', 'profile_features', ['customers', 'linkage']),
+    'balance_volatility': _f(38, 'D', 'profile_features', ['accounts']),
+    'pin_mismatch': _f(39, 'D', 'profile_features', ['customers', 'linkage', 'accounts']),
+    'product_holding_diversity': _f(40, 'D', 'profile_features', ['products', 'linkage']),
+    'total_liability_ratio': _f(41, 'D', 'profile_features', ['products', 'linkage']),
+    # ── E: anomaly / composite ──
+    'pass_through_score': _f(42, 'E', 'pass_through_scores', TXN),
+    'structuring_score': _f(43, 'E', 'amount_patterns', TXN),
+    'round_amount_fraction': _f(44, 'E', 'amount_patterns', TXN),
+    'salary_cycle_exploitation_score': _f(45, 'E', 'amount_patterns', TXN),
+    'layered_composite_score': _f(46, 'E', 'layered_composite', TXN + ['accounts', 'customers', 'labels'],
+                                  LAYERED_SIGNALS),
+}
+FEATURE_NAMES = sorted(REGISTRY, key=lambda name: REGISTRY[name]['no'])
+
+AGGREGATE_RENAMES = {
+    'avg_amount': 'avg_txn_amount', 'median_amount': 'median_txn_amount', 'max_amount': 'max_single_txn',
+    'std_amount': 'txn_amount_std', 'amount_skewness': 'txn_amount_skewness',
+}
+
+
+def registry_hash():
+    payload = json.dumps({'version': STORE_VERSION, 'registry': REGISTRY}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+# ── Per-account transaction kernels (shardable: each uses only the account's own rows) ──
+def temporal_features(transactions):
+    """Category B features #16-#23 for every account in `transactions` (#24 comes from dormancy.py)."""
+    acct, accounts, idx, t = sorted_activity(transactions)
+    n = len(accounts)
+    rows = np.bincount(acct, minlength=n)
+    present = rows > 0
+    ts = transactions['transaction_timestamp']
+    night = ts.dt.hour.isin(NIGHT_HOURS).to_numpy()
+    weekend = (ts.dt.dayofweek >= 5).to_numpy()
+    out = pd.DataFrame({'account_id': accounts[present]})
+    out['night_txn_ratio'] = _safe_div(np.bincount(acct[night], minlength=n), rows)[present]
+    out['weekend_txn_ratio'] = _safe_div(np.bincount(acct[weekend], minlength=n), rows)[present]
+
+    a = acct[idx]
+    v7 = window_max_count(a, t, 7 * 86400, n)
+    v30 = window_max_count(a, t, 30 * 86400, n)
+    out['txn_velocity_7d'] = v7[present]
+    out['txn_velocity_30d'] = v30[present]
+    out['velocity_ratio_7d_30d'] = _safe_div(v7, v30)[present]
+
+    # Daily activity: one (account, day) bucket per active day, days ascending per account
+    amount = transactions['amount'].to_numpy(dtype=np.float64)[idx]
+    d_acct, _, d_count, d_vol = daily_buckets(a, t, amount)
+    max_count = np.zeros(n, dtype=np.int64)
+    np.maximum.at(max_count, d_acct, d_count)
+    max_vol = np.zeros(n)
+    np.maximum.at(max_vol, d_acct, d_vol)
+    mean_vol = _safe_div(np.bincount(d_acct, weights=d_vol, minlength=n), np.bincount(d_acct, minlength=n))
+    out['max_daily_txn_count'] = max_count[present]
+    out['max_daily_txn_volume'] = max_vol[present]
+    out['burst_score'] = _safe_div(max_vol, mean_vol)[present]
+    return _keep_categories(out, transactions, accounts)
+
+
+def structuring_weight(abs_amount, thresholds=(NEAR_THRESHOLD[1],)):
+    """Per transaction: 1 just below a threshold, falling linearly to 0 at STRUCTURING_BAND below it."""
+    weight = np.zeros(len(abs_amount))
+    for th in thresholds:
+        below = th - abs_amount
+        band = (below > 0) & (below <= STRUCTURING_BAND)
+        weight = np.maximum(weight, np.where(band, 1 - below / STRUCTURING_BAND, 0.0))
+    return weight
+
+
+def amount_patterns(transactions, thresholds=(NEAR_THRESHOLD[1],)):
+    """Category E features #43-#45: structuring, round amounts and month-boundary volume."""
+    acct, accounts = key_codes(transactions['account_id'])
+    n = len(accounts)
+    rows = np.bincount(acct, minlength=n)
+    present = rows > 0
+    abs_amount = np.abs(transactions['amount'].to_numpy(dtype=np.float64))
+    valid = ~np.isnan(abs_amount)
+    weight = structuring_weight(abs_amount, thresholds)
+    is_round = valid & (abs_amount > 0) & (np.mod(abs_amount, ROUND_UNIT) == 0)
+    salary = transactions['transaction_timestamp'].dt.day.isin(SALARY_DAYS).to_numpy()
+    vol = np.where(valid, abs_amount, 0.0)
+    out = pd.DataFrame({'account_id': accounts[present]})
+    out['structuring_score'] = np.bincount(acct, weights=weight, minlength=n)[present]
+    out['round_amount_fraction'] = _safe_div(np.bincount(acct[is_round], minlength=n), rows)[present]
+    out['salary_cycle_exploitation_score'] = _safe_div(np.bincount(acct, weights=np.where(salary, vol, 0.0), minlength=n),
+                                                       np.bincount(acct, weights=vol, minlength=n))[present]
+    return _keep_categories(out, transactions, accounts)
+
+
+def _keep_categories(out, transactions, accounts):
+    if isinstance(transactions['account_id'].dtype, pd.CategoricalDtype):
+        out['account_id'] = pd.Categorical(out['account_id'], categories=accounts)
+    return out
+
+
+KERNELS = {
+    'account_aggregates': account_aggregates,
+    'degree_stats': degree_stats,
+    'pass_through_scores': pass_through_scores,
+    'temporal_features': temporal_features,
+    'amount_patterns': amount_patterns,
+    'dormancy_features': dormancy_features,
+}
+
+
+# ── Features that need tables beyond the account's own transactions ──
+def mobile_change_velocity(transactions, accounts):
+    """Transactions per day after the last mobile update / per day before it (#25)."""
+    acct, labels = key_codes(transactions['account_id'])
+    n = len(labels)
+    upd = accounts.assign(account_id=accounts['account_id'].astype(str)).drop_duplicates('account_id')
+    upd = upd.set_index('account_id')['last_mobile_update_date'].reindex(labels.astype(str))
+    u = upd.to_numpy().astype('M8[s]').view(np.int64)[acct]
+    ts = transactions['transaction_timestamp'].to_numpy().astype('M8[s]')
+    ok = ~np.isnat(ts) & (u != np.iinfo(np.int64).min)
+    t = ts.view(np.int64)
+    first = np.full(n, np.iinfo(np.int64).max)
+    last = np.full(n, np.iinfo(np.int64).min)
+    np.minimum.at(first, acct[ok], t[ok])
+    np.maximum.at(last, acct[ok], t[ok])
+    after = ok & (t >= u)
+    u_acct = np.full(n, np.iinfo(np.int64).min)
+    u_acct[acct[ok]] = u[ok]
+    days_before = np.maximum(u_acct - first, 0) / 86400 + 1
+    days_after = np.maximum(last - u_acct, 0) / 86400 + 1
+    rate_after = np.bincount(acct[after], minlength=n) / days_after
+    rate_before = np.bincount(acct[ok & ~after], minlength=n) / days_before
+    has = np.bincount(acct[ok], minlength=n) > 0
+    out = pd.DataFrame({'account_id': labels[has]})
+    out['post_mobile_change_velocity_ratio'] = _safe_div(rate_after, rate_before)[has]
+    return _keep_categories(out, transactions, labels)
+
+
+def shared_with_mules(pairs, labels):
+    """Per account, distinct counterparties also used by at least one *other* known mule (#29).
+
+    `pairs` holds distinct (account_id, counterparty_id) rows; see guilt.py for the fold-aware version.
+    """
+    acct, accounts = pd.factorize(pairs['account_id'].astype(str))
+    cp, cps = pd.factorize(pairs['counterparty_id'].astype(str))
+    incidence = sp.csr_matrix((np.ones(len(acct)), (acct, cp)), shape=(len(accounts), len(cps)))
+    is_mule, _ = account_labels(np.asarray(accounts), labels)
+    return pd.DataFrame({'account_id': accounts,
+                         'shared_counterparties_with_mules': shared_mule_counterparties(incidence, is_mule)})
+
+
+def mule_counterparty_overlap(transactions, labels):
+    pairs = transactions[['account_id', 'counterparty_id']].dropna().drop_duplicates()
+    return shared_with_mules(pairs, labels)
+
+
+def branch_features(base, index, labels):
+    """Leave-one-out branch mule rate (#31) and its percentile among branches (#32)."""
+    lab = fetch(index, labels['account_id'], ['branch_code']).assign(is_mule=labels['is_mule'].to_numpy())
+    branch = lab.groupby('branch_code')['is_mule'].agg(['sum', 'count'])
+    df = fetch(index, base['account_id'], ['branch_code']).assign(account_id=base['account_id'].to_numpy(),
+                                                                  is_mule=base['is_mule'].to_numpy())
+    mules = df['branch_code'].map(branch['sum']).fillna(0) - df['is_mule'].fillna(0)
+    total = df['branch_code'].map(branch['count']).fillna(0) - df['is_mule'].notna().astype(int)
+    rate = pd.Series(_safe_div(mules.to_numpy(float), total.to_numpy(float)), index=df.index)
+    branch_rates = np.sort((branch['sum'] / branch['count']).to_numpy())
+    rank = np.searchsorted(branch_rates, rate.fillna(-1).to_numpy(), side='right') / max(len(branch_rates), 1)
+    return pd.DataFrame({'account_id': df['account_id'], 'branch_mule_concentration': rate,
+                         'branch_mule_rank': np.where(rate.notna(), rank, np.nan)})
+
+
+def profile_features(base, index):
+    """Category D features #34-#41 (the account's first linked customer), via the entity index."""
+    df = fetch(index, base['account_id'], ['account_opening_date', 'relationship_start_date', 'customer_pin', 'branch_pin']
+               + KYC_FLAGS + DIGITAL_FLAGS + BALANCE_COLS + PRODUCT_COUNTS + ['loan_sum', 'cc_sum', 'od_sum', 'sa_sum'])
+    out = pd.DataFrame({'account_id': base['account_id'].to_numpy()})
+    out['account_age_days'] = (REF_DATE - df['account_opening_date']).dt.days
+    out['relationship_tenure_days'] = (REF_DATE - df['relationship_start_date']).dt.days
+    out['kyc_document_count'] = sum((df[c] == 'Y').astype(int) for c in KYC_FLAGS)
+    out['digital_channel_count'] = sum((df[c] == 'Y').astype(int) for c in DIGITAL_FLAGS)
+    out['balance_volatility'] = df[BALANCE_COLS].std(axis=1)
+    out['pin_mismatch'] = (df['customer_pin'] != df['branch_pin']).astype(int)
+    out['product_holding_diversity'] = (df[PRODUCT_COUNTS].fillna(0) > 0).sum(axis=1)
+    liabilities = df[['loan_sum', 'cc_sum', 'od_sum']].abs().sum(axis=1)
+    out['total_liability_ratio'] = _safe_div(liabilities.to_numpy(), df['sa_sum'].abs().fillna(0).to_numpy())
+    return out
+
+
+def layered_composite(features):
+    """Mean percentile rank of the weak signals in LAYERED_SIGNALS (#46); missing signals rank 0."""
+    ranks = [features[c].rank(pct=True).fillna(0) for c in LAYERED_SIGNALS]
+    return sum(ranks) / len(ranks)
+
+
+# ── Build ──
+def store_accounts(labels, test):
+    """Every train and test account, with split and the train label."""
+    base = pd.concat([labels[['account_id', 'is_mule']].assign(split='train'),
+                      test[['account_id']].assign(split='test')], ignore_index=True)
+    base['account_id'] = base['account_id'].astype(str)
+    return base
+
+
+def _by_account(frame):
+    return frame.assign(account_id=frame['account_id'].astype(str))
+
+
+def assemble(parts, tables):
+    """Join per-account feature frames onto every train/test account and add the
+    profile, branch and composite features. Columns outside REGISTRY are ignored."""
+    base = store_accounts(tables['labels'], tables['test'])
+    features = base
+    for part in parts:
+        cols = [c for c in part.columns if c in REGISTRY and c not in features.columns]
+        features = features.merge(_by_account(part[['account_id'] + cols]), on='account_id', how='left')
+    index = build_index(tables)
+    features = features.merge(branch_features(base, index, tables['labels']), on='account_id', how='left')
+    features = features.merge(profile_features(base, index), on='account_id', how='left')
+
+    # Accounts without transactions: counts are 0, ratios stay missing
+    for col in ['txn_count', 'total_volume', 'credit_count', 'debit_count', 'reversal_count',
+                'unique_channels', 'unique_counterparties', 'in_degree', 'out_degree', 'degree_centrality',
+                'txn_velocity_7d', 'txn_velocity_30d', 'max_daily_txn_count', 'max_daily_txn_volume',
+                'shared_counterparties_with_mules', 'structuring_score']:
+        if col in features:
+            features[col] = features[col].fillna(0)
+    features['counterparty_mule_overlap_rate'] = _safe_div(features['shared_counterparties_with_mules'].to_numpy(float),
+                                                           features['unique_counterparties'].to_numpy(float))
+    features['layered_composite_score'] = layered_composite(features)
+    return features[['account_id', 'split', 'is_mule'] + FEATURE_NAMES]
+
+
+def build_features(tables, workers=1):
+    """All REGISTRY features for every train/test account, as one DataFrame."""
+    transactions = tables['transactions']
+    kernels = map_accounts(KERNELS, transactions, workers)
+    agg = kernels['account_aggregates'].rename(columns=AGGREGATE_RENAMES)
+    deg = kernels['degree_stats']
+    deg['degree_centrality'] = deg['total_degree'] / max(deg['total_degree'].max(), 1)
+    parts = [agg, kernels['temporal_features'], deg, kernels['pass_through_scores'],
+             kernels['amount_patterns'], kernels['dormancy_features'], mobile_change_velocity(transactions, tables['accounts']),
+             mule_counterparty_overlap(transactions, tables['labels'])]
+    return assemble(parts, tables)
+
+
+def write_features(features, out_dir, sources=None, mode='full'):
+    """Write features.parquet (+ registry.json) with the store version in the file metadata.
+
+    mode is 'full' for build_features, 'incremental' for a store maintained by incremental.py.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    meta = {'store_version': STORE_VERSION, 'registry_hash': registry_hash(), 'mode': mode,
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'sources': sources or {}}
+    table = pa.Table.from_pandas(features, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                           b'nfpc_feature_store': json.dumps(meta).encode()})
+    path = os.path.join(out_dir, FEATURE_FILE)
+    pq.write_table(table, path + '.tmp', compression='zstd')
+    os.replace(path + '.tmp', path)
+    with open(os.path.join(out_dir, 'registry.json'), 'w') as f:
+        json.dump({**meta, 'features': {name: REGISTRY[name] for name in FEATURE_NAMES}}, f, indent=2)
+    return path
+
+
+def store_metadata(path):
+    raw = pq.read_schema(path).metadata or {}
+    return json.loads(raw.get(b'nfpc_feature_store', b'{}'))
+
+
+def read_features(path, columns=None):
+    """Load the feature store; fails if it was written by a different registry version."""
+    meta = store_metadata(path)
+    if meta.get('registry_hash') != registry_hash():
+        raise ValueError(f"{path} was built by feature registry {meta.get('registry_hash')} "
+                         f"(store v{meta.get('store_version')}); current is {registry_hash()} — rebuild it")
+    cols = None if columns is None else ['account_id', 'split', 'is_mule'] + list(columns)
+    return pd.read_parquet(path, columns=cols)
+
+
+if __name__ == '__main__':
+    from ingest import DATA_DIR, default_cache_dir, load_tables, read_manifest
+    parser = argparse.ArgumentParser(description='Build the 46-feature store for every train and test account.')
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--out-dir', default=None, help='defaults to <data-dir>/feature_store')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--list', action='store_true', help='print the feature registry and exit')
+    args = parser.parse_args()
+    if args.list:
+        reg = pd.DataFrame([{'feature': n, **REGISTRY[n]} for n in FEATURE_NAMES])
+        reg['sources'] = reg['sources'].str.join(', ')
+        reg['depends_on'] = reg['depends_on'].str.join(', ')
+        print(reg.to_string(index=False))
+        raise SystemExit
+    t0 = time.perf_counter()
+    tables = load_tables(args.data_dir)
+    sources = {k: v['sha256'] for k, v in read_manifest(default_cache_dir(args.data_dir))['tables'].items()}
+    features = build_features(tables, args.workers)
+    path = write_features(features, args.out_dir or os.path.join(args.data_dir, 'feature_store'), sources)
+    print(f"Wrote {len(features):,} accounts x {len(FEATURE_NAMES)} features to {path} "
+          f"in {time.perf_counter() - t0:.1f}s")
@@ -0,0 +1,106 @@
+"""
+NFPC Phase 1 - Guilt-by-Association Features
+Features #29/#30 for every account from the account x counterparty incidence matrix B
+(graph.py) and the mule label vector y: B.T @ y counts the known mules behind each
+counterparty, and an account's shared counterparties are its edges whose count —
+without the account's own label — is positive.
+
+Labels never leak into their own account's feature:
+  no folds   leave-one-out — each account's own label is subtracted
+  folds      an account in CV fold k sees only the mules of the other folds (one
+             mat-vec per fold, all done as one sparse x dense product); accounts
+             outside the folds (test / unlabelled) see every mule
+"""
+import pandas as pd
+import numpy as np
+import scipy.sparse as sp
+import argparse, time
+from aggregations import _safe_div
+from graph import adjacency, edge_rows
+
+GUILT_COLUMNS = ['shared_counterparties_with_mules', 'counterparty_mule_overlap_rate', 'mule_counterparty_txn_share']
+
+
+def fold_ids(labels, n_folds=5, seed=0):
+    """Stratified fold number per labelled account (Series indexed by account_id as str)."""
+    rng = np.random.default_rng(seed)
+    out = []
+    for _, grp in labels.groupby('is_mule'):
+        ids = grp['account_id'].astype(str).to_numpy()[rng.permutation(len(grp))]
+        out.append(pd.Series(np.arange(len(ids)) % n_folds, index=ids))
+    return pd.concat(out)
+
+
+def mule_edges(incidence, is_mule, fold=None):
+    """Per edge of the CSR incidence: does its counterparty have a visible mule other than the account?
+
+    is_mule  0/1 per account row (0 for unlabelled accounts)
+    fold     fold per account row, -1 for accounts outside the folds; None for leave-one-out
+    """
+    rows = np.repeat(np.arange(incidence.shape[0]), np.diff(incidence.indptr))
+    y = np.asarray(is_mule, dtype=np.float64)
+    binary = sp.csr_matrix((np.ones(incidence.nnz), incidence.indices, incidence.indptr), shape=incidence.shape)
+    if fold is None:
+        return (binary.T @ y)[incidence.indices] - y[rows] > 0
+    fold = np.asarray(fold)
+    k = int(fold.max()) + 1
+    # column f: mules outside fold f; last column: every mule
+    visible = np.column_stack([y * (fold != f) for f in range(k)] + [y])
+    users = binary.T @ visible
+    col = np.where(fold[rows] >= 0, fold[rows], k)
+    return users[incidence.indices, col] - np.where(col == k, y[rows], 0.0) > 0
+
+
+def shared_mule_counterparties(incidence, is_mule, fold=None):
+    """#29 per account row of the incidence matrix (see mule_edges)."""
+    rows = np.repeat(np.arange(incidence.shape[0]), np.diff(incidence.indptr))
+    return np.bincount(rows[mule_edges(incidence, is_mule, fold)], minlength=incidence.shape[0])
+
+
+def account_labels(accounts, labels, folds=None):
+    """is_mule (0 for unlabelled) and fold (-1 outside the folds) aligned to an array of account IDs."""
+    lab = labels.assign(account_id=labels['account_id'].astype(str)).drop_duplicates('account_id')
+    is_mule = lab.set_index('account_id')['is_mule'].reindex(accounts).fillna(0).to_numpy()
+    fold = None if folds is None else folds.reindex(accounts).fillna(-1).astype(int).to_numpy()
+    return is_mule, fold
+
+
+def guilt_features(graph, labels, folds=None):
+    """GUILT_COLUMNS for every account node of the graph."""
+    counts = adjacency(graph, 'count')
+    accounts = np.asarray(graph['accounts'])
+    is_mule, fold = account_labels(accounts, labels, folds)
+    hit = mule_edges(counts, is_mule, fold)
+    rows = edge_rows(graph)
+    n = len(accounts)
+    shared = np.bincount(rows[hit], minlength=n)
+    degree = np.diff(graph['indptr'])
+    out = pd.DataFrame({'account_id': pd.Categorical(accounts, categories=accounts)})
+    out['shared_counterparties_with_mules'] = shared
+    out['counterparty_mule_overlap_rate'] = _safe_div(shared, degree)
+    out['mule_counterparty_txn_share'] = _safe_div(np.bincount(rows[hit], weights=counts.data[hit], minlength=n),
+                                                   np.bincount(rows, weights=counts.data, minlength=n))
+    return out
+
+
+if __name__ == '__main__':
+    from ingest import DATA_DIR, load_tables
+    from graph import get_graph
+    parser = argparse.ArgumentParser(description='Guilt-by-association features (#29, #30) for every account.')
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--folds', type=int, default=0, help='CV folds (0: leave-one-out)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='guilt.parquet')
+    args = parser.parse_args()
+    graph = get_graph(args.data_dir)
+    labels = load_tables(args.data_dir, verbose=False, transactions=False)['labels']
+    folds = fold_ids(labels, args.folds, args.seed) if args.folds else None
+    t0 = time.perf_counter()
+    features = guilt_features(graph, labels, folds)
+    print(f"{len(features):,} accounts in {(time.perf_counter() - t0) * 1000:.0f} ms"
+          + (f" ({args.folds} folds)" if folds is not None else ' (leave-one-out)'))
+    if folds is not None:
+        features['fold'] = folds.reindex(features['account_id']).fillna(-1).astype(int).to_numpy()
+    labelled = features.merge(labels[['account_id', 'is_mule']], on='account_id')
+    print(labelled.groupby('is_mule')[GUILT_COLUMNS].mean().to_string())
+    features.to_parquet(args.out, index=False)
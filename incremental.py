@@ -0,0 +1,537 @@
+"""
+NFPC Phase 1 - Incremental Feature Store Updates
+Keeps mergeable per-account state next to the feature store, so a newly arrived
+transaction partition only touches the accounts that appear in it instead of
+rebuilding all 46 features from the full history.
+
+State (<store>/state/):
+  dense.parquet           one row per account: running counts and sums, amount moments
+                          (merged with streaming._merge_moments), first/last timestamp,
+                          velocity maxima, the last active day and the busiest day so far,
+                          the latest reactivation and biggest post-dormancy burst so far
+                          (dormancy.py), matched pass-through credits, mobile-update
+                          before/after counts
+  channels / counterparties / hist .parquet
+                          sparse (account, key, count) tables — channel mix, counterparty
+                          counts per direction, log-binned |amount| histogram
+  tail.parquet            every account's rows within HORIZON of its last transaction —
+                          enough to extend the 7d/30d velocity windows, the daily buckets,
+                          the reactivation burst and the 24h pass-through matching across
+                          the partition boundary
+  partitions/             copies of the appended partitions (history for recomputes)
+  log.json                applied partitions by content hash; re-appending one is a no-op
+
+Accounts whose new rows are older than their last known transaction, or whose
+last_mobile_update_date changed, are recomputed from their full history (Parquet
+predicate push-down on account_id), so late data never corrupts the state.
+
+Every feature matches feature_store.build_features up to float rounding except
+median_txn_amount, which comes from the histogram (streaming.HIST_BINS_PER_DECADE).
+"""
+import pandas as pd
+import numpy as np
+import pyarrow.parquet as pq
+import argparse, glob, json, os, shutil, time
+from aggregations import NEAR_THRESHOLD, _safe_div
+from dormancy import BURST_DAYS, DORMANCY_DAYS
+from feature_store import (FEATURE_FILE, NIGHT_HOURS, ROUND_UNIT, SALARY_DAYS, assemble,
+                           shared_with_mules, structuring_weight, write_features)
+from ingest import DATA_DIR, default_cache_dir, file_sha256, load_tables, read_manifest, write_parquet
+from passthrough import match_credits
+from schema import apply_schema, csv_dtypes
+from streaming import READ_COLUMNS, _NAT, _amount_bin, _group_median, _merge_moments
+from velocity import _window_ends, paise_prefix, window_max_count
+
+STATE_DIR = 'state'
+NS_SEC = 10 ** 9
+NS_DAY = 86_400 * NS_SEC
+HORIZON = 30 * NS_DAY  # longest look-back of any windowed feature (txn_velocity_30d)
+_MAX = np.iinfo(np.int64).max
+
+# Dense per-account state and its value for an account with no transactions yet
+DENSE = {
+    'rows': 0, 'txn_count': 0, 'n_valid': 0, 'total_volume': 0.0, 'mean': np.nan, 'm2': 0.0, 'm3': 0.0,
+    'max_abs': -np.inf, 'credit_count': 0, 'debit_count': 0, 'reversal_count': 0, 'near_count': 0,
+    'night_count': 0, 'weekend_count': 0, 'round_count': 0, 'structuring': 0.0, 'salary_volume': 0.0,
+    'first_ts': _MAX, 'last_ts': _NAT, 'v7': 0, 'v30': 0,
+    'day_count': 0, 'day_volume': 0.0, 'last_day': -1, 'last_day_count': 0, 'last_day_volume': 0.0,
+    'last_day_gap': 0, 'max_day_count': 0, 'max_day_volume': -1.0,
+    'wake_ts': _NAT, 'wake_gap': 0, 'burst_paise': -1, 'burst_gap': 0,
+    'matched_credits': 0, 'mobile_update': _NAT, 'mobile_before': 0, 'mobile_after': 0,
+}
+SPARSE_KEYS = {'channels': ['account_id', 'channel'], 'counterparties': ['account_id', 'counterparty_id'],
+               'hist': ['account_id', 'bin']}
+TAIL_COLUMNS = ['account_id', 'ts', 'amount', 'is_credit', 'is_debit', 'matched']
+
+
+def empty_state():
+    dense = pd.DataFrame({c: pd.Series(dtype=np.asarray(v).dtype) for c, v in DENSE.items()})
+    dense.index = pd.Index([], dtype=object, name='account_id')
+    sparse = {'channels': pd.DataFrame({'account_id': [], 'channel': [], 'count': []}),
+              'counterparties': pd.DataFrame({'account_id': [], 'counterparty_id': [],
+                                              'credits': [], 'debits': [], 'other': []}),
+              'hist': pd.DataFrame({'account_id': [], 'bin': [], 'count': []})}
+    tail = pd.DataFrame({c: [] for c in TAIL_COLUMNS})
+    return {'dense': dense, 'tail': tail, **sparse, 'log': []}
+
+
+def _transactions(frame):
+    """The columns the state needs, with plain string account IDs and rows without one dropped."""
+    frame = frame[READ_COLUMNS]
+    frame = frame[frame['account_id'].notna()]
+    return frame.assign(account_id=frame['account_id'].astype(str)).reset_index(drop=True)
+
+
+def _lookup(series, index, default):
+    """series.reindex(index) as a numpy array, missing -> default (no float round trip for int64)."""
+    pos = series.index.get_indexer(index)
+    out = np.full(len(index), default, dtype=np.asarray(default).dtype)
+    out[pos >= 0] = series.to_numpy()[pos[pos >= 0]]
+    return out
+
+
+def mobile_dates(accounts):
+    """last_mobile_update_date per account as epoch nanoseconds (NaT -> int64 min)."""
+    upd = accounts.assign(account_id=accounts['account_id'].astype(str)).drop_duplicates('account_id')
+    upd = upd.set_index('account_id')['last_mobile_update_date']
+    return pd.Series(upd.to_numpy().astype('M8[ns]').view(np.int64), index=upd.index)
+
+
+# ── Folding new rows into the state ──
+def advance(prior, tail, new):
+    """Fold `new` transactions into the state of their accounts.
+
+    prior  dense state indexed by account_id, one row per account in `new`
+    tail   those accounts' rows within HORIZON of their last_ts
+    new    transactions no earlier than the last_ts of their account
+    Returns (dense, tail, sparse) — sparse holds the deltas of the SPARSE_KEYS tables.
+    """
+    ids = prior.index
+    n = len(ids)
+    p = {c: prior[c].to_numpy() for c in DENSE}
+    out = {c: v.copy() for c, v in p.items()}
+    acct = ids.get_indexer(new['account_id'])
+    amount = new['amount'].to_numpy(dtype=np.float64)
+    abs_amount = np.abs(amount)
+    valid = ~np.isnan(amount)
+    vol = np.where(valid, abs_amount, 0.0)
+    is_credit = (new['txn_type'] == 'C').to_numpy()
+    is_debit = (new['txn_type'] == 'D').to_numpy()
+    ts = new['transaction_timestamp']
+    t = ts.to_numpy().astype('M8[ns]').view(np.int64)
+    t_ok = t != _NAT
+    count = lambda mask: np.bincount(acct[mask], minlength=n)
+    weigh = lambda w: np.bincount(acct, weights=w, minlength=n)
+
+    # ── Running counts and sums ──
+    out['rows'] += np.bincount(acct, minlength=n)
+    out['txn_count'] += count(new['transaction_id'].notna().to_numpy())
+    out['total_volume'] += weigh(vol)
+    out['credit_count'] += count(is_credit)
+    out['debit_count'] += count(is_debit)
+    out['reversal_count'] += count(amount < 0)
+    out['near_count'] += count((abs_amount >= NEAR_THRESHOLD[0]) & (abs_amount < NEAR_THRESHOLD[1]))
+    out['night_count'] += count(ts.dt.hour.isin(NIGHT_HOURS).to_numpy())
+    out['weekend_count'] += count((ts.dt.dayofweek >= 5).to_numpy())
+    out['round_count'] += count(valid & (abs_amount > 0) & (np.mod(abs_amount, ROUND_UNIT) == 0))
+    out['structuring'] += weigh(structuring_weight(abs_amount))
+    out['salary_volume'] += weigh(np.where(ts.dt.day.isin(SALARY_DAYS).to_numpy(), vol, 0.0))
+    a_v, x = acct[valid], amount[valid]
+    n_b = np.bincount(a_v, minlength=n)
+    mean_b = _safe_div(np.bincount(a_v, weights=x, minlength=n), n_b)
+    dev = x - mean_b[a_v]
+    out['mean'], out['m2'], out['m3'] = _merge_moments(
+        p['n_valid'], p['mean'], p['m2'], p['m3'], n_b, mean_b,
+        np.bincount(a_v, weights=dev ** 2, minlength=n), np.bincount(a_v, weights=dev ** 3, minlength=n))
+    out['n_valid'] += n_b
+    np.maximum.at(out['max_abs'], a_v, abs_amount[valid])
+    np.minimum.at(out['first_ts'], acct[t_ok], t[t_ok])
+    np.maximum.at(out['last_ts'], acct[t_ok], t[t_ok])
+
+    # Mobile-update split (whole seconds, as in mobile_change_velocity)
+    u = p['mobile_update'][acct]
+    ok = t_ok & (u != _NAT)
+    after = ok & (t // NS_SEC >= u // NS_SEC)
+    out['mobile_after'] += count(after)
+    out['mobile_before'] += count(ok & ~after)
+
+    # ── Tail + new rows, sorted by (account, time) ──
+    k = ids.get_indexer(tail['account_id'])
+    n_new = int(t_ok.sum())
+    c_acct = np.r_[k, acct[t_ok]].astype(np.int64)
+    c_t = np.r_[tail['ts'].to_numpy(np.int64), t[t_ok]]
+    order = np.lexsort((c_t, c_acct))
+    c_acct, c_t = c_acct[order], c_t[order]
+    c_amount = np.r_[tail['amount'].to_numpy(np.float64), amount[t_ok]][order]
+    c_credit = np.r_[tail['is_credit'].to_numpy(bool), is_credit[t_ok]][order]
+    c_debit = np.r_[tail['is_debit'].to_numpy(bool), is_debit[t_ok]][order]
+    c_matched = np.r_[tail['matched'].to_numpy(bool), np.zeros(n_new, dtype=bool)][order]
+    c_new = np.r_[np.zeros(len(k), dtype=bool), np.ones(n_new, dtype=bool)][order]
+
+    # Windows that start in the tail see every later row; earlier windows end before any new row
+    sec = c_t // NS_SEC
+    out['v7'] = np.maximum(p['v7'], window_max_count(c_acct, sec, 7 * 86400, n))
+    out['v30'] = np.maximum(p['v30'], window_max_count(c_acct, sec, 30 * 86400, n))
+
+    # Daily buckets of the new rows; the first one continues the account's last active day
+    d_a, d_t = c_acct[c_new], c_t[c_new]
+    day = d_t // NS_DAY
+    d_amount = np.nan_to_num(np.abs(c_amount[c_new]))
+    bucket = d_a * (1 << 32) + day
+    if len(bucket):
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        b_acct, b_day = d_a[starts], day[starts]
+        b_count = np.diff(np.r_[starts, len(bucket)])
+        b_vol = np.add.reduceat(d_amount, starts)
+        first_b = np.r_[True, b_acct[1:] != b_acct[:-1]]
+        last_b = np.r_[b_acct[1:] != b_acct[:-1], True]
+        prev_day = p['last_day'][b_acct]
+        merged = first_b & (b_day == prev_day)
+        out['day_count'] += np.bincount(b_acct[~merged], minlength=n)
+        out['day_volume'] += np.bincount(b_acct, weights=b_vol, minlength=n)
+        b_count = b_count + np.where(merged, p['last_day_count'][b_acct], 0)
+        b_vol = b_vol + np.where(merged, p['last_day_volume'][b_acct], 0.0)
+        gap = np.zeros(len(b_day), dtype=np.int64)
+        gap[1:] = b_day[1:] - b_day[:-1]
+        gap[first_b] = np.where(merged, p['last_day_gap'][b_acct],
+                                np.where(prev_day >= 0, b_day - prev_day, 0))[first_b]
+        np.maximum.at(out['max_day_count'], b_acct, b_count)
+        # Busiest day: largest volume — a new day must beat the old one strictly
+        rank = np.lexsort((-b_vol, b_acct))
+        top = rank[np.r_[True, b_acct[rank][1:] != b_acct[rank][:-1]]]
+        better = b_vol[top] > p['max_day_volume'][b_acct[top]]
+        out['max_day_volume'][b_acct[top[better]]] = b_vol[top[better]]
+        a_last = b_acct[last_b]
+        out['last_day'][a_last] = b_day[last_b]
+        out['last_day_count'][a_last] = b_count[last_b]
+        out['last_day_volume'][a_last] = b_vol[last_b]
+        out['last_day_gap'][a_last] = gap[last_b]
+
+    # Dormancy (#24, as dormancy.py): reactivations among the new rows, plus the account's latest
+    # earlier one, whose burst window may reach into them; the biggest burst so far wins (earliest on ties)
+    key = c_acct * (1 << 32) + sec
+    same = np.r_[False, c_acct[1:] == c_acct[:-1]]
+    last_sec = np.where(p['last_ts'] != _NAT, p['last_ts'] // NS_SEC, -1)[c_acct]
+    before = np.where(same, np.r_[-1, sec[:-1]], last_sec)
+    woke = np.flatnonzero(c_new & (before >= 0) & (sec - before >= DORMANCY_DAYS * 86400))
+    old = np.flatnonzero(p['wake_ts'] != _NAT)
+    old_pos = np.searchsorted(key, old * (1 << 32) + p['wake_ts'][old] // NS_SEC)
+    found = old_pos < len(key)
+    found[found] = key[old_pos[found]] == old[found] * (1 << 32) + p['wake_ts'][old[found]] // NS_SEC
+    pos = np.r_[old_pos[found], woke]
+    gap_s = np.r_[p['wake_gap'][old[found]], (sec - before)[woke]]
+    if len(pos):
+        order = np.argsort(pos, kind='stable')
+        pos, gap_s = pos[order], gap_s[order]
+        cum = paise_prefix(c_amount)
+        burst = cum[_window_ends(c_acct, sec, BURST_DAYS * 86400)[pos]] - cum[pos]
+        owner = c_acct[pos]
+        rank = np.lexsort((-burst, owner))
+        top = rank[np.r_[True, owner[rank][1:] != owner[rank][:-1]]]
+        better = burst[top] > p['burst_paise'][owner[top]]
+        out['burst_paise'][owner[top[better]]] = burst[top[better]]
+        out['burst_gap'][owner[top[better]]] = gap_s[top[better]]
+        out['wake_ts'][c_acct[woke]] = c_t[woke]  # in time order, so the latest wins
+        out['wake_gap'][c_acct[woke]] = (sec - before)[woke]
+
+    # Pass-through: credits matched for the first time (tail credits may be matched by new debits)
+    c_idx, matched = match_credits(c_acct, c_t.view('M8[ns]'), c_amount, c_credit, c_debit)
+    fresh = c_idx[matched & ~c_matched[c_idx]]
+    out['matched_credits'] += np.bincount(c_acct[fresh], minlength=n)
+    c_matched[fresh] = True
+
+    keep = c_t > out['last_ts'][c_acct] - HORIZON
+    new_tail = pd.DataFrame({'account_id': np.asarray(ids)[c_acct[keep]], 'ts': c_t[keep],
+                             'amount': c_amount[keep], 'is_credit': c_credit[keep],
+                             'is_debit': c_debit[keep], 'matched': c_matched[keep]})
+    dense = pd.DataFrame(out, index=ids)
+    return dense, new_tail, sparse_deltas(new)
+
+
+def sparse_deltas(new):
+    """(account, channel), (account, counterparty) and (account, amount bin) counts of `new`."""
+    ch = new[['account_id', 'channel']].dropna()
+    channels = ch.assign(channel=ch['channel'].astype(str)).groupby(['account_id', 'channel']).size()
+    cp = new[['account_id', 'counterparty_id', 'txn_type']].dropna(subset=['counterparty_id'])
+    direction = cp['txn_type'].astype(object)
+    counterparties = pd.DataFrame({
+        'account_id': cp['account_id'], 'counterparty_id': cp['counterparty_id'].astype(str),
+        'credits': (direction == 'C').astype(np.int64), 'debits': (direction == 'D').astype(np.int64),
+        'other': (~direction.isin(['C', 'D'])).astype(np.int64)})
+    amount = new['amount'].to_numpy(dtype=np.float64)
+    valid = ~np.isnan(amount)
+    hist = pd.DataFrame({'account_id': new['account_id'].to_numpy()[valid], 'bin': _amount_bin(np.abs(amount[valid]))})
+    return {'channels': channels.rename('count').reset_index(),
+            'counterparties': counterparties.groupby(['account_id', 'counterparty_id'], as_index=False).sum(),
+            'hist': hist.groupby(['account_id', 'bin']).size().rename('count').reset_index()}
+
+
+def apply_transactions(state, new, mobile, history=None):
+    """Fold a batch of transactions into `state` (returned as a new dict).
+
+    mobile   current last_mobile_update_date per account (mobile_dates)
+    history  fn(account_ids) -> every previously applied transaction of those accounts;
+             needed when an account received late rows or a changed mobile-update date
+    Returns (state, info) with the number of updated and recomputed accounts.
+    """
+    new = _transactions(new)
+    dense = state['dense']
+    ids = pd.Index(np.unique(new['account_id'].to_numpy()), name='account_id')
+    t = new['transaction_timestamp'].to_numpy().astype('M8[ns]').view(np.int64)
+    first_new = pd.Series(np.where(t == _NAT, _MAX, t), index=new['account_id']).groupby(level=0).min()
+    moved = _lookup(mobile, dense.index, _NAT) != dense['mobile_update'].to_numpy()
+    late = first_new.reindex(ids).to_numpy() < _lookup(dense['last_ts'], ids, _NAT)
+    redo = dense.index[moved].union(ids[late])
+    fast = ids.difference(redo)
+
+    def prior(index, state_rows):
+        rows = pd.DataFrame({c: _lookup(state_rows[c], index, default) for c, default in DENSE.items()}, index=index)
+        rows['mobile_update'] = _lookup(mobile, index, _NAT)
+        return rows
+
+    touched = fast.union(redo)
+    tail = state['tail']
+    in_fast = new['account_id'].isin(fast).to_numpy()
+    parts = [advance(prior(fast, dense), tail[tail['account_id'].isin(fast)], new[in_fast])]
+    if len(redo):
+        if history is None:
+            raise ValueError(f'{len(redo):,} account(s) need recomputing but no history was given')
+        rows = pd.concat([_transactions(history(redo)), new[~in_fast]], ignore_index=True)
+        parts.append(advance(prior(redo, dense.iloc[:0]), tail.iloc[:0], rows))
+
+    out = {'dense': pd.concat([dense.drop(touched, errors='ignore')] + [d for d, _, _ in parts]).sort_index(),
+           'tail': pd.concat([tail[~tail['account_id'].isin(touched)]] + [tl for _, tl, _ in parts],
+                             ignore_index=True),
+           'log': list(state['log'])}
+    for name, keys in SPARSE_KEYS.items():
+        old = state[name][~state[name]['account_id'].isin(redo)]
+        merged = pd.concat([old] + [s[name] for _, _, s in parts], ignore_index=True)
+        out[name] = merged.groupby(keys, as_index=False, sort=True).sum()
+    return out, {'accounts': len(touched), 'recomputed': len(redo), 'rows': len(new)}
+
+
+# ── Features from the state ──
+def state_features(state, tables):
+    """The full feature store (as feature_store.build_features) from the incremental state."""
+    d = state['dense']
+    d = d[d['rows'] > 0]
+    ids = d.index
+    n = len(ids)
+    g = {c: d[c].to_numpy() for c in DENSE}
+    f = pd.DataFrame({'account_id': ids.to_numpy()})
+
+    # ── A: behavioural ──
+    n_valid, txn_count, rows = g['n_valid'], g['txn_count'], g['rows']
+    f['txn_count'] = txn_count
+    f['total_volume'] = g['total_volume']
+    f['avg_txn_amount'] = _safe_div(g['total_volume'], n_valid)
+    hist = state['hist'].assign(owner=ids.get_indexer(state['hist']['account_id']))
+    hist = hist[hist['owner'] >= 0].sort_values(['owner', 'bin'])
+    f['median_txn_amount'] = _group_median(hist['owner'].to_numpy(), hist['bin'].to_numpy(np.int64),
+                                           hist['count'].to_numpy(np.int64), n_valid, n)
+    f['max_single_txn'] = np.where(n_valid > 0, g['max_abs'], np.nan)
+    m2, m3 = g['m2'], g['m3']
+    f['txn_amount_std'] = np.sqrt(_safe_div(m2, n_valid - 1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        skew = np.sqrt(n_valid * (n_valid - 1.0)) / (n_valid - 2.0) * (m3 / n_valid) / (m2 / n_valid) ** 1.5
+    # merged moments leave rounding residue in M2 where the exact kernel has 0
+    f['txn_amount_skewness'] = np.where(n_valid < 3, np.nan,
+                                        np.where(m2 > 1e-12 * n_valid * np.nan_to_num(g['mean']) ** 2, skew, 0.0))
+    f['credit_debit_ratio'] = g['credit_count'] / (g['debit_count'] + 1)
+    channels = state['channels'].groupby('account_id')['count'].agg(['size', 'max']).reindex(ids)
+    f['unique_channels'] = channels['size'].fillna(0).to_numpy()
+    f['dominant_channel_pct'] = _safe_div(channels['max'].fillna(0).to_numpy(), txn_count)
+    cps = state['counterparties']
+    total = cps['credits'] + cps['debits'] + cps['other']
+    p = total / total.groupby(cps['account_id']).transform('sum')
+    per_cp = pd.DataFrame({'account_id': cps['account_id'], 'pairs': 1, 'entropy': -p * np.log2(p),
+                           'in_degree': (cps['credits'] > 0).astype(int),
+                           'out_degree': (cps['debits'] > 0).astype(int)}).groupby('account_id').sum().reindex(ids)
+    per_cp = per_cp.fillna(0)
+    f['unique_counterparties'] = per_cp['pairs'].to_numpy()
+    f['counterparty_entropy'] = per_cp['entropy'].to_numpy()
+    f['reversal_count'] = g['reversal_count']
+    f['reversal_rate'] = _safe_div(g['reversal_count'], txn_count)
+    f['near_threshold_fraction'] = _safe_div(g['near_count'], txn_count)
+
+    # ── B: temporal ──
+    f['night_txn_ratio'] = g['night_count'] / rows
+    f['weekend_txn_ratio'] = g['weekend_count'] / rows
+    f['txn_velocity_7d'] = g['v7']
+    f['txn_velocity_30d'] = g['v30']
+    f['velocity_ratio_7d_30d'] = _safe_div(g['v7'], g['v30'])
+    f['max_daily_txn_count'] = g['max_day_count']
+    max_vol = np.maximum(g['max_day_volume'], 0.0)
+    f['max_daily_txn_volume'] = max_vol
+    f['burst_score'] = _safe_div(max_vol, _safe_div(g['day_volume'], g['day_count']))
+    f['dormancy_days_before_burst'] = np.where(g['burst_paise'] >= 0, g['burst_gap'] / 86400, 0.0)
+    u = g['mobile_update']
+    has = (u != _NAT) & (g['last_ts'] != _NAT)
+    u_s = u // NS_SEC
+    days_before = np.maximum(u_s - g['first_ts'] // NS_SEC, 0) / 86400 + 1
+    days_after = np.maximum(g['last_ts'] // NS_SEC - u_s, 0) / 86400 + 1
+    ratio = _safe_div(g['mobile_after'] / days_after, g['mobile_before'] / days_before)
+    f['post_mobile_change_velocity_ratio'] = np.where(has, ratio, np.nan)
+
+    # ── C: graph ──
+    f['in_degree'] = per_cp['in_degree'].to_numpy()
+    f['out_degree'] = per_cp['out_degree'].to_numpy()
+    f['fan_in_out_ratio'] = f['in_degree'] / (f['out_degree'] + 1)
+    f['degree_centrality'] = f['unique_counterparties'] / max(f['unique_counterparties'].max(), 1) if n else 0.0
+
+    # ── E: anomaly ──
+    f['pass_through_score'] = np.where(g['credit_count'] > 0,
+                                       g['matched_credits'] / np.maximum(g['credit_count'], 1), 0.0)
+    f['structuring_score'] = g['structuring']
+    f['round_amount_fraction'] = g['round_count'] / rows
+    f['salary_cycle_exploitation_score'] = _safe_div(g['salary_volume'], g['total_volume'])
+    shared = shared_with_mules(cps[['account_id', 'counterparty_id']], tables['labels'])
+    return assemble([f, shared], tables)
+
+
+# ── Persistence ──
+def state_dir(store_dir):
+    return os.path.join(store_dir, STATE_DIR)
+
+
+def save_state(state, store_dir):
+    """Write the state next to the store; the old state is replaced only once the new one is complete."""
+    final = state_dir(store_dir)
+    tmp = final + '.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    state['dense'].reset_index().to_parquet(os.path.join(tmp, 'dense.parquet'), index=False)
+    for name in ['tail'] + list(SPARSE_KEYS):
+        state[name].to_parquet(os.path.join(tmp, f'{name}.parquet'), index=False)
+    with open(os.path.join(tmp, 'log.json'), 'w') as fh:
+        json.dump(state['log'], fh, indent=2)
+    if os.path.isdir(os.path.join(final, 'partitions')):
+        os.replace(os.path.join(final, 'partitions'), os.path.join(tmp, 'partitions'))
+    shutil.rmtree(final, ignore_errors=True)
+    os.replace(tmp, final)
+
+
+def load_state(store_dir):
+    base = state_dir(store_dir)
+    if not os.path.exists(os.path.join(base, 'log.json')):
+        raise FileNotFoundError(f'no incremental state in {store_dir} — run `incremental.py init` first')
+    state = {name: pd.read_parquet(os.path.join(base, f'{name}.parquet')) for name in ['tail'] + list(SPARSE_KEYS)}
+    state['dense'] = pd.read_parquet(os.path.join(base, 'dense.parquet')).set_index('account_id')
+    missing = set(DENSE) - set(state['dense'].columns)
+    if missing:
+        raise ValueError(f"incremental state in {store_dir} lacks {sorted(missing)} — run `incremental.py init` again")
+    with open(os.path.join(base, 'log.json')) as fh:
+        state['log'] = json.load(fh)
+    return state
+
+
+def history_reader(cache_dir, store_dir):
+    """fn(account_ids) -> all transactions of those accounts in the cache and appended partitions."""
+    paths = (sorted(glob.glob(os.path.join(cache_dir, 'transactions', 'part-*.parquet')))
+             + sorted(glob.glob(os.path.join(state_dir(store_dir), 'partitions', '*.parquet'))))
+    paths = [p for p in paths if pq.read_metadata(p).num_rows]  # an empty delivery has nothing to filter
+
+    def read(ids):
+        wanted = list(map(str, ids))
+        frames = [pq.read_table(p, columns=READ_COLUMNS, filters=[('account_id', 'in', wanted)]).to_pandas()
+                  for p in paths]
+        frames = [fr.assign(account_id=fr['account_id'].astype(str)) for fr in frames if len(fr)]
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=READ_COLUMNS)
+    return read
+
+
+def read_partition(path):
+    """A new transaction partition (CSV in the raw layout, or Parquet) coerced to the schema."""
+    if path.endswith('.parquet'):
+        return apply_schema(pd.read_parquet(path), 'transactions')
+    return apply_schema(pd.read_csv(path, dtype=csv_dtypes('transactions')), 'transactions')
+
+
+# ── Commands ──
+def _write_store(state, tables, store_dir, sources):
+    t0 = time.perf_counter()
+    features = state_features(state, tables)
+    sources = {**sources, 'appended': [e['sha256'] for e in state['log'] if e.get('kind') == 'append']}
+    path = write_features(features, store_dir, sources, mode='incremental')
+    return path, time.perf_counter() - t0
+
+
+def init_store(data_dir=DATA_DIR, store_dir=None, verbose=True):
+    """Build the state from every transaction in the ingest cache, then write the store."""
+    store_dir = store_dir or os.path.join(data_dir, 'feature_store')
+    t0 = time.perf_counter()
+    tables = load_tables(data_dir, verbose=verbose)
+    sources = {k: v['sha256'] for k, v in read_manifest(default_cache_dir(data_dir))['tables'].items()}
+    shutil.rmtree(os.path.join(state_dir(store_dir), 'partitions'), ignore_errors=True)
+    state, info = apply_transactions(empty_state(), tables['transactions'], mobile_dates(tables['accounts']))
+    state['log'].append({'kind': 'init', 'sources': sources, **info, 'applied': time.strftime('%Y-%m-%d %H:%M:%S')})
+    save_state(state, store_dir)
+    path, _ = _write_store(state, tables, store_dir, sources)
+    if verbose:
+        print(f"Initialised incremental state for {info['accounts']:,} accounts and wrote {path} "
+              f"in {time.perf_counter() - t0:.1f}s")
+    return state
+
+
+def append_partitions(paths, data_dir=DATA_DIR, store_dir=None, verbose=True):
+    """Fold new transaction partitions into the state and rewrite the store."""
+    store_dir = store_dir or os.path.join(data_dir, 'feature_store')
+    cache_dir = default_cache_dir(data_dir)
+    state = load_state(store_dir)
+    tables = load_tables(data_dir, verbose=False, transactions=False)
+    mobile = mobile_dates(tables['accounts'])
+    applied = {e['sha256'] for e in state['log'] if 'sha256' in e}
+    sources = next(e['sources'] for e in state['log'] if e['kind'] == 'init')
+    part_dir = os.path.join(state_dir(store_dir), 'partitions')
+    n_applied = 0
+    for path in paths:
+        digest = file_sha256(path)
+        if digest in applied:
+            if verbose:
+                print(f"  [incremental] {path}: already applied, skipped")
+            continue
+        t0 = time.perf_counter()
+        new = read_partition(path)
+        if not len(new):
+            if verbose:
+                print(f"  [incremental] {path}: no rows, skipped")
+            continue
+        state, info = apply_transactions(state, new, mobile, history_reader(cache_dir, store_dir))
+        write_parquet(new, os.path.join(part_dir, f'{digest[:16]}.parquet'))
+        state['log'].append({'kind': 'append', 'path': os.path.abspath(path), 'sha256': digest, **info,
+                             'applied': time.strftime('%Y-%m-%d %H:%M:%S')})
+        save_state(state, store_dir)
+        applied.add(digest)
+        n_applied += 1
+        if verbose:
+            print(f"  [incremental] {path}: {info['rows']:,} rows, {info['accounts']:,} accounts updated "
+                  f"({info['recomputed']:,} from history) in {time.perf_counter() - t0:.1f}s")
+    if not n_applied:
+        return state
+    path, seconds = _write_store(state, tables, store_dir, sources)
+    if verbose:
+        print(f"Wrote {path} in {seconds:.1f}s")
+    return state
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Incrementally maintained feature store.')
+    parser.add_argument('command', choices=['init', 'append', 'status'])
+    parser.add_argument('paths', nargs='*', help='append: new transaction partitions (CSV or Parquet)')
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--store-dir', default=None, help='defaults to <data-dir>/feature_store')
+    args = parser.parse_args()
+    store = args.store_dir or os.path.join(args.data_dir, 'feature_store')
+    if args.command == 'init':
+        init_store(args.data_dir, store)
+    elif args.command == 'append':
+        if not args.paths:
+            parser.error('append needs at least one partition path')
+        append_partitions(args.paths, args.data_dir, store)
+    else:
+        st = load_state(store)
+        print(f"{len(st['dense']):,} accounts, {len(st['tail']):,} tail rows, "
+              f"{len(st['counterparties']):,} counterparty pairs; store: {os.path.join(store, FEATURE_FILE)}")
+        for entry in st['log']:
+            print(f"  {entry['applied']}  {entry['kind']:<6} {entry.get('path', '')} "
+                  f"rows={entry['rows']:,} accounts={entry['accounts']:,} recomputed={entry['recomputed']:,}")
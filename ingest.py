@@ -0,0 +1,196 @@
+"""
+NFPC Phase 1 - Columnar Ingest Cache
+One-time conversion of the raw CSV tables into a typed, partitioned Parquet dataset.
+Every source CSV is fingerprinted; only tables whose source changed are rebuilt.
+Column types come from schema.py and are applied while the CSV is parsed.
+"""
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import argparse, hashlib, json, os, time
+from schema import SCHEMAS, apply_schema, csv_dtypes, memory_report, schema_fingerprint, unify_keys
+
+# ── Config ──
+DATA_DIR = r'C:\Users\jaivi\OneDrive\Desktop\upi\IITD-Tryst-Hackathon\EDA-Phase-1'
+N_TXN_PARTS = 6
+FORMAT_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+
+TABLE_FILES = {
+    'customers': 'customers.csv',
+    'accounts': 'accounts.csv',
+    'linkage': 'customer_account_linkage.csv',
+    'products': 'product_details.csv',
+    'labels': 'train_labels.csv',
+    'test': 'test_accounts.csv',
+}
+for _i in range(N_TXN_PARTS):
+    TABLE_FILES[f'transactions_part_{_i}'] = f'transactions_part_{_i}.csv'
+
+
+def txn_part_names(n_parts=N_TXN_PARTS):
+    return [f'transactions_part_{i}' for i in range(n_parts)]
+
+
+def base_table(name):
+    """Logical table of a source ('transactions_part_3' -> 'transactions')."""
+    return 'transactions' if name.startswith('transactions_part_') else name
+
+
+def cache_path(cache_dir, name):
+    if name.startswith('transactions_part_'):
+        return os.path.join(cache_dir, 'transactions', f"part-{name.rsplit('_', 1)[1]}.parquet")
+    return os.path.join(cache_dir, f'{name}.parquet')
+
+
+# ── Fingerprinting ──
+def file_sha256(path, block=1 << 22):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(block), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def fingerprint(path, previous=None):
+    """Size/mtime fingerprint, with a content hash to confirm a real change.
+
+    When size and mtime match the previous fingerprint the stored hash is reused,
+    so an unchanged dataset costs one stat() per file. A touched-but-identical
+    file is re-hashed once and then recognised as unchanged.
+    """
+    st = os.stat(path)
+    fp = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+    if previous and previous.get('size') == fp['size'] and previous.get('mtime_ns') == fp['mtime_ns']:
+        fp['sha256'] = previous['sha256']
+    else:
+        fp['sha256'] = file_sha256(path)
+    return fp
+
+
+def read_manifest(cache_dir):
+    """Stored fingerprints; empty when the cache format or declared schema changed."""
+    fresh = {'format_version': FORMAT_VERSION, 'schema': schema_fingerprint(), 'tables': {}}
+    path = os.path.join(cache_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return fresh
+    with open(path) as f:
+        manifest = json.load(f)
+    if manifest.get('format_version') != FORMAT_VERSION or manifest.get('schema') != fresh['schema']:
+        return fresh
+    return manifest
+
+
+def write_manifest(cache_dir, manifest):
+    path = os.path.join(cache_dir, MANIFEST_NAME)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+
+
+# ── Conversion ──
+def read_source_csv(data_dir, name):
+    table = base_table(name)
+    df = pd.read_csv(os.path.join(data_dir, TABLE_FILES[name]), dtype=csv_dtypes(table))
+    return apply_schema(df, table)
+
+
+def write_parquet(df, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Dot-prefixed: a half-written file left in a dataset directory is skipped by pyarrow's discovery
+    tmp = os.path.join(os.path.dirname(path), '.' + os.path.basename(path) + '.tmp')
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp, compression='zstd')
+    os.replace(tmp, path)
+
+
+def default_cache_dir(data_dir):
+    return os.path.join(data_dir, 'parquet_cache')
+
+
+def build_cache(data_dir=DATA_DIR, cache_dir=None, force=False, verbose=True):
+    """Convert every changed source CSV to Parquet. Returns the list of rebuilt tables."""
+    cache_dir = cache_dir or default_cache_dir(data_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest = read_manifest(cache_dir)
+    rebuilt = []
+    for name, fname in TABLE_FILES.items():
+        src = os.path.join(data_dir, fname)
+        prev = manifest['tables'].get(name)
+        fp = fingerprint(src, prev)
+        out = cache_path(cache_dir, name)
+        if not force and prev and prev['sha256'] == fp['sha256'] and os.path.exists(out):
+            fp['rows'] = prev.get('rows')
+            manifest['tables'][name] = fp
+            continue
+        t0 = time.perf_counter()
+        df = read_source_csv(data_dir, name)
+        write_parquet(df, out)
+        fp['rows'] = len(df)
+        manifest['tables'][name] = fp
+        write_manifest(cache_dir, manifest)
+        rebuilt.append(name)
+        if verbose:
+            print(f"  [ingest] {fname} -> {os.path.relpath(out, cache_dir)} "
+                  f"({len(df):,} rows, {time.perf_counter() - t0:.1f}s)")
+    write_manifest(cache_dir, manifest)
+    return rebuilt
+
+
+# ── Loading ──
+def read_parts(part_dir, table='transactions'):
+    """Every part file of a partitioned table as one frame, with one amount dtype for the whole table.
+
+    to_amount() picks float32 or float64 per part, and reading the directory as a dataset would cast
+    every part to the first part's schema. Amounts stay float32 only when every part is float32;
+    otherwise the float32 parts are widened and rounded back to paise.
+    """
+    paths = sorted(os.path.join(part_dir, f) for f in os.listdir(part_dir)
+                   if f.endswith('.parquet') and not f.startswith(('.', '_')))
+    parts = [pq.read_table(p) for p in paths]
+    for col in [c for c, kind in SCHEMAS[table].items() if kind == 'amount']:
+        types = [t.schema.field(col).type for t in parts if col in t.schema.names]
+        if pa.float64() in types:
+            parts = [t.set_column(t.schema.get_field_index(col), col, pc.round(t[col].cast(pa.float64()), 2))
+                     if col in t.schema.names and t.schema.field(col).type == pa.float32() else t for t in parts]
+    return pa.concat_tables(parts, promote_options='permissive').to_pandas()
+
+
+def read_cached(cache_dir, name):
+    if name == 'transactions':
+        return read_parts(os.path.join(cache_dir, 'transactions'))
+    return pq.read_table(cache_path(cache_dir, name)).to_pandas()
+
+
+def load_tables(data_dir=DATA_DIR, cache_dir=None, verbose=True, transactions=True):
+    """Return all seven tables as DataFrames, rebuilding stale cache entries first.
+
+    Keys: customers, accounts, linkage, products, labels, test, transactions.
+    Columns follow schema.SCHEMAS — dates are datetime64 and the ID keys of each
+    domain share one categorical dictionary across tables. transactions=False
+    skips the (large) transaction table.
+    """
+    cache_dir = cache_dir or default_cache_dir(data_dir)
+    build_cache(data_dir, cache_dir, verbose=verbose)
+    tables = {name: read_cached(cache_dir, name) for name in TABLE_FILES if base_table(name) == name}
+    if transactions:
+        tables['transactions'] = read_cached(cache_dir, 'transactions')
+    return unify_keys(tables)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the Parquet cache for the NFPC CSV tables.')
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--cache-dir', default=None, help='defaults to <data-dir>/parquet_cache')
+    parser.add_argument('--force', action='store_true', help='rebuild every table regardless of fingerprint')
+    parser.add_argument('--memory-report', action='store_true', help='load every table and print its in-memory size')
+    args = parser.parse_args()
+    cache_dir = args.cache_dir or default_cache_dir(args.data_dir)
+    t0 = time.perf_counter()
+    rebuilt = build_cache(args.data_dir, cache_dir, force=args.force)
+    print(f"Rebuilt {len(rebuilt)} table(s) in {time.perf_counter() - t0:.1f}s; cache at {cache_dir}")
+    if args.memory_report:
+        report = memory_report(load_tables(args.data_dir, cache_dir, verbose=False))
+        print(report.to_string(index=False, float_format=lambda v: f'{v:,.1f}'))
+        print(f"Total: {report['memory_mb'].sum():,.1f} MB")
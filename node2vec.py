@@ -0,0 +1,259 @@
+"""
+NFPC Phase 1 - Node2Vec Account Embeddings
+64-dim Node2Vec embeddings of the accounts on the transaction graph (propagation.node_adjacency:
+accounts and counterparties, counterparty IDs that are accounts merged), written next
+to the feature store as embeddings.parquet.
+
+Walks are sampled for a whole batch of walkers at once over the CSR arrays:
+  first-order step   each row's edge weights as one cumulative table; a step is a single
+                     searchsorted of row + U(0, 1) into it (O(log degree), no Python loop)
+  p/q bias           rejection sampling (KnightKing): a candidate x from v after t is kept
+                     with probability bias(t, x) / max bias, where bias is 1/p for x == t,
+                     1 if x is a neighbour of t (binary search in t's sorted row), else 1/q.
+                     Exact second-order alias tables would need sum(deg^2) entries, which
+                     the hub counterparties make infeasible.
+Walk batches run on a process pool; the CSR arrays are written once as .npy and
+memory-mapped by the workers.
+
+Skip-gram with negative sampling (word2vec SGNS) is trained on CPU in numpy: minibatches
+of (centre, context) pairs streamed from chunks of walks, `negative` unigram^0.75 noise
+nodes drawn per pair, a linearly decaying learning rate, and gradients scattered back
+with one sparse product per matrix.
+"""
+import pandas as pd
+import numpy as np
+import scipy.sparse as sp
+import pyarrow as pa
+import pyarrow.parquet as pq
+import argparse, json, os, shutil, tempfile, time
+from concurrent.futures import ProcessPoolExecutor
+from propagation import node_adjacency
+
+DIM = 64
+WALK_LENGTH = 40
+WALKS_PER_NODE = 10
+WINDOW = 5
+NEGATIVE = 5
+P, Q = 1.0, 0.5        # q < 1: walks drift outward (structural / community exploration)
+EPOCHS = 1
+LEARNING_RATE = 0.1     # per-pair SGD rate; 0.025 (word2vec) leaves one epoch on one shared direction
+BATCH_PAIRS = 1024      # a hub row sums its updates over the batch: larger batches diverge at this rate
+WALK_CHUNK_PAIRS = 2_000_000
+WALK_BATCH = 20_000    # start nodes per walk task
+EMBEDDING_FILE = 'embeddings.parquet'
+CSR_ARRAYS = ['indptr', 'indices', 'table', 'keys']
+
+
+# ── Walk sampling ──
+def step_table(adj):
+    """Per-edge cumulative weight share offset by its row: row + CDF, strictly increasing over the CSR."""
+    adj = adj.tocsr()
+    adj.sort_indices()
+    rows = np.repeat(np.arange(adj.shape[0]), np.diff(adj.indptr))
+    cum = np.cumsum(adj.data.astype(np.float64))
+    start = np.r_[0, cum][adj.indptr[:-1]]
+    total = np.r_[0, cum][adj.indptr[1:]] - start
+    share = (cum - start[rows]) / np.where(total > 0, total, 1)[rows]
+    n = adj.shape[0]
+    indices = adj.indices.astype(np.int64)
+    return {'indptr': adj.indptr.astype(np.int64), 'indices': indices, 'table': rows + share,
+            'keys': rows * n + indices, 'n': n}
+
+
+def _neighbours(g, nodes, rng):
+    """One weighted neighbour per node (-1 for nodes without edges)."""
+    deg = g['indptr'][nodes + 1] - g['indptr'][nodes]
+    pos = np.searchsorted(g['table'], nodes + rng.random(len(nodes)), side='right')
+    return np.where(deg > 0, g['indices'][np.minimum(pos, len(g['indices']) - 1)], -1)
+
+
+def _is_edge(g, a, b):
+    """Vectorised membership test: is (a, b) an edge? (binary search in the sorted row*n + col keys)"""
+    key = a * g['n'] + b
+    pos = np.minimum(np.searchsorted(g['keys'], key), len(g['keys']) - 1)
+    return g['keys'][pos] == key
+
+
+def random_walks(g, starts, length=WALK_LENGTH, p=P, q=Q, seed=0):
+    """Node2Vec walks from every start node (rows; -1 pads walks that hit a dead end)."""
+    rng = np.random.default_rng(seed)
+    walks = np.full((len(starts), length), -1, dtype=np.int64)
+    walks[:, 0] = starts
+    if length > 1:
+        walks[:, 1] = _neighbours(g, walks[:, 0], rng)
+    max_bias = max(1 / p, 1.0, 1 / q)
+    for k in range(2, length):
+        alive = np.flatnonzero(walks[:, k - 1] >= 0)
+        prev, cur = walks[alive, k - 2], walks[alive, k - 1]
+        nxt = np.full(len(alive), -1, dtype=np.int64)
+        pending = np.arange(len(alive))
+        while len(pending):
+            cand = _neighbours(g, cur[pending], rng)
+            bias = np.where(cand == prev[pending], 1 / p,
+                            np.where(_is_edge(g, prev[pending], np.maximum(cand, 0)), 1.0, 1 / q))
+            keep = (cand < 0) | (rng.random(len(pending)) * max_bias < bias)
+            nxt[pending[keep]] = cand[keep]
+            pending = pending[~keep]
+        walks[alive, k] = nxt
+    return walks
+
+
+def _save_csr(g, path):
+    os.makedirs(path, exist_ok=True)
+    for name in CSR_ARRAYS:
+        np.save(os.path.join(path, f'{name}.npy'), g[name])
+
+
+def _load_csr(path):
+    g = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in CSR_ARRAYS}
+    g['n'] = len(g['indptr']) - 1
+    return g
+
+
+def _walk_task(path, starts, length, p, q, seed):
+    return random_walks(_load_csr(path), starts, length, p, q, seed)
+
+
+def sample_walks(g, starts, walks_per_node=WALKS_PER_NODE, length=WALK_LENGTH, p=P, q=Q, seed=0, workers=1):
+    """walks_per_node walks from every start node, in shuffled batches across `workers` processes."""
+    rng = np.random.default_rng(seed)
+    starts = np.concatenate([rng.permutation(starts) for _ in range(walks_per_node)])
+    batches = [starts[i:i + WALK_BATCH] for i in range(0, len(starts), WALK_BATCH)]
+    seeds = rng.integers(0, 2 ** 31, len(batches))
+    if not batches:
+        return np.full((0, length), -1, dtype=np.int64)
+    if workers <= 1:
+        return np.vstack([random_walks(g, b, length, p, q, s) for b, s in zip(batches, seeds)])
+    tmp = tempfile.mkdtemp(prefix='nfpc_walks_')
+    try:
+        _save_csr(g, tmp)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return np.vstack(list(pool.map(_walk_task, [tmp] * len(batches), batches, [length] * len(batches),
+                                           [p] * len(batches), [q] * len(batches), seeds)))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+# ── Skip-gram with negative sampling ──
+def context_pairs(walks, window=WINDOW):
+    """(centre, context) for every pair of walk positions at most `window` apart, both directions."""
+    centre, context = [], []
+    for d in range(1, window + 1):
+        a, b = walks[:, :-d].ravel(), walks[:, d:].ravel()
+        ok = (a >= 0) & (b >= 0)
+        centre += [a[ok], b[ok]]
+        context += [b[ok], a[ok]]
+    return np.concatenate(centre), np.concatenate(context)
+
+
+def _sigmoid(x):
+    return 1 / (1 + np.exp(-np.clip(x, -30, 30)))
+
+
+def _scatter_add(mat, idx, grad):
+    """mat[idx] += grad with repeated indices summed (one sparse product instead of np.add.at)."""
+    uniq, inv = np.unique(idx, return_inverse=True)
+    summed = sp.csr_matrix((np.ones(len(idx), dtype=grad.dtype), (inv, np.arange(len(idx)))),
+                           shape=(len(uniq), len(idx))) @ grad
+    mat[uniq] += summed
+
+
+def train_skipgram(walks, n_nodes, dim=DIM, window=WINDOW, negative=NEGATIVE, epochs=EPOCHS,
+                   lr=LEARNING_RATE, batch=BATCH_PAIRS, seed=0, verbose=True):
+    """Input (node) vectors of an SGNS model trained on the walks.
+
+    Every pair gets its own `negative` noise nodes (a B x k gather/scatter): a small pool shared
+    by the whole minibatch pushes every vector away from the same few nodes.
+    """
+    rng = np.random.default_rng(seed)
+    w_in = ((rng.random((n_nodes, dim)) - 0.5) / dim).astype(np.float32)
+    w_out = np.zeros((n_nodes, dim), dtype=np.float32)
+    freq = np.bincount(walks[walks >= 0], minlength=n_nodes) ** 0.75
+    noise = np.cumsum(freq) / max(freq.sum(), 1)
+    chunk = max(1, WALK_CHUNK_PAIRS // (2 * window * walks.shape[1]))
+    steps = (walks >= 0).sum(axis=1)                    # -1 padding only ever ends a walk
+    total = epochs * 2 * sum(int(np.maximum(steps - d, 0).sum()) for d in range(1, window + 1))
+    done, t0 = 0, time.perf_counter()
+    for epoch in range(epochs):
+        for i in range(0, len(walks), chunk):
+            centre, context = context_pairs(walks[i:i + chunk], window)
+            order = rng.permutation(len(centre))
+            for start in range(0, len(order), batch):
+                sel = order[start:start + batch]
+                c, o = centre[sel], context[sel]
+                neg = np.minimum(np.searchsorted(noise, rng.random((len(sel), negative))), n_nodes - 1)
+                alpha = np.float32(lr * max(1 - done / total, 1e-4))  # total > 0 once there is a pair
+                vc, vo, vn = w_in[c], w_out[o], w_out[neg]             # vn: B x k x dim
+                g_pos = (1 - _sigmoid(np.einsum('bd,bd->b', vc, vo))) * alpha
+                g_neg = -_sigmoid(np.einsum('bd,bkd->bk', vc, vn)) * alpha     # B x k
+                grad_in = g_pos[:, None] * vo + np.einsum('bk,bkd->bd', g_neg, vn)
+                grad_out = np.concatenate([g_pos[:, None] * vc, (g_neg[:, :, None] * vc[:, None]).reshape(-1, dim)])
+                _scatter_add(w_out, np.r_[o, neg.ravel()], grad_out)
+                _scatter_add(w_in, c, grad_in)
+                done += len(sel)
+        if verbose:
+            print(f"  [node2vec] epoch {epoch + 1}/{epochs}: {total // epochs:,} pairs "
+                  f"({time.perf_counter() - t0:.1f}s)")
+    return w_in
+
+
+# ── Pipeline ──
+def account_embeddings(graph, dim=DIM, walks_per_node=WALKS_PER_NODE, length=WALK_LENGTH, p=P, q=Q,
+                       window=WINDOW, negative=NEGATIVE, epochs=EPOCHS, weight='count', seed=0, workers=1,
+                       verbose=True):
+    """DataFrame(account_id, emb_0..emb_{dim-1}) for every account node of the graph."""
+    t0 = time.perf_counter()
+    adj, nodes, kind = node_adjacency(graph, weight)
+    g = step_table(adj)
+    accounts = np.flatnonzero(kind == 'account')
+    active = accounts[np.diff(g['indptr'])[accounts] > 0]
+    walks = sample_walks(g, active, walks_per_node, length, p, q, seed, workers)
+    if verbose:
+        print(f"  [node2vec] {len(walks):,} walks x {length} steps from {len(active):,} accounts "
+              f"({time.perf_counter() - t0:.1f}s)")
+    vectors = train_skipgram(walks, len(nodes), dim, window, negative, epochs, seed=seed, verbose=verbose)
+    emb = np.where((np.diff(g['indptr'])[accounts] > 0)[:, None], vectors[accounts], np.nan)
+    out = pd.DataFrame(emb, columns=[f'emb_{i}' for i in range(dim)])
+    out.insert(0, 'account_id', nodes[accounts])
+    return out
+
+
+def write_embeddings(emb, store_dir, params):
+    """embeddings.parquet next to features.parquet, with the Node2Vec parameters in its metadata."""
+    os.makedirs(store_dir, exist_ok=True)
+    table = pa.Table.from_pandas(emb, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                           b'nfpc_embeddings': json.dumps(params).encode()})
+    path = os.path.join(store_dir, EMBEDDING_FILE)
+    pq.write_table(table, path + '.tmp', compression='zstd')
+    os.replace(path + '.tmp', path)
+    return path
+
+
+if __name__ == '__main__':
+    from ingest import DATA_DIR
+    from graph import get_graph
+    parser = argparse.ArgumentParser(description='Node2Vec account embeddings on the transaction graph.')
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--store-dir', default=None, help='defaults to <data-dir>/feature_store')
+    parser.add_argument('--dim', type=int, default=DIM)
+    parser.add_argument('--walks-per-node', type=int, default=WALKS_PER_NODE)
+    parser.add_argument('--walk-length', type=int, default=WALK_LENGTH)
+    parser.add_argument('--p', type=float, default=P)
+    parser.add_argument('--q', type=float, default=Q)
+    parser.add_argument('--window', type=int, default=WINDOW)
+    parser.add_argument('--negative', type=int, default=NEGATIVE)
+    parser.add_argument('--epochs', type=int, default=EPOCHS)
+    parser.add_argument('--weight', choices=['count', 'volume'], default='count')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='walk-sampling processes')
+    args = parser.parse_args()
+    t0 = time.perf_counter()
+    graph = get_graph(args.data_dir)
+    params = {k: getattr(args, k) for k in ['dim', 'walks_per_node', 'walk_length', 'p', 'q', 'window',
+                                            'negative', 'epochs', 'weight', 'seed']}
+    emb = account_embeddings(graph, args.dim, args.walks_per_node, args.walk_length, args.p, args.q, args.window,
+                             args.negative, args.epochs, args.weight, args.seed, args.workers)
+    params['graph_sources'] = graph['meta'].get('sources', {})
+    path = write_embeddings(emb, args.store_dir or os.path.join(args.data_dir, 'feature_store'), params)
+    print(f"Wrote {len(emb):,} x {args.dim} embeddings to {path} in {time.perf_counter() - t0:.1f}s")
@@ -0,0 +1,153 @@
+"""
+NFPC Phase 1 - Parallel Per-Account Feature Executor
+Hash-partitions the transactions by account_id into shards, writes each shard once as
+an uncompressed Arrow IPC file and runs the per-account feature kernels on the shards
+in a process pool. Workers memory-map their shard, so the large frame is never pickled
+— only the shard path and the kernel (by reference) cross the process boundary.
+
+Every kernel here depends only on an account's own transactions, so the per-shard
+results concatenate to exactly the single-process output.
+"""
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import argparse, atexit, os, shutil, tempfile, time
+from concurrent.futures import ProcessPoolExecutor
+from aggregations import account_aggregates, degree_stats
+from dormancy import dormancy_features
+from passthrough import pass_through_scores
+from velocity import velocity_features
+
+# Per-account kernels that can run shard by shard: name -> fn(transactions) -> per-account frame
+FEATURES = {
+    'account_stats': account_aggregates,
+    'degree': degree_stats,
+    'pass_through': pass_through_scores,
+    'dormancy': dormancy_features,
+    'velocity': velocity_features,
+}
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+_shards = {}  # id(frame) -> (frame, n_shards, shard_dir, paths); reused within one process
+
+
+def shard_ids(accounts, n_shards):
+    """Shard number of each row: a stable hash of the account ID label, modulo n_shards."""
+    cat = pd.Categorical(accounts)
+    label_hash = pd.util.hash_array(np.asarray(cat.categories, dtype=object))
+    sid = (label_hash % np.uint64(n_shards)).astype(np.int64)
+    return np.where(cat.codes >= 0, sid[cat.codes], 0)
+
+
+def write_shards(transactions, n_shards, shard_dir=None):
+    """Write the hash partitions as Arrow IPC files; returns their paths.
+
+    Repeated calls with the same frame and shard count reuse the files already written.
+    """
+    cached = _shards.get(id(transactions))
+    if cached and cached[0] is transactions and cached[1] == n_shards and all(map(os.path.exists, cached[3])):
+        return cached[3]
+    shard_dir = shard_dir or tempfile.mkdtemp(prefix='nfpc_shards_')
+    os.makedirs(shard_dir, exist_ok=True)
+    sid = shard_ids(transactions['account_id'], n_shards)
+    order = np.argsort(sid, kind='stable')
+    bounds = np.searchsorted(sid[order], np.arange(n_shards + 1))
+    paths = []
+    for i in range(n_shards):
+        path = os.path.join(shard_dir, f'shard-{i}.arrow')
+        part = transactions.iloc[order[bounds[i]:bounds[i + 1]]]
+        table = pa.Table.from_pandas(part, preserve_index=False)
+        with pa.OSFile(path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        paths.append(path)
+    _shards[id(transactions)] = (transactions, n_shards, shard_dir, paths)
+    return paths
+
+
+def read_shard(path):
+    with pa.memory_map(path, 'r') as source:
+        return pa.ipc.open_file(source).read_all().to_pandas()
+
+
+def _run_shard(path, fn):
+    return fn(read_shard(path))
+
+
+def _combine(parts, like):
+    out = pd.concat([p for p in parts if len(p)], ignore_index=True) if any(len(p) for p in parts) else parts[0]
+    if isinstance(like.dtype, pd.CategoricalDtype):
+        out['account_id'] = pd.Categorical(out['account_id'], categories=like.cat.categories)
+    return out.sort_values('account_id', kind='stable').reset_index(drop=True)
+
+
+def map_accounts(fns, transactions, workers=DEFAULT_WORKERS, n_shards=None, shard_dir=None):
+    """Run each per-account kernel in `fns` ({name: fn}) over account shards in parallel.
+
+    Returns {name: frame}, identical to calling fn(transactions) directly. With one
+    worker the kernels are called in-process without sharding.
+    """
+    if workers <= 1 or len(transactions) == 0:
+        return {name: fn(transactions) for name, fn in fns.items()}
+    paths = write_shards(transactions, n_shards or workers, shard_dir)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {name: [pool.submit(_run_shard, p, fn) for p in paths] for name, fn in fns.items()}
+        return {name: _combine([f.result() for f in fs], transactions['account_id'])
+                for name, fs in futures.items()}
+
+
+def clear_shards():
+    """Delete every shard directory written by this process."""
+    for _, _, shard_dir, _ in _shards.values():
+        shutil.rmtree(shard_dir, ignore_errors=True)
+    _shards.clear()
+
+
+atexit.register(clear_shards)
+
+
+def benchmark(transactions, workers, names=None):
+    """Serial vs parallel wall time per feature, and whether the outputs are identical."""
+    fns = {name: FEATURES[name] for name in names or FEATURES}
+    t0 = time.perf_counter()
+    write_shards(transactions, workers)
+    shard_s = time.perf_counter() - t0
+    results = {}
+    for name, fn in fns.items():
+        t0 = time.perf_counter()
+        serial = fn(transactions)
+        serial_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        par = map_accounts({name: fn}, transactions, workers)[name]
+        par_s = time.perf_counter() - t0
+        results[name] = {'accounts': len(serial), 'serial_s': round(serial_s, 3), 'parallel_s': round(par_s, 3),
+                         'speedup': round(serial_s / max(par_s, 1e-9), 2),
+                         'identical': serial.reset_index(drop=True).equals(par)}
+    results['sharding'] = {'shards': workers, 'seconds': round(shard_s, 3)}
+    return results
+
+
+if __name__ == '__main__':
+    from ingest import DATA_DIR, load_tables
+    parser = argparse.ArgumentParser(description='Compute per-account features over account shards in parallel.')
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--features', nargs='+', default=list(FEATURES), choices=list(FEATURES))
+    parser.add_argument('--benchmark', action='store_true', help='time serial vs parallel and check equality')
+    parser.add_argument('--out', default=None, help='write the merged per-account features to this Parquet file')
+    args = parser.parse_args()
+    transactions = load_tables(args.data_dir)['transactions']
+    if args.benchmark:
+        for name, res in benchmark(transactions, args.workers, args.features).items():
+            print(f"{name}: {res}")
+    if args.out:
+        t0 = time.perf_counter()
+        res = map_accounts({n: FEATURES[n] for n in args.features}, transactions, args.workers)
+        merged = None
+        for frame in res.values():
+            if merged is None:
+                merged = frame
+            else:
+                extra = [c for c in frame.columns if c not in merged.columns]
+                merged = merged.merge(frame[['account_id'] + extra], on='account_id', how='outer')
+        merged.to_parquet(args.out, index=False)
+        print(f"Wrote {len(merged):,} accounts to {args.out} in {time.perf_counter() - t0:.1f}s")
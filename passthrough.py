@@ -0,0 +1,108 @@
+"""
+NFPC Phase 1 - Rapid Pass-Through Detector
+Vectorised Section 6.3 / feature #42: for every account, the fraction of credits that
+are followed by a debit of ±10% of the credited amount within 24 hours.
+
+Debits are sorted once by (account, timestamp). Each credit's candidate debits form a
+contiguous slice of that array, located with two searchsorted calls; the slices are
+expanded in bounded chunks and the amount condition is checked on flat arrays.
+"""
+import pandas as pd
+import numpy as np
+import argparse, time
+from schema import key_codes
+
+WINDOW = pd.Timedelta(hours=24)
+AMOUNT_TOL = 0.10
+MAX_PAIRS = 20_000_000  # candidate (credit, debit) pairs materialised at once
+
+
+def _debit_windows(acct, ts, is_credit, is_debit, window):
+    """Sorted debit index plus the [lo, hi) debit slice of every credit.
+
+    Timestamps are rank-compressed so (account, time) packs into one int64 key
+    without overflow, whatever the time unit or number of accounts.
+    """
+    d_idx = np.flatnonzero(is_debit)
+    d_idx = d_idx[np.lexsort((ts[d_idx], acct[d_idx]))]
+    c_idx = np.flatnonzero(is_credit)
+    c_ts = ts[c_idx]
+    grid = np.unique(np.concatenate([ts[d_idx], c_ts, c_ts + window]))
+    m = np.int64(len(grid) + 1)
+    d_key = acct[d_idx].astype(np.int64) * m + np.searchsorted(grid, ts[d_idx])
+    c_base = acct[c_idx].astype(np.int64) * m
+    lo = np.searchsorted(d_key, c_base + np.searchsorted(grid, c_ts), side='right')
+    hi = np.searchsorted(d_key, c_base + np.searchsorted(grid, c_ts + window), side='right')
+    return d_idx, c_idx, lo, hi
+
+
+def match_credits(acct, ts, amount, is_credit, is_debit, window=WINDOW, tol=AMOUNT_TOL, max_pairs=MAX_PAIRS):
+    """Boolean per credit (in c_idx order): matched by a later debit inside the window.
+
+    Same rule as the original Section 6.3 loop: debit time in (t, t + window] and
+    |debit amount| between credit amount × (1 ± tol), inclusive.
+    """
+    valid = ~np.isnat(ts)
+    window = np.timedelta64(pd.Timedelta(window).value, 'ns').astype(f'm8[{np.datetime_data(ts.dtype)[0]}]')
+    d_idx, c_idx, lo, hi = _debit_windows(acct, ts, is_credit & valid, is_debit & valid, window)
+    counts = hi - lo
+    matched = np.zeros(len(c_idx), dtype=bool)
+    c_lo = amount[c_idx] * (1 - tol)
+    c_hi = amount[c_idx] * (1 + tol)
+    d_abs = np.abs(amount[d_idx])
+    cum = np.cumsum(counts)
+    start = 0
+    while start < len(c_idx):
+        stop = max(int(np.searchsorted(cum, (cum[start - 1] if start else 0) + max_pairs, side='right')), start + 1)
+        cnt = counts[start:stop]
+        if cnt.sum():
+            owner = np.repeat(np.arange(start, stop), cnt)
+            offs = np.arange(cnt.sum()) - np.repeat(np.cumsum(cnt) - cnt, cnt)
+            amt = d_abs[lo[owner] + offs]
+            hit = (amt >= c_lo[owner]) & (amt <= c_hi[owner])
+            matched[start:stop] = np.bincount(owner[hit] - start, minlength=stop - start) > 0
+        start = stop
+    return c_idx, matched
+
+
+def pass_through_scores(transactions, window=WINDOW, tol=AMOUNT_TOL):
+    """Per-account pass-through stats for every account present in `transactions`.
+
+    Columns: account_id, credit_count, matched_credits, pass_through_score
+    (matched / credits, 0 for accounts without credits), has_pass_through.
+    """
+    acct, accounts = key_codes(transactions['account_id'])
+    ts = transactions['transaction_timestamp'].to_numpy()
+    amount = transactions['amount'].to_numpy(dtype=np.float64)
+    is_credit = (transactions['txn_type'] == 'C').to_numpy()
+    is_debit = (transactions['txn_type'] == 'D').to_numpy()
+    c_idx, matched = match_credits(acct, ts, amount, is_credit, is_debit, window, tol)
+
+    n = len(accounts)
+    present = np.bincount(acct, minlength=n) > 0
+    credit_count = np.bincount(acct[is_credit], minlength=n)
+    matched_count = np.bincount(acct[c_idx[matched]], minlength=n)
+    out = pd.DataFrame({
+        'account_id': accounts[present],
+        'credit_count': credit_count[present],
+        'matched_credits': matched_count[present],
+    })
+    out['pass_through_score'] = np.where(out['credit_count'] > 0,
+                                         out['matched_credits'] / out['credit_count'].clip(lower=1), 0.0)
+    out['has_pass_through'] = out['matched_credits'] > 0
+    if isinstance(transactions['account_id'].dtype, pd.CategoricalDtype):
+        out['account_id'] = pd.Categorical(out['account_id'], categories=accounts)
+    return out
+
+
+if __name__ == '__main__':
+    from ingest import DATA_DIR, load_tables
+    parser = argparse.ArgumentParser(description='Compute pass_through_score (feature #42) for every account.')
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--out', default='pass_through.parquet')
+    args = parser.parse_args()
+    transactions = load_tables(args.data_dir)['transactions']
+    t0 = time.perf_counter()
+    scores = pass_through_scores(transactions)
+    print(f"Scored {len(scores):,} accounts over {len(transactions):,} transactions in {time.perf_counter() - t0:.2f}s")
+    scores.to_parquet(args.out, index=False)
@@ -0,0 +1,423 @@
+"""
+NFPC Phase 1 - Staged Pipeline Runner
+The EDA as a DAG of named stages with declared inputs and outputs. Every persisted
+stage writes its outputs to a content-addressed cache keyed by the stage's code and
+the keys of its inputs, so a run only recomputes stages whose code or upstream data
+changed. The raw tables are keyed by the ingest fingerprints (content hashes).
+
+Stages register themselves with @stage; report sections use section()/text()/
+save_fig()/stats_dict exactly like the original script, and the runner captures what
+each section writes so cached sections can be re-assembled without recomputation.
+Sections hand their figures over as pre-binned specs (add_figure, plots.py); the report
+stage renders them in a process pool and skips every figure whose spec is unchanged.
+
+    python eda_full.py                          # all stale stages + eda_report.md
+    python eda_full.py run --only section7      # section7 and whatever it needs
+    python eda_full.py run --force acct_txn_stats
+    python eda_full.py list                     # stages, inputs and cache status
+    python eda_full.py run --profile-dir prof   # + a cProfile dump (prof/<stage>.prof) per computed stage
+
+Every stage runs inside profiled(): wall and CPU time (CPU includes finished worker
+processes), peak RSS above the stage's starting RSS (sampled from /proc every few ms),
+rows in and out (DataFrame inputs/outputs) and time spent drawing figures. The record is
+kept in the stage's artifact metadata, so cached stages still report their last
+timing; PROFILE holds the records of the current run. The .prof dumps open in
+snakeviz/pstats; for a sampling view run the same command under py-spy instead.
+"""
+import pandas as pd
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import argparse, cProfile, hashlib, inspect, json, os, pickle, resource, shutil, sys, threading, time, warnings
+from contextlib import contextmanager
+from ingest import DATA_DIR, build_cache, default_cache_dir, read_manifest
+from plots import DEFAULT_WORKERS as PLOT_WORKERS, apply_style, render_all
+warnings.filterwarnings('ignore')
+
+# ── Config ──
+PLOT_DIR = r'C:\Users\jaivi\OneDrive\Desktop\upi\plots'
+REPORT_PATH = r'C:\Users\jaivi\OneDrive\Desktop\upi\eda_report.md'
+PIPELINE_VERSION = 1
+
+CONFIG = {
+    'data_dir': DATA_DIR,
+    'plot_dir': PLOT_DIR,
+    'report_path': REPORT_PATH,
+    'artifact_dir': os.path.join(DATA_DIR, 'pipeline_cache'),
+    'workers': 1,  # processes for the per-account feature stages (parallel.py)
+    'profile_dir': None,  # cProfile dump per computed stage when set
+    'plot_workers': PLOT_WORKERS,  # processes rendering the report figures
+}
+
+STAGES = {}
+PRODUCERS = {}
+PROFILE = {}  # stage -> profile record of the current run (computed or cached)
+
+# Per-stage capture buffers; the runner clears them before each report stage runs.
+report_lines = []
+stats_dict = {}
+_plots = []
+_figures = []
+_plot_seconds = [0.0]
+
+
+def stage(name, inputs=(), outputs=(), code=(), persist=True, report=False):
+    """Register a pipeline stage.
+
+    inputs/outputs  artifact names; the function receives inputs as keyword arguments
+                    and returns a dict with every declared output
+    code            extra functions/modules whose source is part of the cache key
+    persist         False for cheap stages that always run when needed (e.g. load)
+    report          the stage writes report lines/plots/stats; they are captured as
+                    the artifact '<name>.report'
+    """
+    def register(fn):
+        outs = list(outputs) + ([f'{name}.report'] if report else [])
+        STAGES[name] = {'name': name, 'fn': fn, 'inputs': list(inputs), 'outputs': outs,
+                        'code': list(code), 'persist': persist, 'report': report}
+        for out in outs:
+            PRODUCERS[out] = name
+        return fn
+    return register
+
+
+# ── Report helpers (same API as the original script) ──
+def section(title, level=1):
+    report_lines.append(f"\n{'#'*level} {title}\n")
+
+
+def text(t):
+    report_lines.append(t + "\n")
+
+
+def save_fig(name):
+    path = os.path.join(CONFIG['plot_dir'], f"{name}.png")
+    t0 = time.perf_counter()
+    plt.savefig(path)
+    plt.close()
+    _plot_seconds[0] += time.perf_counter() - t0
+    report_lines.append(f"\n![{name}](plots/{name}.png)\n")
+    _plots.append(name)
+    return path
+
+
+def add_figure(spec):
+    """Queue a figure spec (plots.figure) for rendering at report time."""
+    report_lines.append(f"\n![{spec['name']}](plots/{spec['name']}.png)\n")
+    _figures.append(spec)
+
+
+def render_figures(specs):
+    """Render the specs that changed since the last report; the time counts as plot time."""
+    t0 = time.perf_counter()
+    rendered = render_all(specs, CONFIG['plot_dir'], CONFIG['plot_workers'])
+    _plot_seconds[0] += time.perf_counter() - t0
+    return rendered
+
+
+# ── Profiling ──
+_rss = {}
+
+
+def rss_mb():
+    """Current resident set size in MB (the process high-water mark where /proc is unavailable)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+
+def _rss_sampler(interval=0.005):
+    """Shared daemon thread keeping _rss['peak'] up to date."""
+    if not _rss:
+        _rss['peak'] = rss_mb()
+
+        def loop():
+            while True:
+                time.sleep(interval)
+                _rss['peak'] = max(_rss['peak'], rss_mb())
+        threading.Thread(target=loop, daemon=True).start()
+    return _rss
+
+
+def _cpu_seconds():
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+def _rows(values):
+    return sum(len(v) for v in values if isinstance(v, pd.DataFrame))
+
+
+@contextmanager
+def profiled(name, inputs=None, profile_dir=None):
+    """Time one stage; yields its record, completed on exit (rows_out is set by the caller)."""
+    sampler = _rss_sampler()
+    start_rss = rss_mb()
+    sampler['peak'] = start_rss
+    _plot_seconds[0] = 0.0
+    record = {'stage': name, 'rows_in': _rows((inputs or {}).values()), 'rows_out': 0}
+    prof = cProfile.Profile() if profile_dir else None
+    t0, c0 = time.perf_counter(), _cpu_seconds()
+    if prof:
+        prof.enable()
+    try:
+        yield record
+    finally:
+        if prof:
+            prof.disable()
+            os.makedirs(profile_dir, exist_ok=True)
+            prof.dump_stats(os.path.join(profile_dir, f'{name}.prof'))
+        peak = max(sampler['peak'], rss_mb())
+        record.update(wall_s=round(time.perf_counter() - t0, 3), cpu_s=round(_cpu_seconds() - c0, 3),
+                      plot_s=round(_plot_seconds[0], 3), peak_rss_mb=round(peak, 1),
+                      rss_delta_mb=round(peak - start_rss, 1))
+
+
+def profile_line(record):
+    return (f"{record['wall_s']:.1f}s (cpu {record['cpu_s']:.1f}s, peak +{record['rss_delta_mb']:,.0f} MB, "
+            f"{record['rows_in']:,} rows in)")
+
+
+def profile_table(records):
+    """Markdown timing table for the report, slowest stage first."""
+    lines = ["| Stage | Status | Wall (s) | CPU (s) | Plots (s) | Peak RSS Δ (MB) | Rows in | Rows out |",
+             "|---|---|---|---|---|---|---|---|"]
+    for r in sorted(records, key=lambda r: -r['wall_s']):
+        lines.append(f"| `{r['stage']}` | {r.get('status', 'computed')} | {r['wall_s']:.2f} | {r['cpu_s']:.2f} | "
+                     f"{r['plot_s']:.2f} | {r['rss_delta_mb']:,.0f} | {r['rows_in']:,} | {r['rows_out']:,} |")
+    computed = [r for r in records if r.get('status', 'computed') == 'computed']
+    lines.append(f"\n*{len(computed)} stage(s) computed in {sum(r['wall_s'] for r in computed):.1f}s this run; "
+                 f"cached stages show the timing of the run that produced them.*")
+    return lines
+
+
+# ── DAG ──
+def upstream(name):
+    return [PRODUCERS[a] for a in STAGES[name]['inputs']]
+
+
+def closure(targets):
+    """targets plus every stage they depend on, in topological order."""
+    order, seen = [], set()
+
+    def visit(name):
+        if name in seen:
+            return
+        seen.add(name)
+        for dep in upstream(name):
+            visit(dep)
+        order.append(name)
+    for t in targets:
+        if t not in STAGES:
+            raise KeyError(f"unknown stage '{t}' (see: list)")
+        visit(t)
+    return order
+
+
+def sinks():
+    consumed = {PRODUCERS[a] for s in STAGES.values() for a in s['inputs']}
+    return [name for name in STAGES if name not in consumed]
+
+
+def _source(obj):
+    try:
+        return inspect.getsource(obj)
+    except (OSError, TypeError):
+        return repr(obj)
+
+
+def stage_keys(names):
+    """Content address of each stage: its code, its extra code deps and its inputs' keys."""
+    tables = read_manifest(default_cache_dir(CONFIG['data_dir']))
+    raw = json.dumps({'schema': tables.get('schema'),
+                      'tables': {k: v['sha256'] for k, v in sorted(tables['tables'].items())}})
+    keys = {}
+    for name in names:
+        s = STAGES[name]
+        h = hashlib.sha256()
+        h.update(f"{PIPELINE_VERSION}|{name}|".encode())
+        h.update(_source(s['fn']).encode())
+        for dep in s['code']:
+            h.update(_source(dep).encode())
+        if not s['inputs']:
+            h.update(raw.encode())
+        for dep in upstream(name):
+            h.update(keys[dep].encode())
+        keys[name] = h.hexdigest()[:20]
+    return keys
+
+
+# ── Artifact store ──
+def artifact_path(name, key):
+    return os.path.join(CONFIG['artifact_dir'], name, key)
+
+
+def is_cached(name, key):
+    return os.path.exists(os.path.join(artifact_path(name, key), 'meta.json'))
+
+
+def save_artifacts(name, key, outputs, profile):
+    final = artifact_path(name, key)
+    tmp = final + '.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    files = {}
+    for out, value in outputs.items():
+        if isinstance(value, pd.DataFrame):
+            files[out] = f'{out}.parquet'
+            value.to_parquet(os.path.join(tmp, files[out]), index=False)
+        else:
+            files[out] = f'{out}.pkl'
+            with open(os.path.join(tmp, files[out]), 'wb') as f:
+                pickle.dump(value, f)
+        if out.endswith('.report'):
+            os.makedirs(os.path.join(tmp, 'plots'), exist_ok=True)
+            for plot in value['plots']:
+                shutil.copy2(os.path.join(CONFIG['plot_dir'], f'{plot}.png'), os.path.join(tmp, 'plots'))
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump({'stage': name, 'key': key, 'files': files, 'seconds': profile['wall_s'], 'profile': profile,
+                   'created': time.strftime('%Y-%m-%d %H:%M:%S')}, f, indent=2)
+    shutil.rmtree(final, ignore_errors=True)
+    os.replace(tmp, final)
+
+
+def artifact_profile(name, key):
+    """Profile record stored with a cached stage (None for artifacts from before profiling)."""
+    with open(os.path.join(artifact_path(name, key), 'meta.json')) as f:
+        return json.load(f).get('profile')
+
+
+def load_artifact(name, key, out):
+    base = artifact_path(name, key)
+    with open(os.path.join(base, 'meta.json')) as f:
+        fname = json.load(f)['files'][out]
+    if fname.endswith('.parquet'):
+        return pd.read_parquet(os.path.join(base, fname))
+    with open(os.path.join(base, fname), 'rb') as f:
+        return pickle.load(f)
+
+
+def restore_plots(name, key):
+    """Copy a cached section's figures back into the plot directory if they are missing."""
+    src = os.path.join(artifact_path(name, key), 'plots')
+    if not os.path.isdir(src):
+        return
+    for fname in os.listdir(src):
+        dst = os.path.join(CONFIG['plot_dir'], fname)
+        if not os.path.exists(dst):
+            shutil.copy2(os.path.join(src, fname), dst)
+
+
+# ── Execution ──
+def execute(name, inputs):
+    s = STAGES[name]
+    if s['report']:
+        report_lines.clear()
+        stats_dict.clear()
+        _plots.clear()
+        _figures.clear()
+    with profiled(name, inputs, CONFIG['profile_dir']) as record:
+        outputs = s['fn'](**inputs) or {}
+    record['rows_out'] = _rows(outputs.values())
+    PROFILE[name] = record
+    if s['report']:
+        outputs[f'{name}.report'] = {'lines': list(report_lines), 'stats': dict(stats_dict), 'plots': list(_plots),
+                                      'figures': list(_figures)}
+    missing = set(s['outputs']) - set(outputs)
+    if missing:
+        raise RuntimeError(f"stage '{name}' did not produce {sorted(missing)}")
+    return outputs
+
+
+def run(targets=None, only=None, force=(), verbose=True):
+    """Bring `targets` (default: every sink stage) up to date. Returns {stage: status}.
+
+    `only` restricts the run to the named stages and their dependencies. Stages in
+    `force` are recomputed even when cached ('all' forces everything).
+    """
+    build_cache(CONFIG['data_dir'], verbose=verbose)
+    os.makedirs(CONFIG['plot_dir'], exist_ok=True)
+    apply_style()
+
+    targets = list(only or targets or sinks())
+    order = closure(targets)
+    keys = stage_keys(order)
+    force = set(order) if 'all' in force else set(force)
+    stale = {n for n in order if STAGES[n]['persist'] and (n in force or not is_cached(n, keys[n]))}
+    memo, status = {}, {}
+    PROFILE.clear()
+
+    def get(artifact):
+        if artifact not in memo:
+            producer = PRODUCERS[artifact]
+            if STAGES[producer]['persist'] and producer not in stale:
+                memo[artifact] = load_artifact(producer, keys[producer], artifact)
+            else:
+                compute(producer)
+        return memo[artifact]
+
+    def compute(name):
+        if name in status:
+            return
+        s = STAGES[name]
+        inputs = {a.replace('.', '_'): get(a) for a in s['inputs']}
+        outputs = execute(name, inputs)
+        memo.update(outputs)
+        if s['persist']:
+            save_artifacts(name, keys[name], outputs, PROFILE[name])
+        status[name] = f'computed in {profile_line(PROFILE[name])}'
+        if verbose:
+            print(f"  [pipeline] {name}: {status[name]}")
+
+    for name in order:
+        if name in stale or (name in targets and not STAGES[name]['persist']):
+            compute(name)
+        elif STAGES[name]['persist']:
+            if STAGES[name]['report']:
+                restore_plots(name, keys[name])
+            if name not in status:
+                status[name] = 'cached'
+                profile = artifact_profile(name, keys[name])
+                if profile:
+                    PROFILE[name] = {**profile, 'status': 'cached'}
+    if verbose:
+        n_cached = sum(v == 'cached' for v in status.values())
+        print(f"  [pipeline] {len(status)} stage(s): {len(status) - n_cached} computed, {n_cached} cached")
+    return status
+
+
+def describe():
+    order = closure(list(STAGES))
+    keys = stage_keys(order)
+    rows = []
+    for name in order:
+        s = STAGES[name]
+        cached = 'always runs' if not s['persist'] else ('cached' if is_cached(name, keys[name]) else 'stale')
+        rows.append({'stage': name, 'inputs': ', '.join(s['inputs']) or '-', 'status': cached})
+    return pd.DataFrame(rows)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the NFPC EDA pipeline.')
+    parser.add_argument('command', nargs='?', default='run', choices=['run', 'list'])
+    parser.add_argument('--only', nargs='+', default=None, help='run just these stages (plus their stale dependencies)')
+    parser.add_argument('--force', nargs='+', default=(), help="recompute these stages even if cached ('all' for everything)")
+    parser.add_argument('--data-dir', default=CONFIG['data_dir'])
+    parser.add_argument('--plot-dir', default=CONFIG['plot_dir'])
+    parser.add_argument('--report-path', default=CONFIG['report_path'])
+    parser.add_argument('--artifact-dir', default=None, help='defaults to <data-dir>/pipeline_cache')
+    parser.add_argument('--workers', type=int, default=CONFIG['workers'], help='processes for per-account feature stages')
+    parser.add_argument('--profile-dir', default=None, help='write a cProfile dump per computed stage here')
+    parser.add_argument('--plot-workers', type=int, default=CONFIG['plot_workers'], help='processes rendering figures')
+    args = parser.parse_args(argv)
+    CONFIG.update(data_dir=args.data_dir, plot_dir=args.plot_dir, report_path=args.report_path,
+                  artifact_dir=args.artifact_dir or os.path.join(args.data_dir, 'pipeline_cache'),
+                  workers=args.workers, profile_dir=args.profile_dir, plot_workers=args.plot_workers)
+    if args.command == 'list':
+        build_cache(CONFIG['data_dir'], verbose=False)
+        print(describe().to_string(index=False))
+        return
+    run(only=args.only, force=args.force)
@@ -0,0 +1,200 @@
+"""
+NFPC Phase 1 - Report Figures
+The report's figures as small, JSON-serialisable specs. A section reduces its data
+where the pipeline work happens — histograms with np.histogram, counts with
+value_counts — and records only the bin heights, bar values and line points in a
+figure spec; matplotlib never sees the raw rows.
+
+Rendering happens once per report (render_all): every spec is hashed together with
+STYLE, figures whose hash matches the manifest in the plot directory (and whose PNG
+exists) are skipped, and the rest are drawn in a process pool. Regenerating the report
+after a text-only change therefore renders nothing.
+
+    fig = figure('account_age_distribution', figsize=(14, 5))
+    ax = fig['axes'][0]
+    hist(ax, legit_age, bins=60, color='#2ecc71', label='Legitimate')
+    ax.update(title='Account Age Distribution (Days)', legend=True)
+    add_figure(fig)   # pipeline.py: report line now, PNG at report time
+"""
+import numpy as np
+import pandas as pd
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import seaborn as sns
+import argparse, hashlib, json, os, time, warnings
+from concurrent.futures import ProcessPoolExecutor
+warnings.filterwarnings('ignore')
+
+STYLE = {
+    'theme': {'style': 'whitegrid', 'palette': 'muted', 'font_scale': 1.1},
+    'rc': {'figure.dpi': 150, 'savefig.bbox': 'tight', 'figure.figsize': [12, 6]},
+}
+RENDER_VERSION = 1  # bump when render() changes how a spec is drawn
+MANIFEST_FILE = '.figure_hashes.json'
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+
+def apply_style():
+    sns.set_theme(**STYLE['theme'])
+    plt.rcParams.update(STYLE['rc'])
+
+
+# ── Spec builders ──
+def figure(name, nrows=1, ncols=1, figsize=None):
+    """Empty figure spec; fig['axes'] is row-major, one dict per subplot."""
+    return {'name': name, 'nrows': nrows, 'ncols': ncols, 'figsize': list(figsize) if figsize else None,
+            'axes': [{'layers': []} for _ in range(nrows * ncols)]}
+
+
+def _values(values):
+    values = pd.Series(values).to_numpy(dtype=np.float64, na_value=np.nan)
+    return values[np.isfinite(values)]
+
+
+def _list(values):
+    return [v.item() if isinstance(v, np.generic) else v for v in values]
+
+
+def hist(ax, values, bins, density=True, alpha=0.5, **kw):
+    """Pre-binned histogram of `values` (NaNs dropped); bins as for np.histogram."""
+    values = _values(values)
+    if len(values):
+        heights, edges = np.histogram(values, bins=bins, density=density)
+    else:
+        edges = np.asarray(bins, dtype=np.float64) if np.ndim(bins) else np.linspace(0, 1, bins + 1)
+        heights = np.zeros(len(edges) - 1)
+    ax['layers'].append({'kind': 'hist', 'heights': heights.tolist(), 'edges': edges.tolist(),
+                         'kw': {'alpha': alpha, **kw}})
+
+
+def bar(ax, x, heights, horizontal=False, **kw):
+    """Bars at numeric positions or string categories (horizontal: first category at the bottom)."""
+    x = [str(v) for v in x] if not np.issubdtype(np.asarray(x).dtype, np.number) else _list(np.asarray(x))
+    ax['layers'].append({'kind': 'barh' if horizontal else 'bar', 'x': x,
+                         'heights': _list(np.asarray(heights, dtype=np.float64)), 'kw': kw})
+
+
+def counts(ax, series, horizontal=False, **kw):
+    """Bars of a value_counts()-style Series (index -> count)."""
+    bar(ax, series.index.astype(str), series.to_numpy(), horizontal, **kw)
+
+
+def line(ax, x, y, **kw):
+    ax['layers'].append({'kind': 'line', 'x': _list(np.asarray(x)), 'y': _list(np.asarray(y, dtype=np.float64)),
+                         'kw': kw})
+
+
+def pie(ax, series, **kw):
+    ax['layers'].append({'kind': 'pie', 'labels': [str(v) for v in series.index],
+                         'values': _list(series.to_numpy(dtype=np.float64)), 'kw': kw})
+
+
+def vline(ax, x, **kw):
+    ax['layers'].append({'kind': 'vline', 'x': float(x), 'kw': kw})
+
+
+def label(ax, x, y, s, **kw):
+    ax['layers'].append({'kind': 'text', 'x': float(x), 'y': float(y), 's': s, 'kw': kw})
+
+
+# ── Rendering ──
+def _draw(ax, layer):
+    kind, kw = layer['kind'], layer['kw']
+    if kind == 'hist':
+        edges = layer['edges']
+        ax.hist(edges[:-1], bins=edges, weights=layer['heights'], **kw)
+    elif kind == 'bar':
+        ax.bar(layer['x'], layer['heights'], **kw)
+    elif kind == 'barh':
+        ax.barh(layer['x'], layer['heights'], **kw)
+    elif kind == 'line':
+        ax.plot(layer['x'], layer['y'], **kw)
+    elif kind == 'pie':
+        ax.pie(layer['values'], labels=layer['labels'], **kw)
+    elif kind == 'vline':
+        ax.axvline(x=layer['x'], **kw)
+    elif kind == 'text':
+        ax.text(layer['x'], layer['y'], layer['s'], **kw)
+
+
+def render(spec, path):
+    """Draw one figure spec to `path`."""
+    apply_style()
+    fig, axes = plt.subplots(spec['nrows'], spec['ncols'], figsize=spec['figsize'], squeeze=False)
+    for ax, a in zip(axes.ravel(), spec['axes']):
+        for layer in a['layers']:
+            _draw(ax, layer)
+        if 'xticks' in a:
+            ax.set_xticks(a['xticks'])
+        if 'xticklabels' in a:
+            ax.set_xticklabels(a['xticklabels'])
+        if 'rotation' in a:
+            ax.tick_params(axis='x', labelrotation=a['rotation'])
+        ax.set_title(a.get('title', ''))
+        ax.set_xlabel(a.get('xlabel', ''))
+        ax.set_ylabel(a.get('ylabel', ''))
+        if a.get('legend'):
+            ax.legend()
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+    return path
+
+
+def spec_hash(spec):
+    payload = json.dumps({'spec': spec, 'style': STYLE, 'version': RENDER_VERSION}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def read_manifest(plot_dir):
+    path = os.path.join(plot_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def render_all(specs, plot_dir, workers=DEFAULT_WORKERS):
+    """Render the specs whose hash changed (or whose PNG is missing). Returns the names rendered."""
+    os.makedirs(plot_dir, exist_ok=True)
+    manifest = read_manifest(plot_dir)
+    hashes = {s['name']: spec_hash(s) for s in specs}
+    stale = [s for s in specs if manifest.get(s['name']) != hashes[s['name']]
+             or not os.path.exists(os.path.join(plot_dir, f"{s['name']}.png"))]
+    paths = [os.path.join(plot_dir, f"{s['name']}.png") for s in stale]
+    workers = max(1, min(workers, len(stale)))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(render, stale, paths))
+    else:
+        for spec, path in zip(stale, paths):
+            render(spec, path)
+    manifest.update(hashes)
+    with open(os.path.join(plot_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return [s['name'] for s in stale]
+
+
+if __name__ == '__main__':
+    from pipeline import CONFIG, PLOT_DIR
+    parser = argparse.ArgumentParser(description='Re-render the report figures from the cached section specs.')
+    parser.add_argument('--plot-dir', default=PLOT_DIR)
+    parser.add_argument('--data-dir', default=CONFIG['data_dir'])
+    parser.add_argument('--artifact-dir', default=None, help='defaults to <data-dir>/pipeline_cache')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--force', action='store_true', help='ignore the hash manifest')
+    args = parser.parse_args()
+    import pickle
+    from glob import glob
+    artifact_dir = args.artifact_dir or os.path.join(args.data_dir, 'pipeline_cache')
+    specs = {}
+    for path in sorted(glob(os.path.join(artifact_dir, '*', '*', '*.report.pkl')), key=os.path.getmtime):
+        with open(path, 'rb') as f:
+            for spec in pickle.load(f).get('figures', []):
+                specs[spec['name']] = spec  # newest artifact of a section wins
+    if args.force and os.path.exists(os.path.join(args.plot_dir, MANIFEST_FILE)):
+        os.remove(os.path.join(args.plot_dir, MANIFEST_FILE))
+    t0 = time.perf_counter()
+    rendered = render_all(list(specs.values()), args.plot_dir, args.workers)
+    print(f"{len(rendered)} of {len(specs)} figure(s) rendered in {time.perf_counter() - t0:.2f}s")
@@ -0,0 +1,314 @@
+"""
+NFPC Phase 1 - Transaction Stream Replay
+Feeds the historical transactions to a consumer in event-time order at a controlled
+rate (1x, 100x, ... or as fast as the consumer takes them) and reports throughput and
+the consumer's end-to-end lag. The standard load generator for streaming features and
+scoring (scoring.py).
+
+The transactions_part_* files are not sorted by time, so replay is an external merge
+sort. First, each part of the ingest cache is read in chunks of RUN_ROWS. Every chunk is
+sorted by transaction_timestamp and written as a run. The runs are kept next to the
+cache and rebuilt only when a part's fingerprint changes. Then the runs are k-way merged
+with one buffer of MERGE_ROWS per run. Each step emits every buffered row up to the
+smallest buffer tail, which no unread row can precede, and refills the drained
+buffers. Peak memory is k x MERGE_ROWS rows, whatever the total size.
+
+Events are dicts of READ_COLUMNS, with transaction_timestamp as epoch nanoseconds (the
+format scoring.score takes). Rows without a timestamp cannot be placed and are skipped.
+
+  events()     generator of the events, unpaced
+  stream()     generator of (due time, event); sleeps to hold the rate
+  run()        drives stream() through a consumer function
+  run_async()  producer -> asyncio.Queue(maxsize) -> consumer; a full queue blocks the
+               producer (backpressure), and the time it spent blocked is reported
+
+Lag is the time from an event's due time (first event + event-time offset / speed, or
+the moment it was produced at max speed) until the consumer finished with it.
+
+    python replay.py --speed 100 --limit 50000
+    python replay.py --consumer score --start 2025-06-01     # drive scoring.py
+"""
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import argparse, asyncio, glob, json, os, time
+from ingest import DATA_DIR, build_cache, default_cache_dir, read_manifest
+from streaming import READ_COLUMNS
+
+RUN_ROWS = 2_000_000   # rows sorted in memory at once when writing runs
+MERGE_ROWS = 50_000    # rows buffered per run while merging
+QUEUE_SIZE = 10_000
+RUNS_DIR = 'replay_runs'
+
+
+# ── Sorted runs ──
+def _ns(ts):
+    return ts.to_numpy().astype('M8[ns]').view(np.int64)
+
+
+def _write_run(df, path):
+    """Like ingest.write_parquet, with row groups of MERGE_ROWS so a replay from --start skips the rest."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = os.path.join(os.path.dirname(path), '.' + os.path.basename(path) + '.tmp')
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp, compression='zstd', row_group_size=MERGE_ROWS)
+    os.replace(tmp, path)
+
+
+def _row_groups(source, start):
+    """Row groups of a run that hold events at or after `start` (all when start is None)."""
+    groups = list(range(source.metadata.num_row_groups))
+    if start is None:
+        return groups
+    col = source.schema_arrow.get_field_index('transaction_timestamp')
+    keep = []
+    for g in groups:
+        stats = source.metadata.row_group(g).column(col).statistics
+        if stats is None or not stats.has_min_max or pd.Timestamp(stats.max).value >= start:
+            keep.append(g)
+    return keep
+
+
+def build_runs(data_dir=DATA_DIR, cache_dir=None, run_rows=RUN_ROWS, verbose=True):
+    """Time-sorted runs of every cached transaction part; returns their paths."""
+    cache_dir = cache_dir or default_cache_dir(data_dir)
+    build_cache(data_dir, cache_dir, verbose=verbose)
+    parts = {name: fp['sha256'] for name, fp in read_manifest(cache_dir)['tables'].items()
+             if name.startswith('transactions_part_')}
+    run_dir = os.path.join(cache_dir, RUNS_DIR)
+    index_path = os.path.join(run_dir, 'runs.json')
+    index = {}
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            index = json.load(f)
+    paths = []
+    for name, sha in sorted(parts.items()):
+        entry = index.get(name)
+        if entry and entry['sha256'] == sha and entry['run_rows'] == run_rows and \
+                all(os.path.exists(os.path.join(run_dir, r)) for r in entry['runs']):
+            paths += [os.path.join(run_dir, r) for r in entry['runs']]
+            continue
+        t0 = time.perf_counter()
+        for old in glob.glob(os.path.join(run_dir, f'{name}-*.parquet')):
+            os.remove(old)
+        source = pq.ParquetFile(os.path.join(cache_dir, 'transactions', f"part-{name.rsplit('_', 1)[1]}.parquet"))
+        runs = []
+        for i, batch in enumerate(source.iter_batches(batch_size=run_rows, columns=READ_COLUMNS)):
+            chunk = batch.to_pandas()
+            chunk = chunk[chunk['transaction_timestamp'].notna()]
+            chunk = chunk.sort_values('transaction_timestamp', kind='stable', ignore_index=True)
+            runs.append(f'{name}-{i}.parquet')
+            _write_run(chunk, os.path.join(run_dir, runs[-1]))
+        index[name] = {'sha256': sha, 'run_rows': run_rows, 'runs': runs}
+        os.makedirs(run_dir, exist_ok=True)
+        with open(index_path, 'w') as f:
+            json.dump(index, f, indent=2)
+        paths += [os.path.join(run_dir, r) for r in runs]
+        if verbose:
+            print(f"  [replay] {name}: {len(runs)} sorted run(s) in {time.perf_counter() - t0:.1f}s")
+    return paths
+
+
+# ── k-way merge ──
+def merged_batches(paths, merge_rows=MERGE_ROWS, start=None):
+    """DataFrame batches of all runs in global transaction_timestamp order (column 'ts': epoch ns).
+
+    start (epoch ns) skips the row groups that end before it; rows before it can still
+    appear at the head of the first batch.
+    """
+    sources = [pq.ParquetFile(p) for p in paths]
+    readers = [s.iter_batches(batch_size=merge_rows, row_groups=_row_groups(s, start), columns=READ_COLUMNS)
+               for s in sources]
+    buffers = [None] * len(readers)
+
+    def refill(i):
+        batch = next(readers[i], None)
+        if batch is None:
+            buffers[i] = None
+            return
+        frame = batch.to_pandas()
+        buffers[i] = [frame.assign(ts=_ns(frame['transaction_timestamp'])), 0]
+
+    for i in range(len(readers)):
+        refill(i)
+    while True:
+        live = [i for i, b in enumerate(buffers) if b is not None]
+        if not live:
+            return
+        bound = min(buffers[i][0]['ts'].iat[-1] for i in live)
+        parts = []
+        for i in live:
+            frame, start = buffers[i]
+            stop = int(np.searchsorted(frame['ts'].to_numpy(), bound, side='right'))
+            parts.append(frame.iloc[start:stop])
+            if stop == len(frame):
+                refill(i)
+            else:
+                buffers[i][1] = stop
+        out = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0].reset_index(drop=True)
+        yield out.iloc[np.argsort(out['ts'].to_numpy(), kind='stable')]
+
+
+def as_events(batch):
+    """Rows of a merged batch as event dicts (timestamp as epoch ns, missing values as None)."""
+    cols = {c: batch[c].astype(object).where(batch[c].notna(), None).tolist()
+            for c in READ_COLUMNS if c != 'transaction_timestamp'}
+    cols['account_id'] = [str(a) for a in cols['account_id']]
+    cols['transaction_timestamp'] = batch['ts'].tolist()
+    return [dict(zip(cols, row)) for row in zip(*cols.values())]
+
+
+def events(data_dir=DATA_DIR, start=None, limit=None, merge_rows=MERGE_ROWS, verbose=False):
+    """All transactions from `start` on (at most `limit`) in timestamp order, unpaced."""
+    start = None if start is None else pd.Timestamp(start).value
+    n = 0
+    for batch in merged_batches(build_runs(data_dir, verbose=verbose), merge_rows, start):
+        if start is not None:
+            batch = batch[batch['ts'].to_numpy() >= start]
+        if limit is not None:
+            batch = batch.iloc[:limit - n]
+        if len(batch):
+            n += len(batch)
+            yield from as_events(batch)
+        if limit is not None and n >= limit:
+            return
+
+
+# ── Pacing ──
+def _clock(speed):
+    """fn(event ts) -> perf_counter time the event is due; speed None: due as soon as asked."""
+    origin = []
+
+    def due(ts):
+        now = time.perf_counter()
+        if not speed:
+            return now
+        if not origin:
+            origin.append((now, ts))
+        return origin[0][0] + (ts - origin[0][1]) / 1e9 / speed
+    return due
+
+
+def stream(data_dir=DATA_DIR, speed=None, start=None, limit=None, merge_rows=MERGE_ROWS):
+    """Generator of (due time, event) at `speed` x event time; a slow consumer delays the rest."""
+    due = _clock(speed)
+    for event in events(data_dir, start, limit, merge_rows):
+        t = due(event['transaction_timestamp'])
+        delay = t - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        yield t, event
+
+
+def _report(lags, wall, first_ts, last_ts, **extra):
+    lags = np.asarray(lags) * 1000
+    n = len(lags)
+    span = (last_ts - first_ts) / 1e9 if n else 0.0
+    out = {'events': n, 'wall_s': round(wall, 3), 'events_per_s': round(n / wall, 1) if wall else None,
+           'event_time_s': round(span, 1), 'achieved_speed': round(span / wall, 1) if wall else None}
+    if n:
+        out.update({'lag_p50_ms': round(float(np.percentile(lags, 50)), 3),
+                    'lag_p99_ms': round(float(np.percentile(lags, 99)), 3), 'lag_max_ms': round(float(lags.max()), 3)})
+    return {**out, **extra}
+
+
+def run(consumer, data_dir=DATA_DIR, speed=None, start=None, limit=None, merge_rows=MERGE_ROWS):
+    """Feed the stream to consumer(event) synchronously; throughput and lag stats."""
+    lags, t0, first, last = [], None, None, None
+    for due, event in stream(data_dir, speed, start, limit, merge_rows):
+        if t0 is None:
+            t0, first = due, event['transaction_timestamp']
+        consumer(event)
+        lags.append(time.perf_counter() - due)
+        last = event['transaction_timestamp']
+    return _report(lags, time.perf_counter() - t0 if lags else 0.0, first, last, mode='generator')
+
+
+# ── asyncio with backpressure ──
+async def _produce(queue, data_dir, speed, start, limit, merge_rows, stats):
+    due = _clock(speed)
+    for event in events(data_dir, start, limit, merge_rows):
+        t = due(event['transaction_timestamp'])
+        if stats['t0'] is None:
+            stats['t0'] = t
+        delay = t - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if queue.full():  # backpressure: wait for the consumer
+            t_block = time.perf_counter()
+            await queue.put((t, event))
+            stats['blocked_s'] += time.perf_counter() - t_block
+        else:
+            queue.put_nowait((t, event))
+        stats['max_depth'] = max(stats['max_depth'], queue.qsize())
+    await queue.put(None)
+
+
+async def _consume(queue, consumer, lags, stats):
+    is_async = asyncio.iscoroutinefunction(consumer)
+    while True:
+        item = await queue.get()
+        if item is None:
+            return
+        due, event = item
+        if is_async:
+            await consumer(event)
+        else:
+            consumer(event)
+        lags.append(time.perf_counter() - due)
+        if stats['first_ts'] is None:
+            stats['first_ts'] = event['transaction_timestamp']
+        stats['last_ts'] = event['transaction_timestamp']
+
+
+async def run_async(consumer, data_dir=DATA_DIR, speed=None, start=None, limit=None, queue_size=QUEUE_SIZE,
+                    merge_rows=MERGE_ROWS):
+    """Producer -> asyncio.Queue(queue_size) -> consumer(event) (plain or async function).
+
+    Lag includes the time an event waited in the queue; blocked_s is how long the producer
+    waited on a full queue.
+    """
+    queue = asyncio.Queue(maxsize=queue_size)
+    stats = {'blocked_s': 0.0, 'max_depth': 0, 't0': None, 'first_ts': None, 'last_ts': None}
+    lags = []
+    await asyncio.gather(_produce(queue, data_dir, speed, start, limit, merge_rows, stats),
+                         _consume(queue, consumer, lags, stats))
+    wall = time.perf_counter() - stats['t0'] if lags else 0.0
+    return _report(lags, wall, stats['first_ts'], stats['last_ts'], mode='asyncio',
+                   queue_size=queue_size, producer_blocked_s=round(stats['blocked_s'], 3),
+                   max_queue_depth=stats['max_depth'])
+
+
+def _speed(value):
+    return None if value == 'max' else float(value.rstrip('x'))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay the transactions in event-time order.')
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--speed', type=_speed, default=None, help='1, 100, ... x event time, or max (default)')
+    parser.add_argument('--start', default=None, help='first event time, e.g. 2025-06-01')
+    parser.add_argument('--limit', type=int, default=None, help='stop after this many events')
+    parser.add_argument('--mode', choices=['asyncio', 'generator'], default='asyncio')
+    parser.add_argument('--queue-size', type=int, default=QUEUE_SIZE, help='asyncio: queue bound (backpressure)')
+    parser.add_argument('--consumer', choices=['null', 'score'], default='null',
+                        help='score: scoring.py over <store-dir> (after incremental.py init and scoring.py fit)')
+    parser.add_argument('--store-dir', default=None, help='defaults to <data-dir>/feature_store')
+    parser.add_argument('--merge-rows', type=int, default=MERGE_ROWS)
+    args = parser.parse_args()
+    build_runs(args.data_dir)
+    consumer = lambda event: None
+    if args.consumer == 'score':
+        from feature_store import FEATURE_FILE, read_features
+        from incremental import load_state
+        from scoring import MODEL_FILE, load_model, make_scorer, score
+        store = args.store_dir or os.path.join(args.data_dir, 'feature_store')
+        scorer = make_scorer(load_state(store), read_features(os.path.join(store, FEATURE_FILE)),
+                             load_model(os.path.join(store, MODEL_FILE)))
+        consumer = lambda event: score(scorer, event)
+    if args.mode == 'asyncio':
+        result = asyncio.run(run_async(consumer, args.data_dir, args.speed, args.start, args.limit, args.queue_size,
+                                       args.merge_rows))
+    else:
+        result = run(consumer, args.data_dir, args.speed, args.start, args.limit, args.merge_rows)
+    print(json.dumps(result, indent=2))
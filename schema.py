@@ -0,0 +1,183 @@
+"""
+NFPC Phase 1 - Table Schemas
+Declared dtypes for every table, applied by the loader at read time so the full
+7.4M-row transaction table fits comfortably in memory.
+
+Column kinds:
+  key:<domain>  categorical whose dictionary is shared by every table in the domain
+                (account / customer / counterparty), i.e. integer-coded IDs
+  category      low-cardinality categorical (Y/N flags, channel, txn_type -> int8 codes)
+  string        Arrow-backed string (unique IDs such as transaction_id)
+  datetime      datetime64, unparseable values -> NaT
+  amount        float32 when every value survives the round trip at paise precision,
+                float64 otherwise (decided per frame; ingest.read_parts makes a partitioned
+                table float64 as a whole when any part is)
+  anything else is passed to astype() as-is (int8, int16, int32, float32, ...)
+"""
+import pandas as pd
+import hashlib, json
+
+AMOUNT_TOLERANCE = 0.005  # half a paisa — float32 must reproduce every amount to 2 decimals
+KEY_DOMAINS = ['account', 'customer', 'counterparty']
+YN = 'category'
+
+SCHEMAS = {
+    'customers': {
+        'customer_id': 'key:customer',
+        'date_of_birth': 'datetime',
+        'relationship_start_date': 'datetime',
+        'pan_available': YN, 'aadhaar_available': YN, 'passport_available': YN,
+        'mobile_banking_flag': YN, 'internet_banking_flag': YN, 'atm_card_flag': YN,
+        'demat_flag': YN, 'credit_card_flag': YN, 'fastag_flag': YN,
+        'customer_pin': 'int32',
+        'permanent_pin': 'int32',
+    },
+    'accounts': {
+        'account_id': 'key:account',
+        'account_status': 'string',
+        'product_code': 'int32',
+        'currency_code': 'int16',
+        'account_opening_date': 'datetime',
+        'branch_code': 'int32',
+        'branch_pin': 'float32',
+        'avg_balance': 'float64',
+        'product_family': 'string',
+        'nomination_flag': YN, 'cheque_allowed': YN, 'cheque_availed': YN,
+        'num_chequebooks': 'int16',
+        'last_mobile_update_date': 'datetime',
+        'kyc_compliant': YN,
+        'last_kyc_date': 'datetime',
+        'rural_branch': YN,
+        'monthly_avg_balance': 'float64',
+        'quarterly_avg_balance': 'float64',
+        'daily_avg_balance': 'float64',
+        'freeze_date': 'datetime',
+        'unfreeze_date': 'datetime',
+    },
+    'linkage': {
+        'customer_id': 'key:customer',
+        'account_id': 'key:account',
+    },
+    'products': {
+        'customer_id': 'key:customer',
+        'loan_sum': 'float64', 'loan_count': 'int16',
+        'cc_sum': 'float64', 'cc_count': 'int16',
+        'od_sum': 'float64', 'od_count': 'int16',
+        'ka_sum': 'float64', 'ka_count': 'int16',
+        'sa_sum': 'float64', 'sa_count': 'int16',
+    },
+    'labels': {
+        'account_id': 'key:account',
+        'is_mule': 'int8',
+        'mule_flag_date': 'datetime',
+        'alert_reason': 'string',
+        'flagged_by_branch': 'float32',
+    },
+    'test': {
+        'account_id': 'key:account',
+    },
+    'transactions': {
+        'transaction_id': 'string',
+        'account_id': 'key:account',
+        'transaction_timestamp': 'datetime',
+        'amount': 'amount',
+        'txn_type': 'category',
+        'channel': 'category',
+        'counterparty_id': 'key:counterparty',
+    },
+}
+
+
+def schema_fingerprint():
+    """Hash of the declared schemas — the ingest cache is rebuilt when it changes."""
+    payload = json.dumps({'schemas': SCHEMAS, 'amount_tolerance': AMOUNT_TOLERANCE}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def csv_dtypes(table):
+    """dtype= mapping for pd.read_csv, so strings never materialise as Python objects."""
+    out = {}
+    for col, kind in SCHEMAS.get(table, {}).items():
+        if kind.startswith('key:') or kind == 'category':
+            out[col] = 'category'
+        elif kind == 'string':
+            out[col] = pd.StringDtype('pyarrow')
+    return out
+
+
+def to_amount(s):
+    s = s.astype('float64')
+    s32 = s.astype('float32')
+    err = (s32.astype('float64') - s).abs().max()
+    if len(s) == 0 or not (err > AMOUNT_TOLERANCE):
+        return s32
+    return s
+
+
+def apply_schema(df, table):
+    """Coerce df to the declared schema of `table`. Undeclared columns are left as-is."""
+    for col, kind in SCHEMAS.get(table, {}).items():
+        if col not in df.columns:
+            continue
+        s = df[col]
+        if kind.startswith('key:') or kind == 'category':
+            if not isinstance(s.dtype, pd.CategoricalDtype):
+                s = s.astype('category')
+            if len(s.cat.categories) == 0:  # nothing to infer from: keep a string dictionary, not a null one
+                s = s.cat.set_categories(pd.Index([], dtype='str'))
+            df[col] = s
+        elif kind == 'string':
+            df[col] = s.astype(pd.StringDtype('pyarrow'))
+        elif kind == 'datetime':
+            if not pd.api.types.is_datetime64_any_dtype(s):
+                df[col] = pd.to_datetime(s, errors='coerce')
+        elif kind == 'amount':
+            df[col] = to_amount(s)
+        elif str(s.dtype) != kind:
+            df[col] = s.astype(kind)
+    return df
+
+
+def unify_keys(tables):
+    """Give every key column of a domain one shared, sorted dictionary.
+
+    With identical categories, merges on account_id/customer_id stay categorical
+    (no object fallback) and category codes are comparable across tables.
+    """
+    for domain in KEY_DOMAINS:
+        cols = [(name, col) for name, schema in SCHEMAS.items() for col, kind in schema.items()
+                if kind == f'key:{domain}' and name in tables and col in tables[name].columns]
+        if not cols:
+            continue
+        cats = set()
+        for name, col in cols:
+            cats.update(tables[name][col].cat.categories)
+        cats = pd.Index(sorted(cats))
+        for name, col in cols:
+            tables[name][col] = tables[name][col].cat.set_categories(cats)
+    return tables
+
+
+def key_codes(s):
+    """Integer codes and their labels for a key column (categorical or plain)."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s.cat.codes.to_numpy(), s.cat.categories
+    codes, uniques = pd.factorize(s, sort=True)
+    return codes, pd.Index(uniques)
+
+
+# ── Memory reporting ──
+def memory_report(tables):
+    """Deep in-memory size per table, largest first."""
+    rows = []
+    for name, df in tables.items():
+        mem = df.memory_usage(deep=True, index=False)
+        rows.append({'table': name, 'rows': len(df), 'columns': df.shape[1],
+                     'memory_mb': mem.sum() / 2**20, 'bytes_per_row': mem.sum() / max(len(df), 1)})
+    return pd.DataFrame(rows).sort_values('memory_mb', ascending=False).reset_index(drop=True)
+
+
+def column_memory(df):
+    """Deep in-memory size per column of one table, largest first."""
+    mem = df.memory_usage(deep=True, index=False) / 2**20
+    return pd.DataFrame({'dtype': df.dtypes.astype(str), 'memory_mb': mem}).sort_values('memory_mb', ascending=False)
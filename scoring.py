@@ -0,0 +1,449 @@
+"""
+NFPC Phase 1 - Real-Time Account Scoring
+Scores an account the moment one of its transactions arrives: the transaction is folded
+into that account's in-memory feature state, the account's feature vector is rebuilt
+from the state and the model returns P(mule). Nothing else is touched, so the cost per
+event does not depend on the size of the history.
+
+State: the incremental feature store's state (incremental.py) — the dense running
+counts/sums/moments, the channel and counterparty tables and the 30-day tail. An
+account's slice is copied into a small dict the first time the account is seen (or for
+all accounts up front with warm=True); every later event is O(1) pure-Python updates:
+
+  running sums      counts, volume, Welford mean/M2, max, night/weekend/round/near/
+                    structuring/salary tallies
+  windows           7d/30d deques of event times -> txn_velocity_7d/30d (max so far)
+  sets              channel counts (+ running max), counterparty directions ->
+                    unique_channels, dominant_channel_pct, unique_counterparties, in/out degree
+
+The formulas are those of incremental.state_features, so a scored account's dynamic
+features equal the batch store over the same rows. Late events (older than the
+account's last transaction) update the running sums but not the windows. Static
+profile/branch features (Category C/D) come from the feature store row of the account.
+
+Model: there is no trained Phase 2 ensemble in this repository yet, so fit_model() fits
+an L2 logistic regression (numpy Newton steps) on MODEL_FEATURES of the train accounts
+and saves it as JSON. Anything taking the feature vector can replace scorer['predict'].
+
+    python scoring.py fit   --store-dir <data>/feature_store    # after incremental.py init
+    python scoring.py serve --port 8080    # POST /score {"account_id": ..., "amount": ...}
+    python scoring.py bench --events 20000 [--http]   # replay the newest transactions
+"""
+import pandas as pd
+import numpy as np
+import argparse, asyncio, gc, json, os, threading, time
+from collections import deque
+from aggregations import NEAR_THRESHOLD
+from feature_store import FEATURE_FILE, NIGHT_HOURS, ROUND_UNIT, SALARY_DAYS, read_features, structuring_weight
+from incremental import DENSE, NS_SEC, empty_state, load_state, state_dir
+
+MODEL_FILE = 'scoring_model.json'
+DYNAMIC_FEATURES = ['txn_count', 'total_volume', 'avg_txn_amount', 'max_single_txn', 'txn_amount_std',
+                    'credit_debit_ratio', 'unique_channels', 'dominant_channel_pct', 'unique_counterparties',
+                    'reversal_rate', 'near_threshold_fraction', 'night_txn_ratio', 'weekend_txn_ratio',
+                    'txn_velocity_7d', 'txn_velocity_30d', 'velocity_ratio_7d_30d', 'in_degree', 'out_degree',
+                    'fan_in_out_ratio', 'structuring_score', 'round_amount_fraction',
+                    'salary_cycle_exploitation_score']
+STATIC_FEATURES = ['account_age_days', 'relationship_tenure_days', 'kyc_document_count', 'digital_channel_count',
+                   'balance_volatility', 'pin_mismatch', 'product_holding_diversity', 'total_liability_ratio',
+                   'branch_mule_concentration']
+MODEL_FEATURES = DYNAMIC_FEATURES + STATIC_FEATURES
+L2 = 1.0
+NEWTON_STEPS = 25
+WINDOWS = {'v7': 7 * 86400 * NS_SEC, 'v30': 30 * 86400 * NS_SEC}
+NIGHT = frozenset(NIGHT_HOURS)
+SALARY = frozenset(SALARY_DAYS)
+DEFAULT_PORT = 8080
+
+
+# ── Model ──
+def _transform(x):
+    """Signed log1p: the volume/count features are heavy-tailed."""
+    return np.sign(x) * np.log1p(np.abs(x))
+
+
+def fit_model(features, columns=MODEL_FEATURES, l2=L2, steps=NEWTON_STEPS):
+    """L2 logistic regression of is_mule on the train rows of a feature store frame."""
+    train = features[features['is_mule'].notna()]
+    x = _transform(train[columns].to_numpy(np.float64))
+    y = train['is_mule'].to_numpy(np.float64)
+    mean = np.nanmean(x, axis=0)
+    scale = np.nanstd(x, axis=0)
+    scale = np.where(scale > 0, scale, 1.0)
+    z = np.nan_to_num((x - mean) / scale)
+    z = np.c_[np.ones(len(z)), z]
+    w = np.zeros(z.shape[1])
+    penalty = np.r_[0.0, np.full(len(columns), l2)]  # intercept unpenalised
+    for _ in range(steps):
+        p = 1 / (1 + np.exp(-z @ w))
+        grad = z.T @ (p - y) + penalty * w
+        hess = (z * (p * (1 - p))[:, None]).T @ z + np.diag(penalty)
+        step = np.linalg.solve(hess, grad)
+        w -= step
+        if np.abs(step).max() < 1e-8:
+            break
+    return {'features': list(columns), 'mean': mean.tolist(), 'scale': scale.tolist(),
+            'intercept': float(w[0]), 'coef': w[1:].tolist(), 'l2': l2, 'rows': int(len(y)),
+            'mules': int(y.sum()), 'trained': time.strftime('%Y-%m-%d %H:%M:%S')}
+
+
+def save_model(model, path):
+    with open(path, 'w') as f:
+        json.dump(model, f, indent=2)
+
+
+def load_model(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def linear_predictor(model):
+    """fn(feature vector in model['features'] order) -> P(mule)."""
+    mean, scale = np.asarray(model['mean']), np.asarray(model['scale'])
+    coef, intercept = np.asarray(model['coef']), model['intercept']
+
+    def predict(x):
+        z = (_transform(x) - mean) / scale
+        z[np.isnan(z)] = 0.0
+        return float(1 / (1 + np.exp(-(intercept + z @ coef))))
+    return predict
+
+
+# ── Per-account state ──
+def _slices(frame):
+    """account_id -> (start, stop) rows of a frame sorted by account_id."""
+    ids = frame['account_id'].astype(str).to_numpy()
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]]) if len(ids) else np.zeros(0, dtype=int)
+    stops = np.r_[starts[1:], len(ids)]
+    return dict(zip(ids[starts], zip(starts.tolist(), stops.tolist())))
+
+
+def make_scorer(state, features, model, warm=False):
+    """Scorer dict over an incremental state, the feature store frame (static features) and a model."""
+    tail = state['tail'].assign(account_id=state['tail']['account_id'].astype(str))
+    tail = tail.sort_values(['account_id', 'ts'], kind='stable', ignore_index=True)
+    channels = state['channels'].sort_values(['account_id', 'channel'], ignore_index=True)
+    cps = state['counterparties'].sort_values(['account_id', 'counterparty_id'], ignore_index=True)
+    static = features.assign(account_id=features['account_id'].astype(str)).set_index('account_id')
+    dense = state['dense']
+    scorer = {
+        'accounts': {},
+        'dense': {c: dense[c].to_numpy() for c in DENSE},
+        'dense_rows': {a: i for i, a in enumerate(dense.index.astype(str))},
+        'tail': {'ts': tail['ts'].to_numpy(np.int64), 'rows': _slices(tail)},
+        'channels': {'key': channels['channel'].astype(str).to_numpy(), 'count': channels['count'].to_numpy(np.int64),
+                     'rows': _slices(channels)},
+        'counterparties': {'key': cps['counterparty_id'].astype(str).to_numpy(),
+                           'dir': cps[['credits', 'debits', 'other']].to_numpy(np.int64), 'rows': _slices(cps)},
+        'static': {c: static[c].to_numpy(np.float64) for c in STATIC_FEATURES if c in static},
+        'static_rows': {a: i for i, a in enumerate(static.index)},
+        'features': model['features'],
+        'predict': linear_predictor(model),
+    }
+    if warm:
+        for acct in scorer['dense_rows']:
+            account_state(scorer, acct)
+    return scorer
+
+
+def freeze_heap():
+    """Move everything alive into the permanent generation (serve/bench, once the scorer is built).
+
+    The scorer is long-lived: this keeps it out of the collector's full passes (100ms+ pauses otherwise).
+    Process-wide, so it is left to the entry points rather than done by make_scorer().
+    """
+    gc.collect()
+    gc.freeze()
+
+
+def account_state(scorer, acct):
+    """The account's scoring state, copied out of the incremental state on first use."""
+    st = scorer['accounts'].get(acct)
+    if st is not None:
+        return st
+    pos = scorer['dense_rows'].get(acct, -1)
+    st = {c: (scorer['dense'][c][pos].item() if pos >= 0 else default) for c, default in DENSE.items()}
+    lo, hi = scorer['tail']['rows'].get(acct, (0, 0))
+    times = scorer['tail']['ts'][lo:hi].tolist()
+    for name, width in WINDOWS.items():
+        st[f'{name}_times'] = deque(t for t in times if times and t > times[-1] - width)
+    lo, hi = scorer['channels']['rows'].get(acct, (0, 0))
+    st['channels'] = dict(zip(scorer['channels']['key'][lo:hi].tolist(), scorer['channels']['count'][lo:hi].tolist()))
+    st['top_channel'] = max(st['channels'].values(), default=0)
+    lo, hi = scorer['counterparties']['rows'].get(acct, (0, 0))
+    dirs = scorer['counterparties']['dir'][lo:hi]
+    st['counterparties'] = dict(zip(scorer['counterparties']['key'][lo:hi].tolist(), dirs.tolist()))
+    st['in_degree'] = int((dirs[:, 0] > 0).sum())
+    st['out_degree'] = int((dirs[:, 1] > 0).sum())
+    spos = scorer['static_rows'].get(acct, -1)
+    st['static'] = {c: (v[spos] if spos >= 0 else np.nan) for c, v in scorer['static'].items()}
+    scorer['accounts'][acct] = st
+    return st
+
+
+def _ns(value):
+    if isinstance(value, (int, np.integer)):
+        if not pd.Timestamp.min.value <= value <= pd.Timestamp.max.value:
+            raise ValueError(f'transaction_timestamp {value} ns is out of range')
+        return int(value)
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    ts = pd.Timestamp(value)
+    return None if ts is pd.NaT else ts.value
+
+
+def _key(txn, col):
+    """A channel/counterparty ID as the state's string key (None when missing)."""
+    value = txn.get(col)
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    if isinstance(value, bool) or not isinstance(value, (str, int, np.integer)):
+        raise TypeError(f'{col} must be a string, not {type(value).__name__}')
+    return str(value)
+
+
+def parse_txn(txn):
+    """(amount, txn_type, epoch ns, channel, counterparty) of a transaction dict.
+
+    Raises ValueError/TypeError on a malformed field, so update() never folds half an event in.
+    """
+    amount = txn.get('amount')
+    amount = np.nan if amount is None else float(amount)
+    if abs(amount) == np.inf:
+        raise ValueError(f'amount must be finite, not {amount}')
+    txn_type = txn.get('txn_type')
+    if txn_type is not None and not isinstance(txn_type, str):
+        raise TypeError(f'txn_type must be a string, not {type(txn_type).__name__}')
+    t = _ns(txn.get('transaction_timestamp'))
+    return amount, txn_type, t, _key(txn, 'channel'), _key(txn, 'counterparty_id')
+
+
+def update(st, txn):
+    """Fold one transaction (dict with the transaction columns) into an account state."""
+    amount, txn_type, t, channel, cp = parse_txn(txn)
+    abs_amount = abs(amount)
+    valid = amount == amount
+    st['rows'] += 1
+    if txn.get('transaction_id') is not None:
+        st['txn_count'] += 1
+    st['credit_count'] += txn_type == 'C'
+    st['debit_count'] += txn_type == 'D'
+    if valid:
+        st['n_valid'] += 1
+        st['total_volume'] += abs_amount
+        mean = st['mean'] if st['n_valid'] > 1 else 0.0
+        delta = amount - mean
+        st['mean'] = mean + delta / st['n_valid']
+        st['m2'] += delta * (amount - st['mean'])
+        st['max_abs'] = max(st['max_abs'], abs_amount)
+        st['reversal_count'] += amount < 0
+        st['near_count'] += NEAR_THRESHOLD[0] <= abs_amount < NEAR_THRESHOLD[1]
+        st['round_count'] += abs_amount > 0 and abs_amount % ROUND_UNIT == 0
+        st['structuring'] += float(structuring_weight(np.array([abs_amount]))[0])
+    if t is not None:
+        tm = time.gmtime(t // NS_SEC)
+        st['night_count'] += tm.tm_hour in NIGHT
+        st['weekend_count'] += tm.tm_wday >= 5
+        if valid and tm.tm_mday in SALARY:
+            st['salary_volume'] += abs_amount
+        if t >= st['last_ts']:
+            st['last_ts'] = t
+            for name, width in WINDOWS.items():
+                times = st[f'{name}_times']
+                while times and times[0] <= t - width:
+                    times.popleft()
+                times.append(t)
+                st[name] = max(st[name], len(times))
+    if channel is not None:
+        n = st['channels'].get(channel, 0) + 1
+        st['channels'][channel] = n
+        st['top_channel'] = max(st['top_channel'], n)
+    if cp is not None:
+        d = st['counterparties'].setdefault(cp, [0, 0, 0])
+        col = 0 if txn_type == 'C' else 1 if txn_type == 'D' else 2
+        st['in_degree'] += col == 0 and d[0] == 0
+        st['out_degree'] += col == 1 and d[1] == 0
+        d[col] += 1
+
+
+def _div(num, den):
+    return num / den if den > 0 else np.nan
+
+
+def account_features(st):
+    """MODEL_FEATURES of one account state (incremental.state_features formulas)."""
+    n_valid, txn_count, rows = st['n_valid'], st['txn_count'], st['rows']
+    f = {
+        'txn_count': txn_count, 'total_volume': st['total_volume'],
+        'avg_txn_amount': _div(st['total_volume'], n_valid),
+        'max_single_txn': st['max_abs'] if n_valid > 0 else np.nan,
+        'txn_amount_std': _div(st['m2'], n_valid - 1) ** 0.5,
+        'credit_debit_ratio': st['credit_count'] / (st['debit_count'] + 1),
+        'unique_channels': len(st['channels']), 'dominant_channel_pct': _div(st['top_channel'], txn_count),
+        'unique_counterparties': len(st['counterparties']),
+        'reversal_rate': _div(st['reversal_count'], txn_count),
+        'near_threshold_fraction': _div(st['near_count'], txn_count),
+        'night_txn_ratio': _div(st['night_count'], rows), 'weekend_txn_ratio': _div(st['weekend_count'], rows),
+        'txn_velocity_7d': st['v7'], 'txn_velocity_30d': st['v30'], 'velocity_ratio_7d_30d': _div(st['v7'], st['v30']),
+        'in_degree': st['in_degree'], 'out_degree': st['out_degree'],
+        'fan_in_out_ratio': st['in_degree'] / (st['out_degree'] + 1),
+        'structuring_score': st['structuring'], 'round_amount_fraction': _div(st['round_count'], rows),
+        'salary_cycle_exploitation_score': _div(st['salary_volume'], st['total_volume']),
+    }
+    f.update(st['static'])
+    return f
+
+
+def score(scorer, txn):
+    """Fold `txn` into its account's state and return that account's P(mule)."""
+    if not isinstance(txn, dict):
+        raise TypeError(f'a transaction is a JSON object, not {type(txn).__name__}')
+    st = account_state(scorer, str(txn['account_id']))
+    update(st, txn)
+    f = account_features(st)
+    return scorer['predict'](np.array([f.get(c, np.nan) for c in scorer['features']], dtype=np.float64))
+
+
+# ── HTTP wrapper ──
+async def _handle(scorer, reader, writer):
+    """Minimal HTTP/1.1 with keep-alive: POST /score (JSON transaction), GET /health."""
+    try:
+        while True:
+            head = await reader.readuntil(b'\r\n\r\n')
+            lines = head.decode('latin-1').split('\r\n')
+            method, path = lines[0].split(' ')[:2]
+            headers = dict(l.split(': ', 1) for l in lines[1:] if ': ' in l)
+            length = int(headers.get('Content-Length', headers.get('content-length', 0)))
+            body = await reader.readexactly(length) if length else b''
+            if method == 'POST' and path == '/score':
+                # A malformed request gets a 400; the connection and the server stay up
+                try:
+                    txn = json.loads(body)
+                    t0 = time.perf_counter()
+                    p = score(scorer, txn)
+                    status, out = '200 OK', {'account_id': str(txn['account_id']), 'p_mule': p,
+                                             'latency_ms': (time.perf_counter() - t0) * 1000}
+                except (ValueError, KeyError, TypeError) as e:
+                    status, out = '400 Bad Request', {'error': f'{type(e).__name__}: {e}'}
+            elif method == 'GET' and path == '/health':
+                status, out = '200 OK', {'status': 'ok', 'accounts_in_memory': len(scorer['accounts'])}
+            else:
+                status, out = '404 Not Found', {'error': f'{method} {path}'}
+            payload = json.dumps(out).encode()
+            writer.write(f'HTTP/1.1 {status}\r\nContent-Type: application/json\r\n'
+                         f'Content-Length: {len(payload)}\r\n\r\n'.encode() + payload)
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionResetError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(scorer, host='127.0.0.1', port=DEFAULT_PORT, ready=None):
+    server = await asyncio.start_server(lambda r, w: _handle(scorer, r, w), host, port)
+    if ready is not None:
+        ready.set()
+    async with server:
+        await server.serve_forever()
+
+
+def serve_in_thread(scorer, host='127.0.0.1', port=DEFAULT_PORT):
+    """Run the HTTP wrapper on a daemon thread (for the replay benchmark)."""
+    ready = threading.Event()
+    threading.Thread(target=lambda: asyncio.run(serve(scorer, host, port, ready)), daemon=True).start()
+    ready.wait()
+
+
+async def _post_all(host, port, events):
+    reader, writer = await asyncio.open_connection(host, port)
+    latencies = []
+    for txn in events:
+        body = json.dumps(txn).encode()
+        t0 = time.perf_counter()
+        writer.write(f'POST /score HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n'
+                     f'Content-Length: {len(body)}\r\n\r\n'.encode() + body)
+        head = await reader.readuntil(b'\r\n\r\n')
+        length = int(head.split(b'Content-Length: ')[1].split(b'\r\n')[0])
+        await reader.readexactly(length)
+        latencies.append(time.perf_counter() - t0)
+    writer.close()
+    return latencies
+
+
+# ── Replay benchmark ──
+def _events(frame):
+    """Transaction rows as dicts (timestamps as epoch ns, missing values as None)."""
+    cols = {c: frame[c].astype(object).where(frame[c].notna(), None).tolist()
+            for c in ['transaction_id', 'account_id', 'amount', 'txn_type', 'channel', 'counterparty_id']}
+    cols['account_id'] = [str(a) for a in cols['account_id']]
+    ts = frame['transaction_timestamp']
+    t = ts.to_numpy().astype('M8[ns]').view(np.int64)
+    cols['transaction_timestamp'] = [None if missing else v for v, missing in zip(t.tolist(), ts.isna().tolist())]
+    return [dict(zip(cols, row)) for row in zip(*cols.values())]
+
+
+def replay_benchmark(data_dir, events=20_000, history_share=0.9, http=False, port=DEFAULT_PORT, warm=False):
+    """Build the state from the oldest history_share of transactions, fit the model on it,
+    then score the next `events` transactions one by one. Returns latency/throughput stats."""
+    from ingest import load_tables
+    from incremental import apply_transactions, mobile_dates, state_features
+    tables = load_tables(data_dir, verbose=False)
+    tx = tables['transactions'].sort_values('transaction_timestamp', kind='stable', ignore_index=True)
+    cut = int(len(tx) * history_share)
+    t0 = time.perf_counter()
+    state, _ = apply_transactions(empty_state(), tx.iloc[:cut], mobile_dates(tables['accounts']))
+    features = state_features(state, tables)
+    model = fit_model(features)
+    scorer = make_scorer(state, features, model, warm)
+    freeze_heap()
+    setup_s = time.perf_counter() - t0
+    live = _events(tx.iloc[cut:cut + events])
+    t0 = time.perf_counter()
+    if http:
+        serve_in_thread(scorer, port=port)
+        latencies = asyncio.run(_post_all('127.0.0.1', port, live))
+    else:
+        latencies = []
+        for txn in live:
+            s = time.perf_counter()
+            score(scorer, txn)
+            latencies.append(time.perf_counter() - s)
+    wall = time.perf_counter() - t0
+    ms = np.asarray(latencies) * 1000
+    return {'events': len(live), 'history_rows': cut, 'setup_s': round(setup_s, 2), 'wall_s': round(wall, 3),
+            'events_per_s': round(len(live) / wall, 1), 'p50_ms': round(float(np.percentile(ms, 50)), 3),
+            'p99_ms': round(float(np.percentile(ms, 99)), 3), 'max_ms': round(float(ms.max()), 3),
+            'accounts_touched': len(scorer['accounts']), 'mode': 'http' if http else 'in-process'}
+
+
+if __name__ == '__main__':
+    from ingest import DATA_DIR
+    parser = argparse.ArgumentParser(description='Real-time P(mule) scoring over the incremental feature state.')
+    parser.add_argument('command', choices=['fit', 'serve', 'bench'])
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--store-dir', default=None, help='defaults to <data-dir>/feature_store')
+    parser.add_argument('--model', default=None, help=f'defaults to <store-dir>/{MODEL_FILE}')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--warm', action='store_true', help='load every account state at start-up')
+    parser.add_argument('--events', type=int, default=20_000, help='bench: transactions to replay')
+    parser.add_argument('--history-share', type=float, default=0.9, help='bench: oldest share used as history')
+    parser.add_argument('--http', action='store_true', help='bench: go through the HTTP wrapper')
+    args = parser.parse_args()
+    store = args.store_dir or os.path.join(args.data_dir, 'feature_store')
+    model_path = args.model or os.path.join(store, MODEL_FILE)
+    if args.command == 'bench':
+        print(json.dumps(replay_benchmark(args.data_dir, args.events, args.history_share, args.http, args.port,
+                                          args.warm), indent=2))
+    elif args.command == 'fit':
+        model = fit_model(read_features(os.path.join(store, FEATURE_FILE)))
+        save_model(model, model_path)
+        print(f"Fitted on {model['rows']:,} train accounts ({model['mules']:,} mules) -> {model_path}")
+    else:
+        if not os.path.isdir(state_dir(store)):
+            parser.error(f'no incremental state in {store} — run `incremental.py init` first')
+        scorer = make_scorer(load_state(store), read_features(os.path.join(store, FEATURE_FILE)),
+                             load_model(model_path), args.warm)
+        freeze_heap()
+        print(f"Scoring on http://{args.host}:{args.port}/score ({len(scorer['dense_rows']):,} accounts in state)")
+        asyncio.run(serve(scorer, args.host, args.port))
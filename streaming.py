@@ -0,0 +1,380 @@
+"""
+NFPC Phase 1 - Out-of-Core Per-Account Aggregates
+Streams the transactions in bounded record batches and keeps mergeable per-account
+partial aggregates, so peak memory depends on the number of accounts and the batch size
+rather than on the number of transactions or the length of the history.
+
+A partial is a plain dict built from one batch (batch_partial) and combined with any
+other partial (merge_partials) — the merge is associative, so parts, batches or shards
+can be reduced in any grouping. Every field is also order-free except the active-day
+summary behind max_gap_days: per account only the first and last active day and the
+largest step between active days are kept, which merges exactly only when one partial's
+days all come before the other's. iter_batches() therefore yields the timestamped rows
+in time order (replay.py's sorted runs and k-way merge: at most runs x batch_rows rows
+in memory), then the rows without a timestamp. merge_partials() raises ValueError when
+two partials overlap in time for some account. finalize() turns the merged state into
+the same columns as aggregations.account_aggregates:
+
+  exact     txn_count, total_volume, avg_amount, max_amount, std_amount, amount_skewness,
+            credit/debit counts and ratio, unique_channels, dominant_channel_pct,
+            reversal_count/rate, near_threshold_fraction, first_txn, last_txn
+  sketched  median_amount          log-binned |amount| histogram (HIST_BINS_PER_DECADE)
+            unique_counterparties  HyperLogLog registers (HLL_PRECISION)
+            max_gap_days           largest calendar-day step (within a day of exact)
+  omitted   counterparty_entropy   needs the full per-account counterparty counts
+"""
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyarrow.compute as pc
+import argparse, glob, os, time
+from aggregations import NEAR_THRESHOLD, STAT_COLUMNS, _safe_div
+from ingest import DATA_DIR, build_cache, default_cache_dir
+
+BATCH_ROWS = 1_000_000
+HIST_BINS_PER_DECADE = 32  # median within ~3.7% relative error
+HLL_PRECISION = 10         # up to 1024 registers per account (sparse), ~3.3% standard error
+STREAM_COLUMNS = [c for c in STAT_COLUMNS if c != 'counterparty_entropy']
+READ_COLUMNS = ['transaction_id', 'account_id', 'transaction_timestamp', 'amount',
+                'txn_type', 'channel', 'counterparty_id']
+
+# Dense per-account fields and how two partials combine them
+SUM_FIELDS = ['txn_count', 'n_valid', 'total_volume', 'credit_count', 'debit_count',
+              'reversal_count', 'near_count', 'n_timed']
+_NAT = np.iinfo(np.int64).min
+NS_DAY = 86_400 * 10 ** 9
+
+
+# ── Sparse (account, slot) -> value tables ──
+def _reduce_pairs(acct, slot, value, how):
+    """Collapse duplicate (acct, slot) pairs with 'sum' or 'max'; returns sorted arrays."""
+    if len(acct) == 0:
+        return acct, slot, value
+    order = np.lexsort((slot, acct))
+    acct, slot, value = acct[order], slot[order], value[order]
+    starts = np.flatnonzero(np.r_[True, (acct[1:] != acct[:-1]) | (slot[1:] != slot[:-1])])
+    ufunc = np.add if how == 'sum' else np.maximum
+    return acct[starts], slot[starts], ufunc.reduceat(value, starts)
+
+
+def _hash_labels(values):
+    """Stable 64-bit hash per label (same label -> same hash in every batch and process)."""
+    return pd.util.hash_array(np.asarray(values, dtype=object))
+
+
+def _clz64(w):
+    """Leading zero count of uint64 values (64 for zero)."""
+    n = np.zeros(len(w), dtype=np.int64)
+    w = w.copy()
+    for s in (32, 16, 8, 4, 2, 1):
+        top = (w >> np.uint64(64 - s)) == 0
+        n += np.where(top, s, 0)
+        w = np.where(top, w << np.uint64(s), w)
+    return n + (w == 0)
+
+
+def _hll_update(codes, hashes, p=HLL_PRECISION):
+    """(register index, rank) of each hash: top p bits pick the register."""
+    reg = (hashes >> np.uint64(64 - p)).astype(np.int64)
+    rest = hashes << np.uint64(p)
+    rank = np.minimum(_clz64(rest), 64 - p) + 1
+    return codes, reg, rank.astype(np.int8)
+
+
+def _hll_estimate(owner, rank, n, p=HLL_PRECISION):
+    """Cardinality per owner from its non-empty registers (linear counting when small)."""
+    m = 1 << p
+    alpha = 0.7213 / (1 + 1.079 / m)
+    touched = np.bincount(owner, minlength=n)
+    inv = np.bincount(owner, weights=2.0 ** -rank.astype(np.float64), minlength=n) + (m - touched)
+    raw = alpha * m * m / inv
+    zeros = m - touched
+    with np.errstate(divide='ignore'):
+        linear = m * np.log(m / np.maximum(zeros, 1))
+    est = np.where((raw <= 2.5 * m) & (zeros > 0), linear, raw)
+    return np.where(touched > 0, np.round(est), 0).astype(np.int64)
+
+
+def _amount_bin(abs_amount):
+    """Log-spaced |amount| bin; 0 for zero amounts."""
+    with np.errstate(divide='ignore'):
+        b = np.floor(np.log10(np.maximum(abs_amount, 1e-2)) * HIST_BINS_PER_DECADE).astype(np.int64)
+    return np.where(abs_amount > 0, b + 2 * HIST_BINS_PER_DECADE + 1, 0)
+
+
+def _bin_value(b):
+    """Geometric centre of a histogram bin."""
+    lo = (b - 2 * HIST_BINS_PER_DECADE - 1) / HIST_BINS_PER_DECADE
+    return np.where(b > 0, 10.0 ** (lo + 0.5 / HIST_BINS_PER_DECADE), 0.0)
+
+
+# ── Partials ──
+def batch_partial(batch, near_threshold=NEAR_THRESHOLD):
+    """Partial aggregates of one DataFrame batch of transactions (READ_COLUMNS)."""
+    acct_cat = pd.Categorical(batch['account_id']).remove_unused_categories()
+    acct = acct_cat.codes.astype(np.int64)
+    accounts = pd.Index(acct_cat.categories)
+    n = len(accounts)
+    amount = batch['amount'].to_numpy(dtype=np.float64)
+    abs_amount = np.abs(amount)
+    valid = ~np.isnan(amount)
+    is_credit = (batch['txn_type'] == 'C').to_numpy()
+    is_debit = (batch['txn_type'] == 'D').to_numpy()
+    near = (abs_amount >= near_threshold[0]) & (abs_amount < near_threshold[1])
+
+    a_v, x = acct[valid], amount[valid]
+    n_valid = np.bincount(a_v, minlength=n)
+    mean = _safe_div(np.bincount(a_v, weights=x, minlength=n), n_valid)
+    dev = x - mean[a_v]
+    max_abs = np.full(n, -np.inf)
+    np.maximum.at(max_abs, a_v, abs_amount[valid])
+
+    ts = batch['transaction_timestamp'].to_numpy().astype('M8[ns]')
+    t_ok = ~np.isnat(ts)
+    t = ts.view(np.int64)
+    first = np.full(n, np.iinfo(np.int64).max)
+    last = np.full(n, _NAT)
+    np.minimum.at(first, acct[t_ok], t[t_ok])
+    np.maximum.at(last, acct[t_ok], t[t_ok])
+    # Largest step between an account's active days within the batch
+    d_acct, day = _reduce_pairs(acct[t_ok], t[t_ok] // NS_DAY, np.zeros(int(t_ok.sum()), dtype=np.int64), 'sum')[:2]
+    max_gap = np.full(n, -1, dtype=np.int64)
+    max_gap[d_acct] = 0
+    same = d_acct[1:] == d_acct[:-1]
+    np.maximum.at(max_gap, d_acct[1:][same], (day[1:] - day[:-1])[same])
+
+    ch_cat = pd.Categorical(batch['channel']).remove_unused_categories()
+    ch_ok = ch_cat.codes >= 0
+    ch_hash = _hash_labels(ch_cat.categories)[ch_cat.codes[ch_ok]].view(np.int64)
+    cp_cat = pd.Categorical(batch['counterparty_id']).remove_unused_categories()
+    cp_ok = cp_cat.codes >= 0
+    cp_hash = _hash_labels(cp_cat.categories)[cp_cat.codes[cp_ok]]
+    bins = _amount_bin(abs_amount[valid])
+
+    ones = lambda k: np.ones(k, dtype=np.int64)
+    return {
+        'accounts': accounts,
+        'txn_count': np.bincount(acct[batch['transaction_id'].notna().to_numpy()], minlength=n),
+        'n_valid': n_valid,
+        'total_volume': np.bincount(a_v, weights=abs_amount[valid], minlength=n),
+        'mean': mean,
+        'm2': np.bincount(a_v, weights=dev ** 2, minlength=n),
+        'm3': np.bincount(a_v, weights=dev ** 3, minlength=n),
+        'max_abs': max_abs,
+        'credit_count': np.bincount(acct[is_credit], minlength=n),
+        'debit_count': np.bincount(acct[is_debit], minlength=n),
+        'reversal_count': np.bincount(acct[amount < 0], minlength=n),
+        'near_count': np.bincount(acct[near], minlength=n),
+        'n_timed': np.bincount(acct[t_ok], minlength=n),
+        'first': first,
+        'last': last,
+        'max_gap': max_gap,
+        'channels': _reduce_pairs(acct[ch_ok], ch_hash, ones(int(ch_ok.sum())), 'sum'),
+        'hll': _reduce_pairs(*_hll_update(acct[cp_ok], cp_hash), 'max'),
+        'hist': _reduce_pairs(a_v, bins, ones(len(bins)), 'sum'),
+    }
+
+
+def _merge_moments(na, ma, m2a, m3a, nb, mb, m2b, m3b):
+    """Pairwise combination of (count, mean, M2, M3) — Chan et al. / Pébay."""
+    n = na + nb
+    safe = np.where(n > 0, n, 1).astype(np.float64)
+    ma, mb = np.nan_to_num(ma), np.nan_to_num(mb)
+    delta = mb - ma
+    mean = ma + delta * nb / safe
+    m2 = m2a + m2b + delta ** 2 * na * nb / safe
+    m3 = (m3a + m3b + delta ** 3 * na * nb * (na - nb) / safe ** 2
+          + 3 * delta * (na * m2b - nb * m2a) / safe)
+    return np.where(n > 0, mean, np.nan), m2, m3
+
+
+def _merge_gaps(first_a, last_a, gap_a, first_b, last_b, gap_b):
+    """Largest active-day step of two day ranges; ValueError unless one range ends before the other starts."""
+    has_a, has_b = gap_a >= 0, gap_b >= 0
+    fa, la, fb, lb = first_a // NS_DAY, last_a // NS_DAY, first_b // NS_DAY, last_b // NS_DAY
+    a_first = la <= fb
+    b_first = lb <= fa
+    both = has_a & has_b
+    if (both & ~a_first & ~b_first).any():
+        raise ValueError(f"{int((both & ~a_first & ~b_first).sum()):,} account(s) have overlapping active days in "
+                         f"the two partials; merge batches in time order (iter_batches)")
+    step = np.where(a_first, fb - la, fa - lb)
+    return np.where(both, np.maximum(np.maximum(gap_a, gap_b), step), np.maximum(gap_a, gap_b))
+
+
+def merge_partials(a, b):
+    """Combine two partials (accounts may differ); neither input is modified."""
+    if a is None:
+        return b
+    accounts = a['accounts'].append(b['accounts'][~b['accounts'].isin(a['accounts'])])
+    n = len(accounts)
+    ib = accounts.get_indexer(b['accounts'])
+
+    def widen(p, field, fill, idx=None):
+        out = np.full(n, fill, dtype=p[field].dtype)
+        out[np.arange(len(p['accounts'])) if idx is None else idx] = p[field]
+        return out
+
+    out = {'accounts': accounts}
+    for f in SUM_FIELDS + ['m2', 'm3']:
+        out[f] = widen(a, f, 0) + widen(b, f, 0, ib)
+    out['mean'], out['m2'], out['m3'] = _merge_moments(
+        widen(a, 'n_valid', 0), widen(a, 'mean', np.nan), widen(a, 'm2', 0), widen(a, 'm3', 0),
+        widen(b, 'n_valid', 0, ib), widen(b, 'mean', np.nan, ib), widen(b, 'm2', 0, ib), widen(b, 'm3', 0, ib))
+    out['max_abs'] = np.maximum(widen(a, 'max_abs', -np.inf), widen(b, 'max_abs', -np.inf, ib))
+    first_a, first_b = widen(a, 'first', np.iinfo(np.int64).max), widen(b, 'first', np.iinfo(np.int64).max, ib)
+    last_a, last_b = widen(a, 'last', _NAT), widen(b, 'last', _NAT, ib)
+    out['max_gap'] = _merge_gaps(first_a, last_a, widen(a, 'max_gap', -1), first_b, last_b, widen(b, 'max_gap', -1, ib))
+    out['first'] = np.minimum(first_a, first_b)
+    out['last'] = np.maximum(last_a, last_b)
+    for f, how in [('channels', 'sum'), ('hll', 'max'), ('hist', 'sum')]:
+        (aa, sa, va), (ab, sb, vb) = a[f], b[f]
+        out[f] = _reduce_pairs(np.concatenate([aa, ib[ab]]), np.concatenate([sa, sb]),
+                               np.concatenate([va, vb]), how)
+    return out
+
+
+def _group_median(owner, slot, count, total, n):
+    """Median per owner from (owner, bin, count) histograms sorted by owner then bin.
+
+    Like an exact median, the lower and upper middle ranks are averaged for even counts.
+    """
+    out = np.full(n, np.nan)
+    if len(owner) == 0:
+        return out
+    cum = np.cumsum(count)
+    starts = np.flatnonzero(np.r_[True, owner[1:] != owner[:-1]])
+    acct = owner[starts]
+    base = np.r_[0, cum[starts[1:] - 1]]
+    k = total[acct]
+    mid = np.zeros(len(acct))
+    for rank in ((k - 1) // 2, k // 2):
+        mid += _bin_value(slot[np.searchsorted(cum, base + rank, side='right')])
+    out[acct] = mid / 2
+    return out
+
+
+def finalize(state):
+    """Per-account stats (STREAM_COLUMNS) from a merged partial."""
+    accounts = state['accounts']
+    n = len(accounts)
+    out = {f: state[f] for f in ['txn_count', 'total_volume', 'credit_count', 'debit_count', 'reversal_count']}
+    n_valid = state['n_valid']
+    out['avg_amount'] = _safe_div(state['total_volume'], n_valid)
+    out['median_amount'] = _group_median(*state['hist'], n_valid, n)
+    out['max_amount'] = np.where(n_valid > 0, state['max_abs'], np.nan)
+    m2, m3 = state['m2'], state['m3']
+    out['std_amount'] = np.sqrt(_safe_div(m2, n_valid - 1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        g = np.sqrt(n_valid * (n_valid - 1.0)) / (n_valid - 2.0) * (m3 / n_valid) / (m2 / n_valid) ** 1.5
+    out['amount_skewness'] = np.where(n_valid < 3, np.nan, np.where(m2 > 1e-12 * n_valid * state['mean'] ** 2, g, 0.0))
+    out['credit_debit_ratio'] = state['credit_count'] / (state['debit_count'] + 1)
+    out['reversal_rate'] = _safe_div(state['reversal_count'], state['txn_count'])
+    out['near_threshold_fraction'] = _safe_div(state['near_count'], state['txn_count'])
+
+    owner, _, cnt = state['channels']
+    out['unique_channels'] = np.bincount(owner, minlength=n)
+    dominant = np.zeros(n, dtype=np.int64)
+    np.maximum.at(dominant, owner, cnt)
+    out['dominant_channel_pct'] = _safe_div(dominant, state['txn_count'])
+    owner, _, rank = state['hll']
+    out['unique_counterparties'] = _hll_estimate(owner, rank, n)
+
+    has = state['last'] != _NAT
+    out['first_txn'] = np.where(has, state['first'], _NAT).view('M8[ns]')
+    out['last_txn'] = state['last'].view('M8[ns]')
+    # largest calendar-day step between active days; the elapsed gap is within a day of it
+    out['max_gap_days'] = np.where(state['n_timed'] >= 2, state['max_gap'], np.nan)
+    result = pd.DataFrame({'account_id': accounts})
+    for col in STREAM_COLUMNS:
+        result[col] = out[col]
+    return result.sort_values('account_id').reset_index(drop=True)
+
+
+# ── Streaming driver ──
+def _frame(rb):
+    """A record batch as a DataFrame; the Arrow string transaction IDs are only needed as a null mask."""
+    txn_ok = pc.is_valid(rb.column('transaction_id')).to_numpy(zero_copy_only=False)
+    df = rb.drop_columns(['transaction_id']).to_pandas()
+    df['transaction_id'] = np.where(txn_ok, 1.0, np.nan)
+    return df
+
+
+def iter_batches(data_dir=DATA_DIR, cache_dir=None, batch_rows=BATCH_ROWS):
+    """Yield DataFrame batches of transactions: the timestamped ones in time order, then those without.
+
+    The Parquet cache and replay.py's sorted runs are built first, one part (and one run)
+    at a time; the merge then holds batch_rows rows per run.
+    """
+    from replay import build_runs, merged_batches  # replay imports READ_COLUMNS from here
+    cache_dir = cache_dir or default_cache_dir(data_dir)
+    build_cache(data_dir, cache_dir, verbose=False)
+    for frame in merged_batches(build_runs(data_dir, cache_dir, verbose=False), batch_rows):
+        yield _frame(pa.RecordBatch.from_pandas(frame[READ_COLUMNS], preserve_index=False))
+    for path in sorted(glob.glob(os.path.join(cache_dir, 'transactions', 'part-*.parquet'))):
+        pf = pq.ParquetFile(path)
+        for rb in pf.iter_batches(batch_size=batch_rows, columns=READ_COLUMNS):
+            rb = rb.filter(pc.is_null(rb.column('transaction_timestamp')))
+            if rb.num_rows:
+                yield _frame(rb)
+
+
+def stream_aggregates(data_dir=DATA_DIR, cache_dir=None, batch_rows=BATCH_ROWS, verbose=True):
+    """Per-account stats for every account in the transaction parts, in bounded memory."""
+    state, rows = None, 0
+    t0 = time.perf_counter()
+    for batch in iter_batches(data_dir, cache_dir, batch_rows):
+        state = merge_partials(state, batch_partial(batch))
+        rows += len(batch)
+        if verbose:
+            print(f"  [stream] {rows:,} transactions, {len(state['accounts']):,} accounts "
+                  f"({time.perf_counter() - t0:.1f}s)")
+    if state is None:
+        return pd.DataFrame(columns=['account_id'] + STREAM_COLUMNS)
+    return finalize(state)
+
+
+def compare(streamed, exact):
+    """Largest deviation of each streamed column from account_aggregates output."""
+    m = exact.assign(account_id=exact['account_id'].astype(str)).merge(
+        streamed.assign(account_id=streamed['account_id'].astype(str)), on='account_id', suffixes=('', '_s'))
+    rows = []
+    for col in STREAM_COLUMNS:
+        a, b = m[col].to_numpy(), m[f'{col}_s'].to_numpy()
+        if np.issubdtype(a.dtype, np.datetime64):
+            a, b = a.astype('M8[ns]').view(np.int64), b.astype('M8[ns]').view(np.int64)
+        a, b = a.astype(np.float64), b.astype(np.float64)
+        both = ~np.isnan(a) & ~np.isnan(b)
+        rel = np.abs(a[both] - b[both]) / np.maximum(np.abs(a[both]), 1e-9)
+        rows.append({'column': col, 'max_abs_err': np.abs(a[both] - b[both]).max() if both.any() else 0.0,
+                     'max_rel_err': rel.max() if both.any() else 0.0,
+                     'nan_mismatch': int((np.isnan(a) != np.isnan(b)).sum())})
+    return pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Out-of-core per-account transaction aggregates.')
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--cache-dir', default=None, help='defaults to <data-dir>/parquet_cache')
+    parser.add_argument('--batch-rows', type=int, default=BATCH_ROWS)
+    parser.add_argument('--out', default='account_stats_stream.parquet')
+    parser.add_argument('--compare', action='store_true',
+                        help='also load everything in memory and report the deviation from the exact kernel')
+    parser.add_argument('--trace-memory', action='store_true', help='report peak traced allocation (slower)')
+    args = parser.parse_args()
+    if args.trace_memory:
+        import tracemalloc
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    stats = stream_aggregates(args.data_dir, args.cache_dir, args.batch_rows)
+    print(f"Aggregated {len(stats):,} accounts in {time.perf_counter() - t0:.1f}s")
+    if args.trace_memory:
+        print(f"Peak traced memory: {tracemalloc.get_traced_memory()[1] / 2**20:,.1f} MB")
+        tracemalloc.stop()
+    stats.to_parquet(args.out, index=False)
+    if args.compare:
+        from ingest import load_tables
+        from aggregations import account_aggregates
+        exact = account_aggregates(load_tables(args.data_dir, args.cache_dir, verbose=False)['transactions'])
+        print(compare(stats, exact).to_string(index=False))
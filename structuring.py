@@ -0,0 +1,197 @@
+"""
+NFPC Phase 1 - Structuring Detector
+Repeated just-below-threshold transactions per account within a sliding window of N
+days, for several reporting thresholds at once: the ₹50K band of Section 6.2
+(NEAR_THRESHOLD) and the ₹10L cash transaction report level. Section 6.2 only gives
+the overall near-threshold rate per class. structuring_score (#43, feature_store) is
+an unwindowed, weighted count of such amounts. This module adds how many of them (and
+how much) an account packed into N days.
+
+A transaction is near a threshold when lo <= |amount| < hi. At a near transaction on
+day d, its account's window holds every near transaction of the same band on days
+d-N+1..d up to and including this one. Days are UTC calendar days (epoch seconds //
+86400, as in velocity.daily_buckets). Per account and band:
+
+  near_<band>_count             near transactions in the whole history
+  near_<band>_max_count_<N>d    most near transactions in one window
+  near_<band>_max_sum_<N>d      largest |amount| sum of one window (exact, in paise)
+  near_<band>_alerts_<N>d       near transactions whose window held >= min_repeat
+
+Two implementations give the same numbers:
+  structuring_features()  batch over the full history: one sort by (account, time),
+                          windows found by one searchsorted on an (account, day) key
+  observe()               one event at a time (replay.py order): per account and band,
+                          a deque of day buckets [day, count, paise] plus running window
+                          totals. Each bucket is appended and evicted once, so the cost
+                          is O(1) amortised per transaction.
+
+Events older than the account's newest bucket (late data) go into their day's bucket
+if it is still in the window; they are not used for the maxima and alerts.
+
+    python structuring.py --window-days 7 --out structuring.parquet
+    python structuring.py --window-days 7 --stream     # replay per event, compare with batch
+"""
+import pandas as pd
+import numpy as np
+import argparse, time
+from collections import deque
+from aggregations import NEAR_THRESHOLD
+from velocity import paise_prefix, sorted_activity
+
+THRESHOLDS = {'50k': NEAR_THRESHOLD, '10l': (900_000, 1_000_000)}  # band -> [lo, hi) of |amount|
+WINDOW_DAYS = 7
+MIN_REPEAT = 3
+DAY_S = 86_400
+NS_SEC = 10 ** 9
+
+
+def feature_columns(thresholds=THRESHOLDS, window_days=WINDOW_DAYS):
+    cols = []
+    for band in thresholds:
+        cols += [f'near_{band}_count', f'near_{band}_max_count_{window_days}d',
+                 f'near_{band}_max_sum_{window_days}d', f'near_{band}_alerts_{window_days}d']
+    return cols
+
+
+# ── Batch ──
+def structuring_features(transactions, thresholds=THRESHOLDS, window_days=WINDOW_DAYS, min_repeat=MIN_REPEAT):
+    """Per account with transactions: near-threshold counts, window maxima and alerts for every band."""
+    acct, accounts, idx, t = sorted_activity(transactions)
+    n = len(accounts)
+    present = np.bincount(acct, minlength=n) > 0
+    a = acct[idx].astype(np.int64)
+    abs_amount = np.abs(transactions['amount'].to_numpy(dtype=np.float64))[idx]
+    day = t // DAY_S
+    out = pd.DataFrame({'account_id': accounts[present]})
+    for band, (lo, hi) in thresholds.items():
+        near = (abs_amount >= lo) & (abs_amount < hi)
+        na = a[near]
+        key = na * (1 << 32) + day[near]
+        # First near row of the same account on day >= d-N+1; rows are in time order within an account
+        start = np.searchsorted(key, key - (window_days - 1), side='left')
+        pos = np.arange(len(key))
+        count = pos - start + 1
+        cum = paise_prefix(abs_amount[near])
+        paise = cum[pos + 1] - cum[start]
+        max_count = np.zeros(n, dtype=np.int64)
+        np.maximum.at(max_count, na, count)
+        max_paise = np.zeros(n, dtype=np.int64)
+        np.maximum.at(max_paise, na, paise)
+        out[f'near_{band}_count'] = np.bincount(na, minlength=n)[present]
+        out[f'near_{band}_max_count_{window_days}d'] = max_count[present]
+        out[f'near_{band}_max_sum_{window_days}d'] = max_paise[present] / 100
+        out[f'near_{band}_alerts_{window_days}d'] = np.bincount(na[count >= min_repeat], minlength=n)[present]
+    if isinstance(transactions['account_id'].dtype, pd.CategoricalDtype):
+        out['account_id'] = pd.Categorical(out['account_id'], categories=accounts)
+    return out
+
+
+# ── Streaming ──
+def new_state(thresholds=THRESHOLDS, window_days=WINDOW_DAYS, min_repeat=MIN_REPEAT):
+    return {'bands': [(band, lo, hi) for band, (lo, hi) in thresholds.items()], 'window_days': window_days,
+            'min_repeat': min_repeat, 'accounts': {}}
+
+
+def _window():
+    return {'buckets': deque(), 'count': 0, 'paise': 0, 'total': 0, 'max_count': 0, 'max_paise': 0, 'alerts': 0}
+
+
+def _add(w, day, paise, window_days, min_repeat):
+    buckets = w['buckets']
+    if buckets and day < buckets[-1][0]:  # late event: into its day's bucket while that is in the window
+        if day > buckets[-1][0] - window_days:
+            i = next(i for i, b in enumerate(buckets) if b[0] >= day)
+            if buckets[i][0] == day:
+                buckets[i][1] += 1
+                buckets[i][2] += paise
+            else:
+                buckets.insert(i, [day, 1, paise])
+            w['count'] += 1
+            w['paise'] += paise
+        w['total'] += 1
+        return
+    while buckets and buckets[0][0] <= day - window_days:
+        _, c, p = buckets.popleft()
+        w['count'] -= c
+        w['paise'] -= p
+    if buckets and buckets[-1][0] == day:
+        buckets[-1][1] += 1
+        buckets[-1][2] += paise
+    else:
+        buckets.append([day, 1, paise])
+    w['count'] += 1
+    w['paise'] += paise
+    w['total'] += 1
+    w['max_count'] = max(w['max_count'], w['count'])
+    w['max_paise'] = max(w['max_paise'], w['paise'])
+    w['alerts'] += w['count'] >= min_repeat
+
+
+def observe(state, txn):
+    """Fold one transaction in; {band: (window count, window |amount| sum)} for the bands it is near."""
+    ts = txn['transaction_timestamp']
+    amount = txn['amount']
+    if ts is None or amount is None or amount != amount:
+        return {}
+    if not isinstance(ts, (int, np.integer)):
+        ts = pd.Timestamp(ts).value
+    abs_amount = abs(amount)
+    hits = {}
+    for band, lo, hi in state['bands']:
+        if lo <= abs_amount < hi:
+            windows = state['accounts'].setdefault(str(txn['account_id']), {})
+            w = windows.get(band) or windows.setdefault(band, _window())
+            _add(w, ts // NS_SEC // DAY_S, round(abs_amount * 100), state['window_days'], state['min_repeat'])
+            hits[band] = (w['count'], w['paise'] / 100)
+    return hits
+
+
+def snapshot(state):
+    """The batch columns for every account with a near transaction so far."""
+    n_days = state['window_days']
+    rows = []
+    for acct, windows in state['accounts'].items():
+        row = {'account_id': acct}
+        for band, _, _ in state['bands']:
+            w = windows.get(band) or _window()
+            row.update({f'near_{band}_count': w['total'], f'near_{band}_max_count_{n_days}d': w['max_count'],
+                        f'near_{band}_max_sum_{n_days}d': w['max_paise'] / 100,
+                        f'near_{band}_alerts_{n_days}d': w['alerts']})
+        rows.append(row)
+    cols = ['account_id'] + feature_columns(dict((b, (lo, hi)) for b, lo, hi in state['bands']), n_days)
+    return pd.DataFrame(rows, columns=cols)
+
+
+if __name__ == '__main__':
+    from ingest import DATA_DIR, load_tables
+    parser = argparse.ArgumentParser(description='Repeated just-below-threshold transactions per account in N days.')
+    parser.add_argument('--data-dir', default=DATA_DIR)
+    parser.add_argument('--window-days', type=int, default=WINDOW_DAYS)
+    parser.add_argument('--min-repeat', type=int, default=MIN_REPEAT)
+    parser.add_argument('--out', default='structuring.parquet')
+    parser.add_argument('--stream', action='store_true',
+                        help='also replay every transaction through observe() (replay.py) and compare')
+    args = parser.parse_args()
+    transactions = load_tables(args.data_dir, verbose=False)['transactions']
+    t0 = time.perf_counter()
+    features = structuring_features(transactions, THRESHOLDS, args.window_days, args.min_repeat)
+    print(f"batch: {len(transactions):,} transactions -> {len(features):,} accounts in {time.perf_counter() - t0:.2f}s")
+    cols = feature_columns(THRESHOLDS, args.window_days)
+    print(features[cols].astype(bool).sum().rename('accounts with any').to_string())
+    features.to_parquet(args.out, index=False)
+    if args.stream:
+        from replay import events
+        state = new_state(THRESHOLDS, args.window_days, args.min_repeat)
+        n = 0
+        elapsed = 0.0
+        for event in events(args.data_dir):
+            t0 = time.perf_counter()
+            observe(state, event)
+            elapsed += time.perf_counter() - t0
+            n += 1
+        streamed = snapshot(state).set_index('account_id')
+        batch = features.assign(account_id=features['account_id'].astype(str)).set_index('account_id')
+        batch = batch[(batch[[f'near_{b}_count' for b in THRESHOLDS]] > 0).any(axis=1)]
+        same = streamed.index.sort_values().equals(batch.index.sort_values()) and \
+            np.allclose(streamed.loc[batch.index, cols].to_numpy(float), batch[cols].to_numpy(float))
+        print(f"stream: {n:,} events, {elapsed / max(n, 1) * 1e6:.2f} us/event in observe(); same as batch: {same}")
@@ -0,0 +1,324 @@
+"""
+NFPC Phase 1 - Synthetic Dataset Generator
+Writes a dataset with the same files and declared columns as the competition data
+(dataset_info.txt, schema.py) at any scale, so the pipeline can be run and timed
+without the private data.
+
+Scale 1 is the real dataset's size: 40,000 accounts and ~7.4M transactions at ~185
+transactions per account; 0.1 is a tenth of it, 10 ten times it.
+Background activity is spread over the accounts with a heavy-tailed (lognormal) rate
+over five years; 10% of counterparties are other accounts, 1% are missing.
+
+1.1% of accounts are mules (as in train_labels.csv) and get one or two injected patterns:
+  structuring    5-20 transactions between ₹45,000 and ₹49,999, in bursts of about
+                 STRUCTURING_BURST transactions within STRUCTURING_DAYS days
+  pass_through   credits forwarded within 0.5-20h as a 90-100% debit. Half of the hops
+                 go to another mule, which receives the credit and forwards it the same
+                 way (within chains.HOP_WINDOW), up to MAX_HOPS hops: A -> B -> C chains
+  dormancy       no activity for 100-400 days, then 10-30 transactions within 7 days
+  fan_in         20-60 distinct counterparties paying in within 48h, then one outflow
+The first pattern sets the mule's alert_reason; 60% of accounts are labelled (train).
+The transaction table is written in N_TXN_PARTS CSV parts with pyarrow, one part at a
+time, so memory stays bounded at any scale.
+"""
+import pandas as pd
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pcsv
+import argparse, json, os, time
+from chains import HOP_WINDOW
+from ingest import N_TXN_PARTS, TABLE_FILES
+
+SYNTH_VERSION = 3
+BASE_ACCOUNTS = 40_000
+TXNS_PER_ACCOUNT = 185
+MULE_RATE = 0.011
+TRAIN_SHARE = 0.6
+START, DAYS = pd.Timestamp('2020-07-01'), 5 * 365
+ACCOUNT_COUNTERPARTY_SHARE = 0.10
+ACTIVITY_SIGMA = 1.75  # real data: median 38 transactions per account against a mean of 185
+CHANNELS = ['UPI', 'IMPS', 'NEFT', 'ATM', 'POS', 'RTGS']
+CHANNEL_P = [0.55, 0.15, 0.12, 0.08, 0.08, 0.02]
+PATTERNS = ['structuring', 'pass_through', 'dormancy', 'fan_in']
+ALERT_REASONS = {'structuring': 'Structuring Transactions Below Threshold', 'pass_through': 'Rapid Movement of Funds',
+                 'dormancy': 'Dormant Account Reactivation', 'fan_in': 'Unusual Fund Flow Pattern'}
+META_FILE = 'synth_meta.json'
+STRUCTURING_BURST = 5
+STRUCTURING_DAYS = 3
+MAX_HOPS = 4
+
+
+def _ids(prefix, numbers, width=6):
+    """'PREFIX_000042' strings for an int array, built in Arrow (no Python loop)."""
+    digits = pc.utf8_lpad(pc.cast(pa.array(numbers, type=pa.int64()), pa.string()), width, '0')
+    return pc.binary_join_element_wise(prefix, digits, '')
+
+
+def _dates(rng, n, lo, days, missing=0.0):
+    d = lo + pd.to_timedelta(rng.integers(0, days, n), unit='D')
+    return pd.Series(d).mask(rng.random(n) < missing)
+
+
+def _yn(rng, n, p_yes=0.5, missing=0.0):
+    return pd.Series(np.where(rng.random(n) < p_yes, 'Y', 'N')).mask(rng.random(n) < missing)
+
+
+# ── Static tables ──
+def static_tables(rng, n_accounts):
+    """customers, accounts, linkage, products (pandas frames keyed like the real files)."""
+    n = n_accounts
+    acct_ids = np.asarray(_ids('ACCT_', np.arange(1, n + 1)).to_pylist())
+    # ~0.1% of customers hold two accounts (39,988 customers for 40,038 accounts)
+    n_cust = n - max(n // 800, 0)
+    owner = np.r_[np.arange(n_cust), rng.integers(0, n_cust, n - n_cust)]
+    cust_ids = np.asarray(_ids('CUST_', np.arange(1, n_cust + 1)).to_pylist())
+    pin = rng.integers(110000, 999999, n_cust)
+    customers = pd.DataFrame({
+        'customer_id': cust_ids,
+        'date_of_birth': _dates(rng, n_cust, pd.Timestamp('1945-01-01'), 60 * 365),
+        'relationship_start_date': _dates(rng, n_cust, pd.Timestamp('2005-01-01'), 19 * 365),
+        'pan_available': _yn(rng, n_cust, 0.85, 0.14), 'aadhaar_available': _yn(rng, n_cust, 0.6, 0.24),
+        'passport_available': _yn(rng, n_cust, 0.1),
+        'mobile_banking_flag': _yn(rng, n_cust, 0.6), 'internet_banking_flag': _yn(rng, n_cust, 0.4),
+        'atm_card_flag': _yn(rng, n_cust, 0.7), 'demat_flag': _yn(rng, n_cust, 0.1),
+        'credit_card_flag': _yn(rng, n_cust, 0.2), 'fastag_flag': _yn(rng, n_cust, 0.15),
+        'customer_pin': pin, 'permanent_pin': np.where(rng.random(n_cust) < 0.9, pin, rng.integers(110000, 999999, n_cust)),
+    })
+    balance = np.round(rng.lognormal(8.5, 1.5, n) * np.where(rng.random(n) < 0.05, -1, 1), 2)
+    wobble = lambda: np.round(balance * rng.normal(1, 0.1, n), 2)
+    opened = _dates(rng, n, pd.Timestamp('2010-01-01'), 15 * 365)
+    frozen = rng.random(n) < 0.03
+    accounts = pd.DataFrame({
+        'account_id': acct_ids,
+        'account_status': np.where(frozen, 'frozen', 'active'),
+        'product_code': rng.integers(100, 2000, n), 'currency_code': 1,
+        'account_opening_date': opened,
+        'branch_code': rng.integers(1, max(n // 5, 2), n),
+        'branch_pin': pd.Series(pin[owner].astype(float)).mask(rng.random(n) < 0.05),
+        'avg_balance': pd.Series(balance).mask(rng.random(n) < 0.03),
+        'product_family': rng.choice(['S', 'K', 'O'], n, p=[0.8, 0.15, 0.05]),
+        'nomination_flag': _yn(rng, n, 0.6), 'cheque_allowed': _yn(rng, n, 0.5), 'cheque_availed': _yn(rng, n, 0.37),
+        'num_chequebooks': rng.integers(0, 3, n),
+        'last_mobile_update_date': _dates(rng, n, pd.Timestamp('2019-01-01'), 6 * 365, 0.85),
+        'kyc_compliant': _yn(rng, n, 0.9), 'last_kyc_date': _dates(rng, n, pd.Timestamp('2018-01-01'), 7 * 365),
+        'rural_branch': _yn(rng, n, 0.12),
+        'monthly_avg_balance': pd.Series(wobble()).mask(rng.random(n) < 0.03),
+        'quarterly_avg_balance': wobble(), 'daily_avg_balance': wobble(),
+        'freeze_date': _dates(rng, n, pd.Timestamp('2023-01-01'), 3 * 365).where(frozen),
+        'unfreeze_date': _dates(rng, n, pd.Timestamp('2024-01-01'), 2 * 365).where(frozen & (rng.random(n) < 0.3)),
+    })
+    linkage = pd.DataFrame({'customer_id': cust_ids[owner], 'account_id': acct_ids})
+    has = lambda p: rng.random(n_cust) < p
+    loan, cc = has(0.2), has(0.15)
+    products = pd.DataFrame({
+        'customer_id': cust_ids,
+        'loan_sum': np.where(loan, -np.round(rng.lognormal(12, 1, n_cust), 2), np.nan), 'loan_count': loan.astype(int),
+        'cc_sum': np.where(cc, -np.round(rng.lognormal(10, 1, n_cust), 2), np.nan), 'cc_count': cc.astype(int),
+        'od_sum': 0.0, 'od_count': 0, 'ka_sum': 0.0, 'ka_count': 0,
+        'sa_sum': np.round(rng.lognormal(8, 1.5, n_cust), 2), 'sa_count': 1,
+    })
+    return {'customers': customers, 'accounts': accounts, 'linkage': linkage, 'products': products}
+
+
+# ── Transactions ──
+def _frame(acct, ts, amount, txn_type, channel, cp):
+    return {'account': acct, 'ts': ts, 'amount': amount, 'txn_type': txn_type, 'channel': channel, 'cp': cp}
+
+
+def background(rng, n_rows, rate, n_accounts, n_cps):
+    """Ordinary activity: heavy-tailed per-account rates, uniform over the five years.
+
+    cp >= 0 is a CP_ counterparty, cp <= -2 the account -(cp + 2), -1 missing.
+    """
+    acct = np.searchsorted(rate, rng.random(n_rows) * rate[-1])
+    ts = START.to_datetime64() + rng.integers(0, DAYS * 86400, n_rows).astype('m8[s]')
+    amount = np.round(rng.lognormal(7.5, 1.6, n_rows), 2)
+    # Zipf-like counterparty popularity: a few merchants/utilities, a long tail of individuals
+    cp = np.minimum((n_cps * rng.random(n_rows) ** 3).astype(np.int64), n_cps - 1)
+    to_acct = rng.random(n_rows) < ACCOUNT_COUNTERPARTY_SHARE
+    cp = np.where(to_acct, -2 - rng.integers(0, n_accounts, n_rows), cp)
+    cp = np.where(rng.random(n_rows) < 0.01, -1, cp)
+    txn_type = np.where(rng.random(n_rows) < 0.5, 'C', 'D')
+    amount = np.where(rng.random(n_rows) < 0.01, -amount, amount)  # reversals
+    return _frame(acct, ts, amount, txn_type, rng.choice(CHANNELS, n_rows, p=CHANNEL_P), cp)
+
+
+def mule_patterns(rng, mules, n_cps):
+    """Injected mule transactions, the pattern(s) per mule, and each mule's dormancy gap."""
+    n = len(mules)
+    first = rng.integers(0, len(PATTERNS), n)
+    second = np.where(rng.random(n) < 0.4, rng.integers(0, len(PATTERNS), n), first)
+    has = {p: (first == i) | (second == i) for i, p in enumerate(PATTERNS)}
+    rows = []
+    base = START.to_datetime64()
+    span = DAYS * 86400
+
+    def at(t0, k):
+        return base + (t0 + k).astype('m8[s]')
+
+    def emit(who, ts, amount, txn_type, cp, channel='UPI'):
+        k = len(who)
+        rows.append(_frame(mules[who], ts, np.round(amount, 2), np.broadcast_to(txn_type, k),
+                           np.broadcast_to(channel, k), cp))
+
+    # Structuring: just below the ₹50K reporting threshold, a few days per burst
+    s = np.flatnonzero(has['structuring'])
+    k = rng.integers(5, 21, len(s))
+    bursts = -(-k // STRUCTURING_BURST)
+    burst_start = rng.integers(0, span - STRUCTURING_DAYS * 86400, bursts.sum())
+    first_burst = np.repeat(np.cumsum(bursts) - bursts, k)
+    burst = first_burst + (rng.random(k.sum()) * np.repeat(bursts, k)).astype(np.int64)
+    who = np.repeat(s, k)
+    emit(who, at(burst_start[burst], rng.integers(0, STRUCTURING_DAYS * 86400, len(who))),
+         rng.uniform(45_000, 49_999.99, len(who)), np.where(rng.random(len(who)) < 0.5, 'C', 'D'),
+         rng.integers(0, n_cps, len(who)), 'NEFT')
+
+    # Pass-through: credit, then 90-100% out within 0.5-20h; a hop to another mule is forwarded in turn
+    who = np.repeat(np.flatnonzero(has['pass_through']), rng.integers(5, 16, has['pass_through'].sum()))
+    t = rng.integers(0, span - (MAX_HOPS + 1) * 86400, len(who))
+    amount = rng.lognormal(10.5, 0.7, len(who))
+    emit(who, at(t, 0), amount, 'C', rng.integers(0, n_cps, len(who)), 'IMPS')
+    max_delay = min(20 * 3600, int(HOP_WINDOW.total_seconds()))
+    for hop in range(MAX_HOPS):
+        t = t + rng.integers(1800, max_delay, len(who))
+        amount = amount * rng.uniform(0.9, 1.0, len(who))
+        to_mule = (rng.random(len(who)) < 0.5) & (hop < MAX_HOPS - 1)
+        nxt = (who + rng.integers(1, n, len(who))) % n  # another mule
+        emit(who, at(t, 0), amount, 'D', np.where(to_mule, -2 - mules[nxt], rng.integers(0, n_cps, len(who))), 'IMPS')
+        # The receiving mule's side of the transfer, then its own onward debit in the next round
+        who, t, amount, payer = nxt[to_mule], t[to_mule], amount[to_mule], who[to_mule]
+        emit(who, at(t, 0), amount, 'C', -2 - mules[payer], 'IMPS')
+
+    # Dormancy: silence (background rows are dropped inside the gap), then a one-week burst
+    gap_start = np.full(n, -1, dtype=np.int64)
+    gap_end = np.full(n, -1, dtype=np.int64)
+    d = np.flatnonzero(has['dormancy'])
+    gap = rng.integers(100, 401, len(d)) * 86400
+    gap_start[d] = rng.integers(0, span - gap - 7 * 86400)
+    gap_end[d] = gap_start[d] + gap
+    who = np.repeat(d, rng.integers(10, 31, len(d)))
+    emit(who, at(gap_end[who], rng.integers(0, 7 * 86400, len(who))), rng.lognormal(9.5, 1.0, len(who)),
+         np.where(rng.random(len(who)) < 0.5, 'C', 'D'), rng.integers(0, n_cps, len(who)))
+
+    # Fan-in: many distinct new counterparties paying in within 48h, then one aggregate outflow
+    f = np.flatnonzero(has['fan_in'])
+    k = rng.integers(20, 61, len(f))
+    who = np.repeat(f, k)
+    t0 = np.repeat(rng.integers(0, span - 4 * 86400, len(f)), k)
+    amount = rng.lognormal(8.5, 0.6, len(who))
+    emit(who, at(t0, rng.integers(0, 48 * 3600, len(who))), amount, 'C',
+         n_cps + np.arange(len(who)))  # counterparties seen nowhere else
+    total = np.bincount(np.repeat(np.arange(len(f)), k), weights=amount)
+    emit(f, at(t0[np.cumsum(k) - 1], 49 * 3600), total * 0.97, 'D', rng.integers(0, n_cps, len(f)), 'RTGS')
+
+    mule_rows = {key: np.concatenate([r[key] for r in rows]) for key in rows[0]}
+    return mule_rows, first, second, gap_start, gap_end
+
+
+def _write_part(path, frame, first_id, acct_ids):
+    n = len(frame['account'])
+    cp = frame['cp']
+    cp_acct = pa.array(acct_ids[np.maximum(-cp - 2, 0)])
+    cp_str = pc.if_else(pa.array(cp <= -2), cp_acct, _ids('CP_', np.maximum(cp, 0), 1))
+    table = pa.table({
+        'transaction_id': _ids('TXN_', np.arange(first_id, first_id + n), 9),
+        'account_id': pa.array(acct_ids[frame['account']]),
+        'transaction_timestamp': pa.array(frame['ts'].astype('M8[s]')),
+        'amount': pa.array(frame['amount']),
+        'txn_type': pa.array(frame['txn_type']),
+        'channel': pa.array(frame['channel']),
+        'counterparty_id': pc.if_else(pa.array(cp == -1), pa.scalar(None, pa.string()), cp_str),
+    })
+    pcsv.write_csv(table, path)
+
+
+def generate(out_dir, scale=1.0, seed=0, n_parts=N_TXN_PARTS, verbose=True):
+    """Write the full synthetic dataset to out_dir. Returns its metadata dict."""
+    t0 = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    n = max(int(round(BASE_ACCOUNTS * scale)), 50)
+    n_cps = 10 * n
+    static = static_tables(rng, n)
+    acct_ids = static['accounts']['account_id'].to_numpy()
+
+    mules = np.sort(rng.choice(n, max(int(round(n * MULE_RATE)), 2), replace=False))
+    mule_rows, first, second, gap_start, gap_end = mule_patterns(rng, mules, n_cps)
+    is_mule = np.zeros(n, dtype=bool)
+    is_mule[mules] = True
+    order = rng.permutation(n)
+    train, test = np.sort(order[:int(n * TRAIN_SHARE)]), np.sort(order[int(n * TRAIN_SHARE):])
+    mule_pos = np.full(n, -1)
+    mule_pos[mules] = np.arange(len(mules))
+    last_seen = pd.Series(mule_rows['ts']).groupby(mule_pos[mule_rows['account']]).max()
+    y = is_mule[train]
+    pos = mule_pos[train]
+    reason = np.where(rng.random(len(train)) < 0.2, 'Routine Investigation',
+                      np.array([ALERT_REASONS[p] for p in PATTERNS])[first[np.maximum(pos, 0)]])
+    flag_date = last_seen.reindex(pos).to_numpy() + np.timedelta64(30, 'D')
+    labels = pd.DataFrame({'account_id': acct_ids[train], 'is_mule': y.astype(int),
+                           'mule_flag_date': pd.Series(flag_date).where(y),
+                           'alert_reason': pd.Series(reason).where(y),
+                           'flagged_by_branch': static['accounts']['branch_code'].to_numpy()[train].astype(float)})
+    labels['flagged_by_branch'] = labels['flagged_by_branch'].where(y)
+    tables = {**static, 'labels': labels, 'test': pd.DataFrame({'account_id': acct_ids[test]})}
+    for name, df in tables.items():
+        df.to_csv(os.path.join(out_dir, TABLE_FILES[name]), index=False)
+
+    # Background rows part by part; each part also gets a random share of the mule rows
+    rate = np.cumsum(rng.lognormal(0, ACTIVITY_SIGMA, n))
+    n_background = n * TXNS_PER_ACCOUNT - len(mule_rows['account'])
+    mule_part = rng.integers(0, n_parts, len(mule_rows['account']))
+    gs = np.full(n, -1, dtype=np.int64)
+    ge = np.full(n, -1, dtype=np.int64)
+    gs[mules], ge[mules] = gap_start, gap_end
+    next_id, rows = 0, 0
+    for part in range(n_parts):
+        size = n_background // n_parts + (part < n_background % n_parts)
+        bg = background(rng, size, rate, n, n_cps)
+        secs = (bg['ts'] - START.to_datetime64()).astype(np.int64)
+        a = bg['account']
+        keep = ~((ge[a] > 0) & (secs >= gs[a]) & (secs < ge[a]))
+        sel = mule_part == part
+        frame = {k: np.concatenate([bg[k][keep], mule_rows[k][sel]]) for k in bg}
+        shuffle = rng.permutation(len(frame['account']))
+        frame = {k: v[shuffle] for k, v in frame.items()}
+        _write_part(os.path.join(out_dir, TABLE_FILES[f'transactions_part_{part}']), frame, next_id, acct_ids)
+        next_id += len(shuffle)
+        rows += len(shuffle)
+        if verbose:
+            print(f"  [synth] transactions_part_{part}: {len(shuffle):,} rows")
+
+    meta = {'version': SYNTH_VERSION, 'scale': scale, 'seed': seed, 'accounts': n, 'mules': int(len(mules)),
+            'transactions': rows, 'patterns': {p: int(((first == i) | (second == i)).sum()) for i, p in enumerate(PATTERNS)},
+            'seconds': round(time.perf_counter() - t0, 1)}
+    with open(os.path.join(out_dir, META_FILE), 'w') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def synth_meta(out_dir):
+    path = os.path.join(out_dir, META_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def ensure_dataset(out_dir, scale=1.0, seed=0, verbose=True):
+    """Generate out_dir unless it already holds this scale/seed."""
+    meta = synth_meta(out_dir)
+    if meta.get('version') == SYNTH_VERSION and meta.get('scale') == scale and meta.get('seed') == seed:
+        return meta
+    return generate(out_dir, scale, seed, verbose=verbose)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic NFPC dataset with injected mule patterns.')
+    parser.add_argument('out_dir')
+    parser.add_argument('--scale', type=float, default=1.0, help=f'1 = the real size, {BASE_ACCOUNTS:,} accounts, ~{BASE_ACCOUNTS * TXNS_PER_ACCOUNT:,} transactions')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    meta = generate(args.out_dir, args.scale, args.seed)
+    print(json.dumps(meta, indent=2))
@@ -0,0 +1,33 @@
+"""Regression tests for the Parquet ingest cache (run with pytest)."""
+import pandas as pd
+from ingest import read_cached, write_parquet
+from schema import apply_schema
+
+
+def _part(amounts):
+    return apply_schema(pd.DataFrame({'transaction_id': [f't{i}' for i in range(len(amounts))],
+                                      'account_id': ['ACCT_1'] * len(amounts), 'amount': amounts}), 'transactions')
+
+
+def test_mixed_amount_dtypes_across_parts_are_not_narrowed(tmp_path):
+    small, large = _part([10.5, 200.25]), _part([123456.78, 98765432.1])
+    assert str(small['amount'].dtype) == 'float32' and str(large['amount'].dtype) == 'float64'
+    write_parquet(small, str(tmp_path / 'transactions' / 'part-0.parquet'))
+    write_parquet(large, str(tmp_path / 'transactions' / 'part-1.parquet'))
+    amount = read_cached(str(tmp_path), 'transactions')['amount']
+    assert str(amount.dtype) == 'float64'
+    assert amount.tolist() == [10.5, 200.25, 123456.78, 98765432.1]
+
+
+def test_all_float32_parts_stay_float32(tmp_path):
+    write_parquet(_part([10.5]), str(tmp_path / 'transactions' / 'part-0.parquet'))
+    write_parquet(_part([200.25]), str(tmp_path / 'transactions' / 'part-1.parquet'))
+    amount = read_cached(str(tmp_path), 'transactions')['amount']
+    assert str(amount.dtype) == 'float32' and amount.tolist() == [10.5, 200.25]
+
+
+def test_empty_part_keeps_string_keys(tmp_path):
+    write_parquet(_part([]), str(tmp_path / 'transactions' / 'part-0.parquet'))
+    write_parquet(_part([10.5]), str(tmp_path / 'transactions' / 'part-1.parquet'))
+    txns = read_cached(str(tmp_path), 'transactions')
+    assert txns['account_id'].astype(str).tolist() == ['ACCT_1']